@@ -13,9 +13,13 @@
 # ---------------------- Third-party Library Imports ----------------------
 
 
+import os
 import argparse
 from pathlib import Path
 from core.markdown_processor import MarkdownProcessor
+from core.chunk_deduplicator import ChunkDeduplicator
+from core.dify_sink import DifySink
+from core.run_profiler import RunProfiler
 
 def main():
     """主函数"""
@@ -29,6 +33,21 @@ def main():
   
   # 指定输出目录和API地址
   python batch_chunk.py -d ./docs -o ./output --url http://localhost:9969/v1/chunk/hybrid/source
+  
+  # 跨所有文件去除近似重复的切片，并保存去重明细
+  python batch_chunk.py -d ./docs --dedup drop --dedup-threshold 0.85 --dedup-report ./dedup.jsonl
+  
+  # 切片后直接推送到Dify知识库（API密钥也可通过环境变量 DIFY_API_KEY 提供）
+  python batch_chunk.py -d ./docs --dify-url http://localhost/v1 --dify-dataset <dataset_id> --dify-key <api_key>
+  
+  # 大表格按每块约300 token拆分（每块重复表头，默认不拆分）
+  python batch_chunk.py -d ./docs --table-tokens 300
+  
+  # 剖析整个运行（切片请求、去重、推送各阶段耗时）
+  python batch_chunk.py -d ./docs --dedup drop --profile run
+  
+  # 只推送输出目录中已有的切片文件
+  python batch_chunk.py -d ./docs --dify-url http://localhost/v1 --dify-dataset <dataset_id> --push-only
 
 支持的文件格式:
   .md (Markdown files)
@@ -50,9 +69,106 @@ def main():
         default='http://127.0.0.1:9969/v1/chunk/hybrid/source',
         help='文档切片服务URL (默认: http://127.0.0.1:9969/v1/chunk/hybrid/source)'
     )
+    parser.add_argument(
+        '--table-tokens',
+        type=int,
+        default=0,
+        help=f'超过该token数的表格按行拆分为多个重复表头的小表格后再切片，'
+             f'需小于切片上限 {MarkdownProcessor.CHUNK_MAX_TOKENS}（默认: 0，不拆分）'
+    )
+    parser.add_argument(
+        '--dedup',
+        choices=['off', 'drop', 'flag'],
+        default='off',
+        help='近似重复切片处理: drop 不写入重复切片；flag 保留切片，只在去重报告中标记（默认: off）'
+    )
+    parser.add_argument(
+        '--dedup-threshold',
+        type=float,
+        default=0.85,
+        help='估计的Jaccard相似度达到该值时视为重复（默认: 0.85）'
+    )
+    parser.add_argument(
+        '--dedup-report',
+        default=None,
+        help='重复切片明细（JSON Lines）的保存路径，不要放在输出目录中以免被导入Dify'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=['run', 'slowest'],
+        default=None,
+        help='剖析模式: run 采样整个运行；slowest 只保留最慢的 --profile-top 个文件（输出pstats和折叠栈）'
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=10,
+        help='slowest 模式下保留的文件数（默认: 10）'
+    )
+    parser.add_argument(
+        '--profile-dir',
+        default='profile',
+        help='剖析结果输出目录（默认: ./profile）'
+    )
+    parser.add_argument(
+        '--profile-interval',
+        type=float,
+        default=10,
+        help='采样间隔（毫秒，默认: 10）'
+    )
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='同时用 tracemalloc 记录内存峰值和分配位置（会明显降低运行速度）'
+    )
+    parser.add_argument(
+        '--dify-url',
+        default=None,
+        help='Dify API地址（例如 http://localhost/v1），指定后将切片直接推送到知识库'
+    )
+    parser.add_argument(
+        '--dify-dataset',
+        default=None,
+        help='Dify知识库ID'
+    )
+    parser.add_argument(
+        '--dify-key',
+        default=os.environ.get('DIFY_API_KEY'),
+        help='Dify知识库API密钥（默认读取环境变量 DIFY_API_KEY）'
+    )
+    parser.add_argument(
+        '--dify-concurrency',
+        type=int,
+        default=4,
+        help='同时推送的文档数（默认: 4）'
+    )
+    parser.add_argument(
+        '--dify-batch-size',
+        type=int,
+        default=50,
+        help='每个请求创建的分段数（默认: 50）'
+    )
+    parser.add_argument(
+        '--dify-state',
+        default=None,
+        help='推送状态文件，内容未变的文档直接跳过（默认: 输出目录同级的 <输出目录名>_dify_state.jsonl）'
+    )
+    parser.add_argument(
+        '--push-only',
+        action='store_true',
+        help='不重新切片，只推送输出目录中已有的切片文件'
+    )
     
     args = parser.parse_args()
     
+    if args.dify_url and not (args.dify_dataset and args.dify_key):
+        parser.error('推送到Dify需要同时指定 --dify-dataset 和 --dify-key（或环境变量 DIFY_API_KEY）')
+    if args.push_only and not args.dify_url:
+        parser.error('--push-only 需要指定 --dify-url')
+    if not 0 <= args.table_tokens < MarkdownProcessor.CHUNK_MAX_TOKENS:
+        parser.error(f'--table-tokens 需在 0 到 {MarkdownProcessor.CHUNK_MAX_TOKENS - 1} 之间'
+                     f'（行块需小于切片上限 {MarkdownProcessor.CHUNK_MAX_TOKENS}，并为标题上下文留出空间）')
+    
     # 确定输出目录
     if args.output is None:
         input_dir = Path(args.directory)
@@ -63,16 +179,51 @@ def main():
     print(f"输入目录: {args.directory}")
     print(f"输出目录: {output_dir}")
     print(f"API地址: {args.url}")
+    if args.dify_url:
+        print(f"Dify知识库: {args.dify_url} ({args.dify_dataset})")
     
     # 创建处理器并执行处理
+    deduplicator = None
+    if args.dedup != 'off':
+        deduplicator = ChunkDeduplicator(
+            threshold=args.dedup_threshold,
+            mode=args.dedup,
+            report_path=args.dedup_report
+        )
+    sink = None
+    if args.dify_url:
+        state_path = args.dify_state or output_dir.parent / f"{output_dir.name}_dify_state.jsonl"
+        sink = DifySink(
+            api_base=args.dify_url,
+            api_key=args.dify_key,
+            dataset_id=args.dify_dataset,
+            concurrency=args.dify_concurrency,
+            batch_size=args.dify_batch_size,
+            state_path=state_path
+        )
+    profiler = None
+    if args.profile:
+        profiler = RunProfiler(args.profile, args.profile_dir, top=args.profile_top,
+                               interval=args.profile_interval / 1000, memory=args.profile_memory)
     processor = MarkdownProcessor(
         api_url=args.url,
         input_folder=args.directory,
-        output_folder=output_dir
+        output_folder=output_dir,
+        deduplicator=deduplicator,
+        sink=sink,
+        profiler=profiler,
+        table_tokens=args.table_tokens
     )
     
+    if profiler is not None:
+        profiler.start()
     try:
+        if args.push_only:
+            processor.push_existing_files()
+            return
         processor.process_all_markdown_files()
+        if args.dedup_report:
+            print(f"去重明细已保存: {args.dedup_report}")
         print(f"\n处理完成！切片文件已保存到: {output_dir}")
         print("现在你可以直接将这些文件导入到 Dify 中使用。")
         
@@ -82,6 +233,13 @@ def main():
     except Exception as e:
         print(f"\n处理失败: {str(e)}")
         exit(1)
+    finally:
+        if deduplicator is not None:
+            deduplicator.close()
+        if profiler is not None:
+            print(f"剖析结果已保存到: {args.profile_dir}")
+            for path in profiler.stop():
+                print(f"  {path.name}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
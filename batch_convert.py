@@ -18,38 +18,389 @@
 主程序入口
 """
 
+import os
+import sys
+import time
 import argparse
+import threading
+from functools import partial
 from pathlib import Path
-from typing import List
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
 from core.batch_converter import BatchConverter
+from core.conversion_result import ConversionResult
+from core.file_scanner import FileScanner
+from core.sqlite_store import SqliteOutputStore
+from core.work_lease import WorkLeaseManager
+from core.watch_daemon import WatchDaemon
+from core.run_profiler import RunProfiler
+from core.option_planner import ConversionPlanner
+from core.document_renderer import DocumentRenderer, RENDER_FORMATS
+from core.autotuner import Autotuner
 
 
-def find_files_in_directory(directory: str, extensions: set = None) -> List[str]:
+def find_files_in_directory(directory: str, extensions: set = None,
+                            include: List[str] = None, exclude: List[str] = None,
+                            recursive: bool = True) -> Iterator[str]:
     """
-    在目录中查找指定扩展名的文件
+    在目录中递归查找指定扩展名的文件（惰性产出）
     
     Args:
         directory: 目录路径
         extensions: 文件扩展名集合
+        include: 包含的glob模式列表
+        exclude: 排除的glob模式列表
+        recursive: 是否递归子目录
         
     Returns:
-        文件路径列表
+        文件路径生成器
     """
-    if extensions is None:
-        extensions = {'.pdf', '.docx', '.doc', '.txt', '.pptx', '.html', '.xml', '.xlsx', '.xls'}
+    scanner = FileScanner(extensions=extensions, include=include, exclude=exclude, recursive=recursive)
+    return scanner.scan(directory)
+
+
+def iter_input_files(directory: str, input_files: List[str], **scan_options) -> Iterator[str]:
+    """
+    合并目录扫描结果与命令行指定的文件，并去除重复项
+    
+    目录扫描本身不会产生重复路径，因此只需记住命令行文件，
+    内存占用不随目录规模增长。
+    
+    Args:
+        directory: 要扫描的目录（可为None）
+        input_files: 命令行指定的文件列表
+        
+    Returns:
+        文件路径生成器
+    """
+    explicit = {os.path.abspath(f): f for f in input_files}
+    
+    if directory:
+        for file_path in find_files_in_directory(directory, **scan_options):
+            explicit.pop(os.path.abspath(file_path), None)
+            yield file_path
+    
+    yield from explicit.values()
+
+
+class StatusLine:
+    """控制台底部原地刷新的状态行：其他输出先清除状态行，打印后再重画"""
+    
+    # 输出不是终端时（重定向到日志），状态行作为普通行输出的最小间隔（秒）
+    LOG_INTERVAL = 30
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.live = sys.stdout.isatty()
+        self.text = ''
+        self.last_logged = 0.0
+    
+    def echo(self, message: str = ''):
+        """打印一行，保持状态行在最后一行"""
+        with self.lock:
+            if self.text:
+                sys.stdout.write('\r\033[K')
+            print(message)
+            if self.text:
+                sys.stdout.write(self.text)
+                sys.stdout.flush()
+    
+    def update(self, text: str):
+        """刷新状态行"""
+        with self.lock:
+            if self.live:
+                self.text = text
+                sys.stdout.write(f"\r\033[K{text}")
+                sys.stdout.flush()
+            elif time.monotonic() - self.last_logged >= self.LOG_INTERVAL:
+                self.last_logged = time.monotonic()
+                print(text, flush=True)
+    
+    def close(self):
+        """清除状态行"""
+        with self.lock:
+            if self.text:
+                sys.stdout.write('\r\033[K')
+                sys.stdout.flush()
+                self.text = ''
+
+
+status_line = StatusLine()
+echo = status_line.echo
+
+
+def format_seconds(seconds: float) -> str:
+    """把秒数格式化为 1时2分3秒 形式"""
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}时{minutes}分"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
+
+
+def format_status(info: Dict) -> str:
+    """格式化定时进度（吞吐、在途、排队、预计剩余时间）"""
+    done = info['completed']
+    progress = f"{done}/{info['total'] - info['rejected']}" if info['total'] is not None else f"{done}"
+    parts = [
+        f"[{progress}]",
+        f"{info['files_per_second']:.2f} 文件/秒",
+        f"{info['mb_per_second']:.2f} MB/秒",
+        f"在途 {info['in_flight']}",
+        f"排队 {info['queue_depth']}",
+    ]
+    if info['eta_seconds'] is not None:
+        parts.append(f"剩余约 {format_seconds(info['eta_seconds'])}")
+    if info['failed']:
+        parts.append(f"失败 {info['failed']}")
+    if info['stalled']:
+        parts.append(f"卡住 {len(info['stalled'])}")
+    return ' | '.join(parts)
+
+
+def print_event(event: str, file_path: str, info: Dict):
+    """在控制台输出转换器和守护进程的事件"""
+    if event == 'progress':
+        if info['running']:
+            status_line.update(format_status(info))
+        else:
+            status_line.close()
+    elif event == 'stalled':
+        echo(f"⚠ 请求耗时异常: {Path(file_path).name} 已运行 {format_seconds(info['elapsed'])}"
+             f"（同大小文件耗时p95 {info['p95']:.1f}秒）")
+    elif event == 'validated':
+        echo(f"✓ 验证通过: {Path(file_path).name}")
+    elif event == 'rejected':
+        echo(f"✗ 验证失败: {info['error']}")
+    elif event == 'started':
+        total = f" {info['total']} 个文件" if info['total'] is not None else ''
+        echo(f"\n开始批量转换{total}...")
+        echo(f"输出目录: {info['output_dir']}")
+        echo(f"并发数: {info['workers']}")
+        if info['async_inflight']:
+            echo(f"异步模式: 最多 {info['async_inflight']} 个任务在服务端排队")
+    elif event == 'empty':
+        echo("没有有效的文件需要转换")
+    elif event in ('breaker', 'watcher'):
+        echo(info['message'])
+    elif event == 'batch_retry':
+        reason = f": {info['error']}" if info['error'] else ''
+        echo(f"多文件请求中 {info['files']}/{info['group']} 个文件没有结果，改为逐个转换{reason}")
+    elif event == 'hedging':
+        echo(f"请求对冲: 触发 {info['fired']} 次，因预算不足跳过 {info['denied']} 次")
+    elif event == 'memory_budget':
+        echo(f"内存预算: 峰值估算占用 {info['peak_bytes'] / 1024 / 1024:.1f} MB"
+             f" / {info['budget_bytes'] / 1024 / 1024:.0f} MB")
+    elif event == 'leases':
+        echo(f"节点 {info['node_id']} 处理了 {info['processed']} 个文件，接管过期租约 {info['stolen']} 个")
+    elif event == 'capacity':
+        echo("\n容量预测对比:")
+        for line in info['lines']:
+            echo(f"  {line}")
+    elif event == 'report':
+        echo(f"\n转换报告已保存: {info['path']}")
+    elif event == 'watching':
+        echo(f"开始监听 ({info['mode']}): {', '.join(info['directories'])}")
+    elif event == 'status_server':
+        echo(f"状态接口: {info['url']}")
+    elif event == 'autotune_sample':
+        echo(f"调优样本: 从 {info['population']} 个文件的 {info['strata']} 个分层中抽取 {info['files']} 个")
+    elif event == 'autotune_trial':
+        verdict = '✓' if info['accepted'] else '✗'
+        echo(f"{verdict} {info['label']}: {info['wall_seconds']:.1f}秒，{info['files_per_second']:.2f} 文件/秒，"
+             f"差异 {info['diff_mean']:.1%}，失败 {info['failed']}")
+
+
+def print_progress(result: ConversionResult, completed: int, total: Optional[int]):
+    """在控制台输出单个文件的完成进度"""
+    status_symbol = "✓" if result.ok else "✗"
+    progress = f"{completed}/{total}" if total is not None else f"{completed}"
+    echo(f"[{progress}] {status_symbol} {Path(result.input_file).name}")
+
+
+def print_watch_result(result: ConversionResult):
+    """在控制台输出守护进程模式下单个文件的结果"""
+    status_symbol = "✓" if result.ok else "✗"
+    detail = f" ({result.error})" if result.error else f" {result.duration:.1f}秒"
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {status_symbol} {Path(result.input_file).name}{detail}")
+
+
+def watch_daemon(args: argparse.Namespace):
+    """
+    以守护进程模式运行：转换器只创建一次，连接池和处理器在整个运行期间复用
+    
+    Args:
+        args: 命令行参数
+    """
+    converter = BatchConverter(
+        service_url=args.url,
+        max_workers=args.workers,
+        split_pages=args.split_pages,
+        split_workers=args.split_workers,
+        max_retries=args.max_retries,
+        max_timeout=args.timeout,
+        output_store=SqliteOutputStore(args.store) if args.store else None,
+        image_mode=args.image_mode,
+        auto_options=args.auto_options,
+        option_overrides=args.option_overrides,
+        local_convert=not args.no_local,
+        local_workers=args.local_workers,
+        local_timeout=args.local_timeout,
+        shard_depth=args.shard_depth,
+        extra_urls=args.extra_url,
+        hedge_percentile=args.hedge_percentile,
+        hedge_budget=args.hedge_budget,
+        keep_document=args.keep_document
+    )
+    scanner = FileScanner(include=args.include, exclude=args.exclude, recursive=not args.no_recursive)
+    daemon = WatchDaemon(
+        converter,
+        args.watch,
+        output_dir=args.output,
+        scanner=scanner,
+        settle_time=args.settle_time,
+        poll_interval=args.poll_interval,
+        status_file=args.status_file,
+        status_port=args.status_port,
+        on_result=print_watch_result,
+        on_event=print_event
+    )
+    
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("\n监听已停止")
+    finally:
+        converter.close()
+        if converter.output_store is not None:
+            converter.output_store.close()
+
+
+def autotune(args: argparse.Namespace, input_files: Iterator[str]):
+    """
+    在抽样文件上比较不同配置，输出推荐参数并保存调优配置
+    
+    Args:
+        args: 命令行参数（服务地址、重试、超时等在所有试转换中保持不变）
+        input_files: 输入文件
+    """
+    converter_factory = partial(
+        BatchConverter,
+        service_url=args.url,
+        split_pages=args.split_pages,
+        split_workers=args.split_workers,
+        max_retries=args.max_retries,
+        max_timeout=args.timeout,
+        async_mode=args.async_mode,
+        async_inflight=args.async_inflight,
+        local_convert=not args.no_local,
+        local_workers=args.local_workers,
+        local_timeout=args.local_timeout,
+        batch_max_bytes=int(args.batch_max_kb * 1024),
+        batch_small_bytes=int(args.batch_small_kb * 1024),
+        batch_max_wait=args.batch_max_wait,
+        extra_urls=args.extra_url,
+        hedge_percentile=args.hedge_percentile,
+        hedge_budget=args.hedge_budget
+    )
+    worker_levels = None
+    if args.autotune_workers:
+        worker_levels = sorted({int(level) for level in args.autotune_workers.split(',') if level.strip()})
+    tuner = Autotuner(
+        converter_factory,
+        sample_size=args.autotune_sample,
+        threshold=args.autotune_threshold,
+        workers=args.workers,
+        worker_levels=worker_levels,
+        batch_files=args.batch_files or 16
+    )
+    
+    best = tuner.tune(input_files, on_event=print_event)
+    if best is None:
+        print("没有有效的文件可用于调优")
+        return
+    
+    print("\n调优结果（★ 推荐，✓ 输出差异在阈值内，✗ 超出阈值或失败更多）:")
+    for line in tuner.format_trials():
+        print(f"  {line}")
+    print(f"\n推荐参数: {tuner.recommended_flags()}")
+    profile_path = tuner.save_profile(args.autotune_save)
+    print(f"调优配置已保存: {profile_path}（使用 --tuned-profile {profile_path} 应用）")
+
+
+def render_main(argv: List[str]):
+    """render 子命令：从保存的结构化文档在本地渲染其他格式"""
+    parser = argparse.ArgumentParser(
+        prog='batch_convert.py render',
+        description='从转换时保存的Docling结构化文档（--keep-document）在本地渲染其他格式，不调用Docling服务',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例用法:
+  # 渲染纯文本和HTML
+  python batch_convert.py render -d ./output --to text,html
+  
+  # 生成可直接推送到Dify的切片文件（与 batch_chunk.py 的输出格式相同）
+  python batch_convert.py render -d ./output -o ./dify_ready --to chunks --workers 8
+        """
+    )
+    parser.add_argument(
+        '-d', '--directory',
+        required=True,
+        help='转换输出目录（递归查找 *.docling.json.gz）'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default=None,
+        help='渲染输出目录，镜像输入目录结构（默认: 输入目录同级的 {目录名}_rendered）'
+    )
+    parser.add_argument(
+        '--to',
+        default='text',
+        help=f"渲染格式，逗号分隔: {', '.join(RENDER_FORMATS)}（默认: text）"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='渲染进程数（默认: CPU核数）'
+    )
+    args = parser.parse_args(argv)
     
-    directory_path = Path(directory)
-    found_files = []
+    input_dir = Path(args.directory)
+    output_dir = Path(args.output) if args.output else input_dir.parent / f"{input_dir.name}_rendered"
+    formats = [fmt.strip() for fmt in args.to.split(',') if fmt.strip()]
+    try:
+        renderer = DocumentRenderer(formats, args.workers)
+    except Exception as e:
+        parser.error(str(e))
     
-    for ext in extensions:
-        found_files.extend(directory_path.glob(f"*{ext}"))
-        found_files.extend(directory_path.glob(f"*{ext.upper()}"))  # 同时匹配大写扩展名
+    print(f"渲染格式: {', '.join(formats)}")
+    print(f"输出目录: {output_dir}")
+    rendered = 0
+    failed = []
+    for document_path, written, error in renderer.iter_render(input_dir, output_dir):
+        if error:
+            failed.append((document_path, error))
+            print(f"✗ {document_path}: {error}")
+        else:
+            rendered += 1
+            print(f"✓ {Path(document_path).name} -> {', '.join(Path(path).name for path in written)}")
     
-    return [str(f) for f in found_files]
+    if not rendered and not failed:
+        print(f"在目录 {input_dir} 中没有找到结构化文档（转换时需使用 --keep-document）")
+        return
+    print(f"\n渲染完成! 成功: {rendered}, 失败: {len(failed)}")
 
 
 def main():
     """主函数"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'render':
+        render_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
         description='批量转换文档文件为Markdown格式',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -58,12 +409,64 @@ def main():
   # 转换多个文件
   python batch_convert.py file1.pdf file2.docx file3.txt
   
-  # 转换目录中的所有支持文件
-  python batch_convert.py -d /path/to/documents
+  # 递归转换目录中的所有支持文件（输出目录保持相同的子目录结构）
+  python batch_convert.py -d /path/to/documents -o ./output
+  
+  # 只转换匹配的文件，并排除某些子目录
+  python batch_convert.py -d ./docs --include "reports/*" --exclude "archive"
   
   # 转换文件到指定目录
   python batch_convert.py file1.pdf file2.docx -o ./output
   
+  # 将超过50页的PDF拆分为50页一段并行转换
+  python batch_convert.py big.pdf --split-pages 50 --split-workers 8
+  
+  # 使用异步任务接口，在服务端排队数百个任务
+  python batch_convert.py -d ./docs --async --async-inflight 500
+  
+  # 高并发但限制内存：估算占用超过2GB时暂停提交新文件
+  python batch_convert.py -d ./docs --workers 16 --memory-budget 2048
+  
+  # 海量文件时将所有输出写入单个SQLite数据库，需要时再导出为目录
+  python batch_convert.py -d ./docs -o ./output --store ./output/results.db
+  python batch_convert.py --export ./output/results.db -o ./exported
+  
+  # 多台机器处理同一个共享目录（在每台机器上运行相同命令）
+  python batch_convert.py -d /mnt/share/docs -o /mnt/share/output --work-dir /mnt/share/work
+  
+  # 按文档探测结果关闭不需要的OCR和公式增强，但扫描件目录中的PDF始终开启OCR
+  python batch_convert.py -d ./docs --auto-options --option-override .pdf:do_ocr=true
+  
+  # 数十万文件：Markdown和图片目录按文件名哈希前缀分两层存放
+  python batch_convert.py -d ./docs -o ./output --shard-depth 2
+  
+  # 找出最慢的5个文件的时间花在哪个阶段（同时记录内存峰值）
+  python batch_convert.py -d ./docs --profile slowest --profile-top 5 --profile-memory
+  
+  # 保存结构化文档，之后在本地渲染纯文本和切片，不再调用Docling服务
+  python batch_convert.py -d ./docs -o ./output --keep-document
+  python batch_convert.py render -d ./output --to text,chunks
+  
+  # 预测转换这批文件需要多久（8并发、2个Docling实例），不上传任何文件
+  python batch_convert.py -d ./docs -o ./output --plan --workers 8 --extra-url http://gpu2:9969/v1/convert/file
+  
+  # 在100个样本文件上比较转换选项、图片传输、合并请求和并发数，保存最快且输出差异不超过2%的配置
+  python batch_convert.py -d ./docs --autotune --autotune-sample 100 --autotune-threshold 0.02
+  python batch_convert.py -d ./docs -o ./output --tuned-profile autotune_profile.json
+  
+  # 多个Docling实例：请求轮流发送，耗时超过P95的请求向另一个实例发送副本
+  python batch_convert.py -d ./docs --workers 8 --url http://gpu1:9969/v1/convert/file \\
+      --extra-url http://gpu2:9969/v1/convert/file --hedge-percentile 95
+  
+  # 大量小文件：每个请求最多合并32个不超过256KB的文件
+  python batch_convert.py -d ./docs --batch-files 32
+  
+  # 所有文件都交给Docling服务转换（不使用本地快速转换）
+  python batch_convert.py -d ./docs --no-local
+  
+  # 守护进程模式：监听目录，新增或修改的文件稳定后自动转换
+  python batch_convert.py --watch ./inbox -o ./output --status-file ./status.json
+  
   # 指定并发数和Docling服务地址
   python batch_convert.py -d ./docs --workers 5 --url http://localhost:9969/v1/convert/file
   
@@ -79,7 +482,24 @@ def main():
     )
     parser.add_argument(
         '-d', '--directory',
-        help='要转换的目录路径（自动查找支持的文件）'
+        help='要转换的目录路径（递归查找支持的文件）'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        default=[],
+        help='只处理匹配该glob模式的文件（匹配相对路径或文件名，可多次指定）'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        help='跳过匹配该glob模式的文件或目录（可多次指定）'
+    )
+    parser.add_argument(
+        '--no-recursive',
+        action='store_true',
+        help='只扫描目录的顶层，不进入子目录'
     )
     parser.add_argument(
         '-o', '--output', 
@@ -92,58 +512,417 @@ def main():
         default=3,
         help='并发处理数（默认: 3）'
     )
+    parser.add_argument(
+        '--split-pages',
+        type=int,
+        default=0,
+        help='页数超过该值的PDF按此页数拆分为多个区间并行转换（默认: 0，不拆分）'
+    )
+    parser.add_argument(
+        '--split-workers',
+        type=int,
+        default=None,
+        help='页码区间转换的并发数（默认与 --workers 相同）'
+    )
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=3,
+        help='连接失败、超时或5xx时的最大重试次数（默认: 3）'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=1000,
+        help='单次请求截止时间上限（秒），实际截止时间按文件大小和观测吞吐计算（默认: 1000）'
+    )
+    parser.add_argument(
+        '--async',
+        dest='async_mode',
+        action='store_true',
+        help='使用Docling异步任务接口（提交、轮询、获取结果），任务在服务端排队'
+    )
+    parser.add_argument(
+        '--async-inflight',
+        type=int,
+        default=64,
+        help='异步模式下同时在服务端排队的最大任务数（默认: 64）'
+    )
+    parser.add_argument(
+        '--image-mode',
+        choices=['base64', 'zip'],
+        default='base64',
+        help='图片传输方式: base64 内嵌在JSON中；zip 请求ZIP结果，图片直接写入图片目录（默认: base64）'
+    )
+    parser.add_argument(
+        '--memory-budget',
+        type=int,
+        default=0,
+        help='在途文件估算内存总量上限（MB），小文件并发处理、超大文件串行处理（默认: 0，不限制）'
+    )
+    parser.add_argument(
+        '--store',
+        default=None,
+        help='将Markdown、图片和转换结果写入该SQLite数据库，而不是逐个文件写入输出目录'
+    )
+    parser.add_argument(
+        '--export',
+        default=None,
+        help='将指定的SQLite输出库导出为普通目录结构（导出到 -o 指定的目录）后退出'
+    )
+    parser.add_argument(
+        '--keep-document',
+        action='store_true',
+        help='同时保存压缩的Docling结构化文档（{name}.docling.json.gz），之后可用 render 子命令在本地渲染其他格式'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='容量规划：只扫描输入，按历史运行统计预测运行时长、内存峰值和输出大小，不上传任何文件'
+    )
+    parser.add_argument(
+        '--history',
+        action='append',
+        default=[],
+        metavar='PATH',
+        help='容量规划使用的历史转换报告、多节点日志、输出库或包含它们的目录（可多次指定，'
+             '默认读取输出目录、--work-dir 和 --store 中已有的记录）'
+    )
+    parser.add_argument(
+        '--autotune',
+        action='store_true',
+        help='自动调优：分层抽样后在不同转换选项、图片传输方式、合并请求和并发数下试转换，'
+             '推荐并保存最快且输出与全选项基线差异不超过阈值的配置（不写入输出目录）'
+    )
+    parser.add_argument(
+        '--autotune-sample',
+        type=int,
+        default=40,
+        help='调优样本文件数（按扩展名和大小分层，每层至少1个，默认: 40）'
+    )
+    parser.add_argument(
+        '--autotune-threshold',
+        type=float,
+        default=0.05,
+        help='允许的输出差异（与全选项基线的Markdown按行比较，样本平均，默认: 0.05）'
+    )
+    parser.add_argument(
+        '--autotune-workers',
+        default=None,
+        metavar='N,N,...',
+        help='调优比较的并发数（默认为 --workers 的一半、一倍和两倍）'
+    )
+    parser.add_argument(
+        '--autotune-save',
+        default='autotune_profile.json',
+        help='调优结果保存路径（默认: ./autotune_profile.json）'
+    )
+    parser.add_argument(
+        '--tuned-profile',
+        default=None,
+        metavar='PATH',
+        help='使用 --autotune 保存的配置（并发数、图片传输方式、合并请求、转换选项），命令行显式指定的参数优先'
+    )
+    parser.add_argument(
+        '--work-dir',
+        default=None,
+        help='多节点协同模式：各节点共享的工作目录（租约、完成标记和结果日志）'
+    )
+    parser.add_argument(
+        '--lease-ttl',
+        type=float,
+        default=120,
+        help='多节点模式下租约有效期（秒），超时未续约的文件会被其他节点接管（默认: 120）'
+    )
+    parser.add_argument(
+        '--auto-options',
+        action='store_true',
+        help='上传前探测每个文档（PDF文字层覆盖率、数学内容），只开启需要的OCR和公式增强'
+    )
+    parser.add_argument(
+        '--option-override',
+        action='append',
+        default=[],
+        metavar='EXT:KEY=VALUE',
+        help='按扩展名强制指定转换选项，如 .pdf:do_ocr=true,do_formula_enrichment=false（可多次指定）'
+    )
+    parser.add_argument(
+        '--extra-url',
+        action='append',
+        default=[],
+        metavar='URL',
+        help='其他Docling服务实例的URL（可多次指定），同步请求在 --url 和这些实例间轮流发送'
+    )
+    parser.add_argument(
+        '--hedge-percentile',
+        type=float,
+        default=0,
+        help='请求耗时超过同大小请求该百分位（如 95）时向另一个实例发送副本，先完成者生效（默认: 0，不对冲）'
+    )
+    parser.add_argument(
+        '--hedge-budget',
+        type=float,
+        default=0.05,
+        help='对冲请求占普通请求的比例上限（默认: 0.05）'
+    )
+    parser.add_argument(
+        '--shard-depth',
+        type=int,
+        choices=[0, 1, 2],
+        default=0,
+        help='按文件名哈希前缀分层存放输出（每层256个子目录，如 output/3f/a2/report.md），适合数十万文件（默认: 0，不分层）'
+    )
+    parser.add_argument(
+        '--batch-files',
+        type=int,
+        default=0,
+        help='把小文件合并为多文件请求，每个请求最多包含的文件数（默认: 0，不合并；异步模式下不合并）'
+    )
+    parser.add_argument(
+        '--batch-max-kb',
+        type=float,
+        default=4096,
+        help='每个多文件请求的总大小上限（KB，默认: 4096）'
+    )
+    parser.add_argument(
+        '--batch-small-kb',
+        type=float,
+        default=256,
+        help='不超过该大小（KB）的文件才参与合并（默认: 256）'
+    )
+    parser.add_argument(
+        '--batch-max-wait',
+        type=float,
+        default=2.0,
+        help='未满的文件组最多等待的秒数，超时后直接提交（默认: 2.0）'
+    )
+    parser.add_argument(
+        '--no-local',
+        action='store_true',
+        help='禁用本地快速转换，纯文本、简单HTML/XHTML和表格型XLSX也上传到Docling服务'
+    )
+    parser.add_argument(
+        '--local-workers',
+        type=int,
+        default=None,
+        help='本地快速转换的进程数（默认为CPU核数，最多4个）'
+    )
+    parser.add_argument(
+        '--local-timeout',
+        type=float,
+        default=30.0,
+        help='单个文件本地转换的超时时间（秒），超时后交给Docling服务（默认: 30）'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=['run', 'slowest'],
+        default=None,
+        help='剖析模式: run 采样整个运行；slowest 只保留最慢的 --profile-top 个文件（输出pstats和折叠栈）'
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=10,
+        help='slowest 模式下保留的文件数（默认: 10）'
+    )
+    parser.add_argument(
+        '--profile-dir',
+        default='profile',
+        help='剖析结果输出目录（默认: ./profile）'
+    )
+    parser.add_argument(
+        '--profile-interval',
+        type=float,
+        default=10,
+        help='采样间隔（毫秒，默认: 10）'
+    )
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='同时用 tracemalloc 记录内存峰值和分配位置（会明显降低运行速度）'
+    )
+    parser.add_argument(
+        '--watch',
+        action='append',
+        default=[],
+        metavar='DIR',
+        help='守护进程模式：持续监听该目录（可多次指定），新增或修改的文件自动转换'
+    )
+    parser.add_argument(
+        '--settle-time',
+        type=float,
+        default=2.0,
+        help='监听模式下文件大小和修改时间保持不变多久后才开始转换（秒，默认: 2）'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=5.0,
+        help='无法使用inotify时的目录轮询间隔（秒，默认: 5）'
+    )
+    parser.add_argument(
+        '--status-file',
+        default=None,
+        help='定期原子写入运行状态（完成数、吞吐、在途数、排队数、预计剩余时间）的JSON文件，供外部监控读取'
+    )
+    parser.add_argument(
+        '--progress-interval',
+        type=float,
+        default=1.0,
+        help='状态行（文件/秒、MB/秒、在途、排队、预计剩余时间）的刷新间隔（秒，默认: 1；0表示不显示；'
+             '输出不是终端时每30秒输出一行）'
+    )
+    parser.add_argument(
+        '--stall-factor',
+        type=float,
+        default=3.0,
+        help='请求在途时间超过同大小文件耗时p95的该倍数（且至少30秒）时提示卡住（默认: 3；0表示不检测）'
+    )
+    parser.add_argument(
+        '--status-port',
+        type=int,
+        default=0,
+        help='监听模式下在 127.0.0.1 的该端口提供 /status 状态接口（默认: 0，不启用）'
+    )
     parser.add_argument(
         '--url', 
         default='http://localhost:9969/v1/convert/file',
         help='Docling服务URL (默认: http://localhost:9969/v1/convert/file)'
     )
     
+    # 调优配置作为参数默认值，命令行显式指定的参数仍然优先
+    known, _ = parser.parse_known_args()
+    if known.tuned_profile:
+        try:
+            parser.set_defaults(**Autotuner.load_profile(known.tuned_profile))
+        except Exception as e:
+            parser.error(str(e))
     args = parser.parse_args()
     
-    # 确定输入文件列表
-    input_files = []
+    args.option_overrides = {}
+    for spec in args.option_override:
+        try:
+            ext, options = ConversionPlanner.parse_override(spec)
+        except ValueError as e:
+            parser.error(str(e))
+        args.option_overrides.setdefault(ext, {}).update(options)
     
-    if args.directory:
-        # 从目录中查找文件
-        input_files = find_files_in_directory(args.directory)
-        if not input_files:
-            print(f"在目录 {args.directory} 中没有找到支持的文件")
-            return
-        print(f"在目录 {args.directory} 中找到 {len(input_files)} 个文件")
-    
-    if args.input_files:
-        # 添加命令行指定的文件
-        input_files.extend(args.input_files)
+    if args.export:
+        export_dir = args.output or str(Path(args.export).with_suffix(''))
+        count = SqliteOutputStore.export(args.export, export_dir)
+        print(f"已从 {args.export} 导出 {count} 个文档到: {export_dir}")
+        return
     
-    if not input_files:
+    if not args.directory and not args.input_files and not args.watch:
         print("请指定要转换的文件或目录")
         parser.print_help()
         return
     
-    # 去重并移除重复项
-    input_files = list(set(input_files))
+    if args.watch:
+        # 守护进程逐个同步转换文件，不支持这些批量模式的参数
+        unsupported = [flag for flag, value in (('--async', args.async_mode), ('--memory-budget', args.memory_budget),
+                                                ('--work-dir', args.work_dir)) if value]
+        if unsupported:
+            parser.error(f"守护进程模式（--watch）不支持: {', '.join(unsupported)}")
+        watch_daemon(args)
+        return
     
-    print(f"总共需要处理 {len(input_files)} 个文件")
+    # 目录扫描与转换流水线并行进行：边遍历边提交
+    if args.directory:
+        print(f"正在扫描目录 {args.directory} ...")
+    input_files = iter_input_files(
+        args.directory,
+        args.input_files,
+        include=args.include,
+        exclude=args.exclude,
+        recursive=not args.no_recursive
+    )
+    
+    if args.autotune:
+        autotune(args, input_files)
+        return
+    
+    profiler = None
+    if args.profile:
+        profiler = RunProfiler(args.profile, args.profile_dir, top=args.profile_top,
+                               interval=args.profile_interval / 1000, memory=args.profile_memory)
+    
+    # 容量规划的历史数据：默认读取之前运行留在输出目录、工作目录和输出库中的记录
+    history = args.history or [
+        path for path in (args.output or args.directory, args.work_dir, args.store)
+        if path and Path(path).exists()
+    ]
     
     # 创建批量转换器并执行转换
     converter = BatchConverter(
         service_url=args.url,
-        max_workers=args.workers
+        max_workers=args.workers,
+        split_pages=args.split_pages,
+        split_workers=args.split_workers,
+        max_retries=args.max_retries,
+        max_timeout=args.timeout,
+        async_mode=args.async_mode,
+        async_inflight=args.async_inflight,
+        output_store=SqliteOutputStore(args.store) if args.store and not args.plan else None,
+        memory_budget_mb=args.memory_budget,
+        image_mode=args.image_mode,
+        work_leases=(WorkLeaseManager(args.work_dir, args.directory, args.lease_ttl)
+                     if args.work_dir and not args.plan else None),
+        auto_options=args.auto_options,
+        option_overrides=args.option_overrides,
+        local_convert=not args.no_local,
+        local_workers=args.local_workers,
+        local_timeout=args.local_timeout,
+        batch_files=args.batch_files,
+        batch_max_bytes=int(args.batch_max_kb * 1024),
+        batch_small_bytes=int(args.batch_small_kb * 1024),
+        batch_max_wait=args.batch_max_wait,
+        shard_depth=args.shard_depth,
+        extra_urls=args.extra_url,
+        hedge_percentile=args.hedge_percentile,
+        hedge_budget=args.hedge_budget,
+        keep_document=args.keep_document,
+        profiler=profiler,
+        history=history,
+        progress_interval=args.progress_interval,
+        status_file=args.status_file,
+        stall_factor=args.stall_factor
     )
     
+    if args.plan:
+        lines = converter.estimate_capacity(input_files)
+        print("\n容量规划（未上传任何文件）:")
+        for line in lines:
+            print(f"  {line}" if line else '')
+        rejections = converter.validator.get_rejection_summary()
+        if rejections:
+            print(f"  验证拒绝: {sum(rejections.values())} 个文件")
+        return
+    
+    if profiler is not None:
+        profiler.start()
     try:
-        results = converter.batch_convert(input_files, args.output)
+        success_count = 0
+        failed = []
+        for result in converter.iter_convert(input_files, args.output, source_root=args.directory,
+                                             on_progress=print_progress, on_event=print_event):
+            if result.ok:
+                success_count += 1
+            else:
+                failed.append((result.input_file, result.error))
         
-        successful = [r for r in results if r['status'] == 'success']
-        failed = [r for r in results if r['status'] == 'failed']
+        if not success_count and not failed:
+            if args.directory:
+                print(f"在目录 {args.directory} 中没有找到支持的文件")
+            return
         
         print(f"\n批量转换完成!")
-        print(f"成功: {len(successful)}, 失败: {len(failed)}")
+        print(f"成功: {success_count}, 失败: {len(failed)}")
         
         if failed:
             print("\n失败的文件:")
-            for result in failed:
-                print(f"  - {result['input_file']}: {result['error']}")
+            for input_file, error in failed:
+                print(f"  - {input_file}: {error}")
         
     except KeyboardInterrupt:
         print("\n转换被用户中断")
@@ -151,6 +930,18 @@ def main():
     except Exception as e:
         print(f"\n处理失败: {str(e)}")
         exit(1)
+    finally:
+        status_line.close()
+        converter.close()
+        if converter.output_store is not None:
+            converter.output_store.close()
+            print(f"输出已写入数据库: {converter.output_store.db_path}")
+        if converter.work_leases is not None:
+            converter.work_leases.close()
+        if profiler is not None:
+            print(f"\n剖析结果已保存到: {args.profile_dir}")
+            for path in profiler.stop():
+                print(f"  {path.name}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   autotuner.py
+@Time    :   2026/02/28 10:12:27
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+转换参数自动调优模块
+从输入中按扩展名和大小区间分层抽样，在不同的转换选项（OCR、公式增强）、图片传输方式、
+多文件请求合并和并发数下转换样本，测量耗时、吞吐和输出大小；
+在输出与全选项基线的差异不超过阈值的配置中选出最快的一个，并可保存为参数配置文件
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import shutil
+import difflib
+import statistics
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .batch_converter import BatchConverter, EventCallback
+from .conversion_result import ConversionResult
+from .file_validator import FileValidator
+
+
+# 转换选项候选（基线为全部开启，即 DEFAULT_OPTIONS）；'auto' 为逐个文件探测
+OPTION_CANDIDATES = [
+    {'do_ocr': 'false', 'do_formula_enrichment': 'true'},
+    {'do_ocr': 'true', 'do_formula_enrichment': 'false'},
+    {'do_ocr': 'false', 'do_formula_enrichment': 'false'},
+    'auto',
+]
+
+# 图片文件名中的时间戳（image_20260228_101227_001.png），每次转换都不同，比较输出前去掉
+IMAGE_TIMESTAMP_PATTERN = re.compile(r'image_\d{8}_\d{6}_(\d+)')
+
+
+class Autotuner:
+    """转换参数调优器 - 逐步比较各类参数，每一步保留更快且输出差异在阈值内的配置"""
+
+    # 大小区间按4倍划分（与容量规划相同）
+    BUCKET_BASE = 4
+    # 比当前最优配置至少快这么多才替换，避免测量波动导致来回切换
+    MIN_GAIN = 0.05
+
+    def __init__(self, converter_factory: Callable[..., BatchConverter], sample_size: int = 40,
+                 threshold: float = 0.05, workers: int = 1, worker_levels: List[int] = None,
+                 batch_files: int = 16, work_dir: str = None, seed: int = 0):
+        """
+        初始化调优器
+
+        Args:
+            converter_factory: 创建批量转换器的函数，接收 max_workers、image_mode、batch_files、
+                               auto_options、option_overrides 关键字参数（服务地址等其他参数由调用方固定）
+            sample_size: 样本文件数（每个分层至少1个）
+            threshold: 允许的输出差异（1 - 与基线Markdown按行比较的相似度，取样本平均值）
+            workers: 基线并发数
+            worker_levels: 比较的并发数（默认为基线的一半、一倍和两倍）
+            batch_files: 比较多文件请求合并时每组的文件数
+            work_dir: 各次试转换的输出目录（默认为临时目录，结束后删除）
+            seed: 抽样随机种子
+        """
+        self.converter_factory = converter_factory
+        self.sample_size = sample_size
+        self.threshold = threshold
+        self.workers = workers
+        self.worker_levels = worker_levels or sorted({max(1, workers // 2), workers, workers * 2})
+        self.batch_files = batch_files
+        self.work_dir = work_dir
+        self.random = random.Random(seed)
+        self.validator = FileValidator()
+        self.on_event: EventCallback = None
+        self.sample: List[str] = []
+        self.trials: List[Dict] = []
+        self.best: Optional[Dict] = None
+
+    @classmethod
+    def _stratum(cls, file_path: str, file_size: int) -> Tuple[str, int]:
+        """分层：(扩展名, 大小区间)"""
+        return Path(file_path).suffix.lower(), int(math.log(max(file_size, 1), cls.BUCKET_BASE))
+
+    def draw_sample(self, input_files: Iterable[str]) -> List[str]:
+        """
+        分层抽样：按各分层的文件数比例分配样本，每个分层至少1个
+
+        输入可以是惰性生成器；每个分层只保留一个固定大小的蓄水池，内存不随文件数增长。
+
+        Args:
+            input_files: 输入文件路径
+
+        Returns:
+            样本文件路径
+        """
+        counts = defaultdict(int)
+        reservoirs = defaultdict(list)
+        for file_path, is_valid, _ in self.validator.iter_validate(input_files):
+            if not is_valid:
+                continue
+            key = self._stratum(file_path, self.validator.get_file_size(file_path))
+            counts[key] += 1
+            reservoir = reservoirs[key]
+            if len(reservoir) < self.sample_size:
+                reservoir.append(file_path)
+            else:
+                index = self.random.randrange(counts[key])
+                if index < self.sample_size:
+                    reservoir[index] = file_path
+
+        population = sum(counts.values())
+        sample = []
+        for key in sorted(counts):
+            quota = max(1, round(self.sample_size * counts[key] / population))
+            # 未填满的蓄水池按扫描顺序排列，打乱后再截取
+            reservoir = reservoirs[key]
+            self.random.shuffle(reservoir)
+            sample.extend(reservoir[:quota])
+
+        self.sample = sample
+        self._emit('autotune_sample', files=len(sample), strata=len(counts), population=population)
+        return sample
+
+    def _emit(self, event: str, file_path: str = '', **info):
+        """触发事件回调（autotune_sample、autotune_trial）"""
+        if self.on_event is not None:
+            self.on_event(event, file_path, info)
+
+    @staticmethod
+    def describe(settings: Dict) -> str:
+        """配置的简短说明"""
+        options = settings['options']
+        if settings['auto_options']:
+            option_text = 'auto-options'
+        else:
+            options = options or {'do_ocr': 'true', 'do_formula_enrichment': 'true'}
+            option_text = (f"ocr={'on' if options['do_ocr'] == 'true' else 'off'} "
+                           f"formula={'on' if options['do_formula_enrichment'] == 'true' else 'off'}")
+        batching = f"合并{settings['batch_files']}" if settings['batch_files'] else '不合并'
+        return f"{option_text}, {settings['image_mode']}, {batching}, {settings['workers']}并发"
+
+    def _extensions(self) -> List[str]:
+        """样本中的扩展名"""
+        return sorted({Path(file_path).suffix.lower() for file_path in self.sample})
+
+    def _converter(self, settings: Dict) -> BatchConverter:
+        """按配置创建批量转换器（转换选项应用到样本中的所有扩展名）"""
+        overrides = None
+        if settings['options'] and not settings['auto_options']:
+            overrides = {ext: dict(settings['options']) for ext in self._extensions()}
+        return self.converter_factory(
+            max_workers=settings['workers'],
+            image_mode=settings['image_mode'],
+            batch_files=settings['batch_files'],
+            auto_options=settings['auto_options'],
+            option_overrides=overrides,
+        )
+
+    def _convert(self, settings: Dict, output_dir: Path) -> Tuple[List[ConversionResult], float]:
+        """用指定配置转换全部样本，返回结果和墙钟时间"""
+        converter = self._converter(settings)
+        source_root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in self.sample])
+        start = time.time()
+        try:
+            results = list(converter.iter_convert([os.path.abspath(f) for f in self.sample], str(output_dir),
+                                                  source_root=source_root))
+        finally:
+            converter.close()
+        return results, time.time() - start
+
+    @staticmethod
+    def _read_output(result: Optional[ConversionResult]) -> Optional[List[str]]:
+        """读取转换结果的Markdown行（图片引用去掉时间戳）"""
+        if result is None or not result.ok or not result.output_file:
+            return None
+        try:
+            with open(result.output_file, 'r', encoding='utf-8') as f:
+                return IMAGE_TIMESTAMP_PATTERN.sub(r'image_\1', f.read()).splitlines()
+        except OSError:
+            return None
+
+    def _diff(self, result: ConversionResult, baseline: Optional[ConversionResult]) -> float:
+        """与基线输出的差异（0为相同，1为完全不同或缺失）"""
+        baseline_lines = self._read_output(baseline)
+        if baseline_lines is None:
+            # 基线本身失败的文件不参与比较
+            return 0.0
+        lines = self._read_output(result)
+        if lines is None:
+            return 1.0
+        if lines == baseline_lines:
+            return 0.0
+        return 1.0 - difflib.SequenceMatcher(None, baseline_lines, lines).ratio()
+
+    def _run_trial(self, settings: Dict, baseline: Dict = None) -> Dict:
+        """
+        执行一次试转换并测量
+
+        Args:
+            settings: 配置
+            baseline: 基线试转换（为None时本次即为基线）
+
+        Returns:
+            测量结果
+        """
+        output_dir = Path(self.work_dir) / f"trial_{len(self.trials):02d}"
+        results, wall_seconds = self._convert(settings, output_dir)
+
+        ok = [result for result in results if result.ok]
+        durations = sorted(result.duration for result in ok)
+        input_bytes = sum(result.input_size for result in ok)
+
+        diffs = []
+        if baseline is not None:
+            baseline_results = baseline['results']
+            diffs = [self._diff(result, baseline_results.get(result.input_file)) for result in results]
+
+        trial = {
+            'label': '基线' if baseline is None else self.describe(settings),
+            'settings': settings,
+            'wall_seconds': round(wall_seconds, 2),
+            'files_per_second': round(len(ok) / wall_seconds, 3) if wall_seconds else 0.0,
+            'mb_per_second': round(input_bytes / 1024 / 1024 / wall_seconds, 3) if wall_seconds else 0.0,
+            'latency_p50': round(statistics.median(durations), 2) if durations else None,
+            'latency_p95': round(durations[int(0.95 * (len(durations) - 1))], 2) if durations else None,
+            'output_bytes': sum(result.output_size for result in ok),
+            'failed': len(results) - len(ok),
+            'diff_mean': round(statistics.mean(diffs), 4) if diffs else 0.0,
+            'diff_max': round(max(diffs), 4) if diffs else 0.0,
+            'output_dir': output_dir,
+        }
+        if baseline is None:
+            # 基线的输出保留到调优结束，供后续比较
+            trial['results'] = {result.input_file: result for result in results}
+        else:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        trial['accepted'] = baseline is None or (trial['failed'] <= baseline['failed']
+                                                  and trial['diff_mean'] <= self.threshold)
+        self.trials.append(trial)
+        self._emit('autotune_trial', **{key: value for key, value in trial.items()
+                                        if key not in ('results', 'output_dir', 'settings')})
+        return trial
+
+    def _try(self, settings: Dict, baseline: Dict):
+        """试转换一个配置，更快且输出差异在阈值内时成为当前最优配置"""
+        trial = self._run_trial(settings, baseline)
+        if trial['accepted'] and trial['wall_seconds'] < self.best['wall_seconds'] * (1 - self.MIN_GAIN):
+            self.best = trial
+
+    def tune(self, input_files: Iterable[str], on_event: EventCallback = None) -> Optional[Dict]:
+        """
+        抽样并逐步调优：先比较转换选项，再比较图片传输方式和多文件合并，最后比较并发数
+
+        逐步比较只需要 1 + 选项数 + 2 + 并发档位数 次试转换，而不是所有组合。
+
+        Args:
+            input_files: 输入文件路径（可以是惰性生成器）
+            on_event: 事件回调 (事件名, 文件路径, 附加信息)
+
+        Returns:
+            最优配置的测量结果，没有有效样本时为None
+        """
+        self.on_event = on_event
+        self.trials = []
+        if not self.draw_sample(input_files):
+            return None
+
+        created = self.work_dir is None
+        if created:
+            self.work_dir = tempfile.mkdtemp(prefix='autotune_')
+        try:
+            base_settings = {'options': None, 'auto_options': False, 'image_mode': 'base64',
+                             'batch_files': 0, 'workers': self.workers}
+
+            # 预热：服务端首次请求加载模型，不计入任何配置
+            converter = self._converter(base_settings)
+            try:
+                list(converter.iter_convert([os.path.abspath(self.sample[0])], str(Path(self.work_dir) / 'warmup')))
+            finally:
+                converter.close()
+
+            baseline = self._run_trial(base_settings)
+            self.best = baseline
+
+            for options in OPTION_CANDIDATES:
+                settings = dict(self.best['settings'])
+                settings['auto_options'] = options == 'auto'
+                settings['options'] = None if options == 'auto' else options
+                self._try(settings, baseline)
+
+            for change in ({'image_mode': 'zip'}, {'batch_files': self.batch_files}):
+                self._try(dict(self.best['settings'], **change), baseline)
+
+            for workers in self.worker_levels:
+                if workers != self.best['settings']['workers']:
+                    self._try(dict(self.best['settings'], workers=workers), baseline)
+
+            return self.best
+        finally:
+            if created:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
+                self.work_dir = None
+
+    def format_trials(self) -> List[str]:
+        """各次试转换的对比（供控制台输出）"""
+        lines = []
+        for trial in self.trials:
+            marker = '★' if trial is self.best else ('✓' if trial['accepted'] else '✗')
+            p50 = f"{trial['latency_p50']:.1f}秒" if trial['latency_p50'] is not None else '-'
+            p95 = f"{trial['latency_p95']:.1f}秒" if trial['latency_p95'] is not None else '-'
+            lines.append(
+                f"{marker} {self.describe(trial['settings'])}: {trial['wall_seconds']:.1f}秒，"
+                f"{trial['files_per_second']:.2f} 文件/秒，{trial['mb_per_second']:.2f} MB/秒，"
+                f"耗时p50 {p50} p95 {p95}，输出 {trial['output_bytes'] / 1024 / 1024:.2f} MB，"
+                f"失败 {trial['failed']}，差异 {trial['diff_mean']:.1%}（最大 {trial['diff_max']:.1%}）"
+            )
+        return lines
+
+    def profile_args(self) -> Dict:
+        """
+        最优配置对应的命令行参数（键为 argparse 的参数名）
+
+        Returns:
+            {'workers': ..., 'image_mode': ..., 'batch_files': ..., 'auto_options': ..., 'option_override': [...]}
+        """
+        settings = self.best['settings']
+        overrides = []
+        if settings['options'] and not settings['auto_options']:
+            assignments = ','.join(f"{key}={value}" for key, value in settings['options'].items())
+            overrides = [f"{ext}:{assignments}" for ext in self._extensions()]
+        return {
+            'workers': settings['workers'],
+            'image_mode': settings['image_mode'],
+            'batch_files': settings['batch_files'],
+            'auto_options': settings['auto_options'],
+            'option_override': overrides,
+        }
+
+    def recommended_flags(self) -> str:
+        """最优配置对应的命令行参数字符串"""
+        args = self.profile_args()
+        flags = [f"--workers {args['workers']}", f"--image-mode {args['image_mode']}"]
+        if args['batch_files']:
+            flags.append(f"--batch-files {args['batch_files']}")
+        if args['auto_options']:
+            flags.append('--auto-options')
+        flags.extend(f"--option-override {spec}" for spec in args['option_override'])
+        return ' '.join(flags)
+
+    def save_profile(self, profile_path: str) -> Path:
+        """
+        保存最优配置和各次试转换的测量结果
+
+        Args:
+            profile_path: 配置文件路径（JSON）
+
+        Returns:
+            配置文件路径
+        """
+        trials = [{key: value for key, value in trial.items() if key not in ('results', 'output_dir')}
+                  for trial in self.trials]
+        profile = {
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'sample_files': len(self.sample),
+            'threshold': self.threshold,
+            'args': self.profile_args(),
+            'trials': trials,
+        }
+        path = Path(profile_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False, indent=2)
+        return path
+
+    @staticmethod
+    def load_profile(profile_path: str) -> Dict:
+        """
+        读取调优保存的命令行参数
+
+        Args:
+            profile_path: 配置文件路径
+
+        Returns:
+            参数字典（键为 argparse 的参数名）
+        """
+        try:
+            with open(profile_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['args']
+        except (OSError, ValueError, KeyError) as e:
+            raise Exception(f"无法读取调优配置文件 {profile_path}: {e}")
@@ -19,105 +19,472 @@
 主控制器类，协调各组件工作
 """
 
+import os
+import sys
+import json
 import time
+import zipfile
+import asyncio
+import itertools
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import List, Dict
+from typing import AsyncIterator, Callable, List, Dict, Iterable, Iterator, Optional, Sized, Tuple
+from .conversion_result import ConversionResult
+from .file_scanner import FileScanner
 from .file_validator import FileValidator
 from .docling_client import DoclingClient
 from .image_processor import ImageProcessor
 from .table_processor import TableProcessor
 from .formula_processor import FormulaProcessor
-from .output_manager import OutputManager
+from .output_manager import OutputManager, DOCUMENT_SUFFIX
+from .pdf_splitter import PdfSplitter
+from .memory_budget import MemoryBudget
+from .work_lease import WorkLeaseManager
+from .option_planner import ConversionPlanner
+from .local_converter import LocalConverterRegistry, LocalConversionUnsupported
+from .sqlite_store import SqliteOutputStore
+from .run_profiler import RunProfiler
+from .capacity_planner import CapacityPlanner
+from .progress_monitor import ProgressMonitor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# 进度回调 (结果, 已完成数, 总数或None) 和事件回调 (事件名, 文件路径, 附加信息)
+ProgressCallback = Callable[[ConversionResult, int, Optional[int]], None]
+EventCallback = Callable[[str, str, Dict], None]
 
 
 class BatchConverter:
     """批量转换器 - 主控制器类"""
     
-    def __init__(self, service_url: str = "http://localhost:9969/v1/convert/file", max_workers: int = 1):
+    def __init__(self, service_url: str = "http://localhost:9969/v1/convert/file", max_workers: int = 1,
+                 split_pages: int = 0, split_workers: int = None,
+                 max_retries: int = 3, max_timeout: float = 1000.0,
+                 async_mode: bool = False, async_inflight: int = 64,
+                 output_store: SqliteOutputStore = None, memory_budget_mb: int = 0,
+                 image_mode: str = 'base64', work_leases: WorkLeaseManager = None,
+                 auto_options: bool = False, option_overrides: Dict[str, Dict[str, str]] = None,
+                 local_convert: bool = True, local_workers: int = None, local_timeout: float = 30.0,
+                 batch_files: int = 0, batch_max_bytes: int = 4 * 1024 * 1024,
+                 batch_small_bytes: int = 256 * 1024, batch_max_wait: float = 2.0, shard_depth: int = 0,
+                 extra_urls: List[str] = None, hedge_percentile: float = 0.0, hedge_budget: float = 0.05,
+                 profiler: RunProfiler = None, history: List[str] = None, keep_document: bool = False,
+                 progress_interval: float = 0.0, status_file: str = None, stall_factor: float = 3.0):
         """
         初始化批量转换器
         
         Args:
             service_url: Docling服务URL
             max_workers: 最大并发数
+            split_pages: 超过该页数的PDF按此页数拆分为多个区间并行转换，0表示不拆分
+            split_workers: 区间转换的并发数（默认与max_workers相同）
+            max_retries: 请求失败时的最大重试次数
+            max_timeout: 单次请求截止时间的上限（秒），实际截止时间按文件大小计算
+            async_mode: 使用Docling异步任务接口，任务在服务端排队，客户端只保留少量线程
+            async_inflight: 异步模式下同时在服务端排队的最大任务数
+            output_store: SQLite输出库，指定后Markdown、图片和结果写入数据库而不是目录（由调用方关闭）
+            memory_budget_mb: 在途文件估算内存总量上限（MB），0表示不限制
+            image_mode: 'base64' 图片内嵌在JSON响应中；'zip' 请求ZIP结果，图片直接写入图片目录
+            work_leases: 多节点协同的工作租约管理器，指定后只处理本节点领取到的文件（由调用方关闭）
+            auto_options: 上传前探测文档，只开启需要的OCR和公式增强
+            option_overrides: 按扩展名强制指定的转换选项，例如 {'.pdf': {'do_ocr': 'true'}}
+            local_convert: 纯文本、简单HTML/XHTML和表格型XLSX在本地转换，不上传到Docling服务
+            local_workers: 本地转换进程池大小（默认为CPU核数，最多4个）
+            local_timeout: 单个文件本地转换的超时时间（秒），超时后交给Docling
+            batch_files: 小文件合并为一个多文件请求时每组的最大文件数，0表示不合并（异步模式下不合并）
+            batch_max_bytes: 每组文件的总字节数上限
+            batch_small_bytes: 不超过该字节数的文件才参与合并
+            batch_max_wait: 未满的文件组最多等待的秒数，超时后直接提交
+            shard_depth: 按文件名哈希前缀分层存放Markdown和图片目录的层数，0表示不分层
+            extra_urls: 其他Docling服务实例的URL，同步请求在所有实例间轮流发送
+            hedge_percentile: 请求耗时超过同类请求该百分位时向另一个实例发送副本，0表示不对冲
+            hedge_budget: 对冲请求占普通请求的比例上限
+            profiler: 运行剖析器，按文件标记各线程的采样
+            history: 历史转换报告、多节点日志或输出库（或包含它们的目录），
+                     指定后按历史统计预测本次运行，结束时与实际结果对比
+            keep_document: 同时请求并压缩保存Docling的结构化文档（{name}.docling.json.gz），
+                           之后可在本地渲染为其他格式；所有文件都经过Docling服务（不做本地快速转换）
+            progress_interval: 每隔该秒数触发 progress 事件（吞吐、在途、排队、预计剩余时间）并检查卡住的请求，
+                               0表示不定时汇报
+            status_file: 定时原子写入运行状态的JSON文件，供外部监控读取
+            stall_factor: 请求在途时间超过同大小分类耗时p95的该倍数时触发 stalled 事件，0表示不检测
         """
         self.validator = FileValidator()
-        self.client = DoclingClient(service_url)
+        self.client = DoclingClient(
+            service_url,
+            max_retries=max_retries,
+            max_timeout=max_timeout,
+            async_mode=async_mode,
+            image_mode=image_mode,
+            extra_urls=extra_urls,
+            hedge_percentile=hedge_percentile,
+            hedge_budget=hedge_budget,
+            keep_document=keep_document
+        )
+        self.keep_document = keep_document
+        self.async_inflight = async_inflight
+        self.pdf_splitter = PdfSplitter(split_pages)
+        # 区间转换使用独立线程池，避免在文件级线程池内嵌套提交导致死锁
+        self.range_executor = ThreadPoolExecutor(max_workers=split_workers or max_workers) if split_pages > 0 else None
         self.image_processor = ImageProcessor()
         self.table_processor = TableProcessor()
         self.formula_processor = FormulaProcessor()  # 新增公式处理器
-        self.output_manager = OutputManager()
+        self.output_manager = OutputManager(shard_depth)
+        self.output_store = output_store
+        self.output_root = None
+        self.memory_budget = MemoryBudget(memory_budget_mb * 1024 * 1024)
+        self.work_leases = work_leases
+        self.planner = ConversionPlanner(auto_options, option_overrides)
+        self.local_converters = LocalConverterRegistry(local_convert and not keep_document, local_workers,
+                                                       local_timeout)
+        self.batch_files = batch_files
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_small_bytes = batch_small_bytes
+        self.batch_max_wait = batch_max_wait
+        self.profiler = profiler
+        self.capacity_planner = CapacityPlanner(max_workers, len(self.client.endpoints), self.memory_budget)
+        self.capacity_planner.load_history(history or [])
+        self.check_capacity = history is not None
+        self.progress = ProgressMonitor(stall_factor)
+        self.progress_interval = progress_interval
+        self.status_file = status_file
+        self.run_started = None
+        self.memory_baseline = 0
+        self.on_event: EventCallback = None  # 直接调用 process_single_file 时（监视模式）的事件回调
+        self.run_callbacks: List[EventCallback] = []  # 正在进行的运行的事件回调
+        self.running = False  # 进度、统计等状态按运行重置，同一转换器同时只允许一次运行
+        self.client.set_breaker_listener(self._broadcast_breaker)
         self.max_workers = max_workers
         self.lock = threading.Lock()
     
-    def process_single_file(self, input_file: str, output_dir: Path) -> Dict:
+    def process_single_file(self, input_file: str, output_dir: Path, task: Future = None,
+                            start_time: float = None, plan: Dict = None,
+                            emit: Callable[..., None] = None,
+                            page_ranges: List[Tuple[int, int]] = None,
+                            output_root: Path = None) -> ConversionResult:
         """
         处理单个文件
         
         Args:
             input_file: 输入文件路径
             output_dir: 输出目录
+            task: 已完成的异步转换任务（异步模式），为None时同步调用Docling服务
+            start_time: 任务提交时间，用于统计包含排队在内的总耗时
+            plan: 已完成的转换选项规划（异步任务提交时或分发前计算），为None时在此规划
+            emit: 本次运行的事件函数，为None时使用实例的 on_event 回调
+            page_ranges: 分发前已计算的页码区间，为None时在此计算
+            output_root: 输出根目录（输出库中的相对路径以此为准），为None时使用本次运行的输出目录
             
         Returns:
-            处理结果字典
+            处理结果
         """
-        start_time = time.time()
-        result = {
-            'input_file': input_file,
-            'output_file': '',
-            'status': 'pending',
-            'error': '',
-            'image_count': 0,
-            'formula_count': 0, 
-            'duration': 0
-        }
+        emit = emit or self._emit
+        output_root = output_root or self.output_root
+        start_time = start_time or time.time()
+        self.progress.start(input_file)
+        if self.profiler is not None:
+            self.profiler.begin(input_file)
+        result = ConversionResult(input_file)
+        cpu_start = time.thread_time()
+        markdown_content = None
+        images = [] if self.output_store else None
+        documents = [] if self.keep_document else None
         
         try:
             input_path = Path(input_file)
             base_name = input_path.stem
+            result.input_size = input_path.stat().st_size
             
-            # 1. 调用Docling服务转换
-            api_result = self.client.convert_file(input_path)
-            
-            # 2. 提取Markdown内容
-            markdown_content = self._extract_markdown(api_result)
-            
-            if not markdown_content:
-                raise Exception("无法从响应中提取Markdown内容")
+            # 1. 简单格式先尝试本地转换，内容超出本地处理能力时交给Docling
+            if task is None and self.local_converters.handles(input_file):
+                try:
+                    markdown_content = self.local_converters.convert(input_file)
+                    result.converter = 'local'
+                    result.response_size = len(markdown_content.encode('utf-8'))
+                except LocalConversionUnsupported as e:
+                    result.converter = f"docling（本地不支持: {e}）"
             
-            # 3. 生成输出文件名
+            # 2. 生成输出文件名（分层布局时放入哈希前缀子目录）
+            output_dir = self.output_manager.document_dir(output_dir, base_name)
             output_file = output_dir / f"{base_name}.md"
-            result['output_file'] = str(output_file)
+            result.output_file = str(output_file)
             
-            # 4. 提取并保存图片，更新图片引用
-            markdown_content, image_count = self.image_processor.extract_and_save_images(
-                markdown_content, 
-                output_dir, 
-                base_name
-            )
-            result['image_count'] = image_count
+            if markdown_content is None:
+                # 3. 规划转换选项（只开启文档需要的OCR和公式增强，分发前已规划的直接使用）
+                if task is None and plan is None:
+                    plan = self.planner.plan(input_file)
+                options = plan['options'] if plan else None
+                if plan:
+                    result.conversion_plan = plan['summary']
+                    result.plan_saved_seconds = plan['saved_seconds']
+                
+                # 4. 调用Docling服务转换（大PDF按页码区间并行转换）
+                if task is not None:
+                    page_ranges = []
+                elif page_ranges is None:
+                    page_ranges = self.pdf_splitter.plan_ranges(input_path)
+                if task is not None:
+                    api_results = [task.result()]
+                elif page_ranges:
+                    result.page_ranges = len(page_ranges)
+                    api_results = self._convert_page_ranges(input_path, page_ranges, options)
+                else:
+                    api_results = [self.client.convert_file(input_path, options=options)]
+                
+                # 5-6. 提取Markdown内容，保存图片并更新图片引用
+                # （使用输出库时图片暂存在内存中随文档一起写入）
+                image_sink = None
+                if self.output_store is not None:
+                    image_sink = lambda path, data: images.append((self._relative_output(path, output_root), data))
+                markdown_content, image_count = self._assemble_markdown(
+                    api_results,
+                    output_dir,
+                    base_name,
+                    image_sink,
+                    result,
+                    documents
+                )
+                result.image_count = image_count
             
-            # 5. 处理表格格式
+            if documents is not None and (not documents or None in documents):
+                # 服务没有返回结构化文档（旧版本docling-serve或ZIP中没有.json）：文件按失败处理，
+                # 否则报告显示成功而 render 子命令会悄悄跳过它
+                missing = documents.count(None) or 1
+                raise Exception(f"服务没有返回结构化文档（{missing} 个结果缺少JSON），无法保存 {DOCUMENT_SUFFIX}")
+            emit('converted', input_file, converter=result.converter)
+            
+            # 7. 处理表格格式
             markdown_content = self.table_processor.process_tables(markdown_content)
             
-            # 6. 处理数学公式（新增步骤）
+            # 8. 处理数学公式（新增步骤）
             markdown_content, formula_count = self.formula_processor.process_formulas(markdown_content)
-            result['formula_count'] = formula_count
+            result.formula_count = formula_count
+            
+            # 9. 保存Markdown文件
+            result.output_size = len(markdown_content.encode('utf-8'))
+            if self.output_store is None:
+                self.output_manager.save_markdown(markdown_content, output_file)
+                if result.image_count:
+                    result.output_size += self._directory_size(output_dir / f"{base_name}_images")
+            else:
+                result.output_size += sum(len(data) for _, data in images)
             
-            # 7. 保存Markdown文件
-            self.output_manager.save_markdown(markdown_content, output_file)
+            # 10. 保存压缩的结构化文档（输出库模式下与图片一起写入数据库）
+            if documents is not None:
+                document_path = output_dir / f"{base_name}{DOCUMENT_SUFFIX}"
+                data = self.output_manager.compress_document(documents)
+                if self.output_store is None:
+                    self.output_manager.save_bytes(data, document_path)
+                else:
+                    images.append((self._relative_output(document_path, output_root), data))
+                result.output_size += len(data)
             
-            result['status'] = 'success'
+            result.status = 'success'
             
         except Exception as e:
-            result['status'] = 'failed'
-            result['error'] = str(e)
+            result.status = 'failed'
+            result.error = str(e)
+            markdown_content = None
+        
+        result.cpu_time = time.thread_time() - cpu_start
+        result.duration = time.time() - start_time
+        if self.profiler is not None:
+            self.profiler.end(input_file, result.duration)
+        
+        if self.output_store is not None:
+            self._store_document(result, markdown_content, images, output_root)
+        if result.status == 'success':
+            emit('saved', input_file, output_file=result.output_file)
         
-        result['duration'] = time.time() - start_time
         return result
     
+    @staticmethod
+    def _directory_size(directory: Path) -> int:
+        """目录中文件的总字节数（不递归）"""
+        try:
+            with os.scandir(directory) as entries:
+                return sum(entry.stat().st_size for entry in entries if entry.is_file())
+        except OSError:
+            return 0
+    
+    def _process_group(self, group: List[Tuple[str, Path, Dict]], emit: Callable[..., None]
+                       ) -> Tuple[List[ConversionResult], List[Tuple[str, Path]]]:
+        """
+        在一个多文件请求中转换一组小文件，再逐个做后处理
+        
+        整组请求失败或某个文档不在结果中时，这些文件交回调用方，作为单独的任务重新提交到线程池。
+        
+        Args:
+            group: [(文件路径, 输出目录, 转换选项规划)]，同组文件的转换选项相同
+            emit: 本次运行的事件函数
+            
+        Returns:
+            (已转换文件的处理结果, 需要单独重新转换的 [(文件路径, 输出目录, 转换选项规划)])
+        """
+        start_time = time.time()
+        plan = group[0][2]
+        for file_path, _, _ in group:
+            self.progress.start(file_path)
+        error = ''
+        try:
+            api_results = self.client.convert_files([file_path for file_path, _, _ in group],
+                                                    options=plan['options'] if plan else None)
+        except Exception as e:
+            api_results = {}
+            error = str(e)
+        
+        missing = len(group) - len(api_results)
+        if missing:
+            emit('batch_retry', files=missing, group=len(group), error=error)
+        
+        results = []
+        retry = []
+        for file_path, file_output_dir, file_plan in group:
+            api_result = api_results.pop(str(Path(file_path)), None)
+            if api_result is None:
+                retry.append((file_path, file_output_dir, file_plan))
+                continue
+            
+            # 以已完成的future交给后处理，与异步任务结果的处理方式相同
+            task = Future()
+            task.set_result(api_result)
+            result = self.process_single_file(file_path, file_output_dir, task, start_time, file_plan, emit)
+            results.append(result)
+        
+        return results, retry
+    
+    @staticmethod
+    def _relative_output(path: Path, output_root: Optional[Path]) -> str:
+        """计算输出文件相对于输出根目录的路径（用于输出库）"""
+        try:
+            return Path(path).relative_to(output_root).as_posix()
+        except (TypeError, ValueError):
+            return Path(path).name
+    
+    def _store_document(self, result: ConversionResult, markdown_content: str, images: List[Tuple[str, bytes]],
+                        output_root: Optional[Path]):
+        """将文档写入SQLite输出库"""
+        try:
+            source_hash = SqliteOutputStore.hash_file(result.input_file)
+        except OSError:
+            source_hash = ''
+        
+        output_path = self._relative_output(result.output_file, output_root) if markdown_content is not None else ''
+        self.output_store.save_document(result.to_dict(), markdown_content, output_path, images, source_hash)
+    
+    def _assemble_markdown(self, api_results: List[Dict], output_dir: Path, base_name: str,
+                           image_sink, result: ConversionResult, documents: List[bytes] = None) -> Tuple[str, int]:
+        """
+        从一个或多个（按页码顺序的）API结果中组装Markdown并保存图片
+        
+        Args:
+            api_results: API结果列表
+            output_dir: 输出目录
+            base_name: 基础文件名
+            image_sink: 图片写入函数，为None时写入磁盘
+            result: 处理结果（累加传输字节数、记录响应字节数）
+            documents: 收集各结果中的结构化文档JSON（缺失的为None），None表示不收集
+            
+        Returns:
+            (Markdown内容, 图片数量)
+        """
+        parts = []
+        image_count = 0
+        from_archive = False
+        
+        for api_result in api_results:
+            if isinstance(api_result, dict):
+                result.transfer_bytes += api_result.get('transfer_bytes', 0)
+                result.hedged_requests += api_result.get('hedged', 0)
+                result.hedge_wins += api_result.get('hedge_won', 0)
+            
+            if isinstance(api_result, dict) and 'archive' in api_result:
+                # ZIP结果：图片条目直接复制到图片目录，编号在各区间之间保持连续
+                from_archive = True
+                with api_result['archive'] as archive:
+                    if documents is not None:
+                        documents.append(self._archive_document(archive))
+                    part, count = self.image_processor.extract_zip_archive(
+                        archive, output_dir, base_name, image_sink, start_index=image_count
+                    )
+                image_count += count
+            else:
+                part = self._extract_markdown(api_result)
+                if documents is not None:
+                    json_content = api_result.get('document', {}).get('json_content') \
+                        if isinstance(api_result, dict) else None
+                    documents.append(json.dumps(json_content, ensure_ascii=False).encode('utf-8')
+                                     if json_content is not None else None)
+            parts.append(part or '')
+        
+        markdown_content = self.pdf_splitter.stitch(parts) if len(parts) > 1 else parts[0]
+        
+        if not markdown_content:
+            raise Exception("无法从响应中提取Markdown内容")
+        # 响应大小按实际接收的字节数（含结构化JSON和图片）计，供内存预算修正估算
+        result.response_size = result.transfer_bytes or len(markdown_content.encode('utf-8'))
+        
+        if not from_archive:
+            # base64结果：图片在拼接后统一解码，编号在整个文档内保持连续
+            markdown_content, image_count = self.image_processor.extract_and_save_images(
+                markdown_content, 
+                output_dir, 
+                base_name,
+                image_sink=image_sink
+            )
+        
+        return markdown_content, image_count
+    
+    def _convert_page_ranges(self, input_path: Path, page_ranges: List[Tuple[int, int]],
+                             options: Dict[str, str] = None) -> List[Dict]:
+        """
+        并行转换PDF的各个页码区间
+        
+        Args:
+            input_path: PDF文件路径
+            page_ranges: 页码区间列表
+            options: 转换选项（所有区间相同）
+            
+        Returns:
+            按页码顺序排列的API结果列表
+        """
+        if self.client.async_mode:
+            futures = [self.client.submit_file(input_path, page_range, options) for page_range in page_ranges]
+        else:
+            futures = [
+                self.range_executor.submit(self.client.convert_file, input_path, page_range, options)
+                for page_range in page_ranges
+            ]
+        
+        api_results = []
+        for page_range, future in zip(page_ranges, futures):
+            try:
+                api_results.append(future.result())
+            except Exception as e:
+                for pending in futures:
+                    pending.cancel()
+                raise Exception(f"第 {page_range[0]}-{page_range[1]} 页转换失败: {str(e)}")
+        
+        return api_results
+    
+    @staticmethod
+    def _archive_document(archive) -> Optional[bytes]:
+        """读取ZIP结果中的结构化文档JSON，读取后压缩包回到开头"""
+        try:
+            with zipfile.ZipFile(archive) as zf:
+                for name in zf.namelist():
+                    if name.lower().endswith('.json'):
+                        return zf.read(name)
+            return None
+        finally:
+            archive.seek(0)
+    
     def _extract_markdown(self, result: dict) -> str:
         """
         从API响应中提取Markdown内容
@@ -134,68 +501,514 @@ class BatchConverter:
             return result
         return None
     
-    def batch_convert(self, input_files: List[str], output_dir: str = None) -> List[Dict]:
+    def _emit(self, event: str, file_path: str = '', **info):
         """
-        批量转换文件
-        
+        触发事件回调
+
+        事件: validated / rejected（验证）、started（开始转换）、converted（转换完成，附带转换路径）、
+        saved（输出已写入）、batch_retry（多文件请求中的文件改为逐个转换）、
+        breaker（熔断状态变化）、hedging（请求对冲统计）、memory_budget、
+        leases（多节点统计）、capacity（容量预测对比）、progress（定时进度）、stalled（请求耗时远超同类文件）、
+        report（报告已生成）、empty（没有有效文件）
+        """
+        if self.on_event is not None:
+            self.on_event(event, file_path, info)
+
+    def _emitter(self, on_event: EventCallback) -> Callable[..., None]:
+        """
+        生成一次运行专用的事件函数
+
+        回调随调用传递而不保存在实例上，不会覆盖监视模式下实例的 on_event 回调。
+
         Args:
-            input_files: 输入文件路径列表
-            output_dir: 输出目录
-            
+            on_event: 本次运行的事件回调，可以为None
+
         Returns:
-            转换结果列表
+            事件函数 (事件名, 文件路径, **附加信息)
         """
-        # 验证输入文件
-        validation_results = self.validator.validate_files(input_files)
-        
-        valid_files = []
-        for file_path, is_valid, error_msg in validation_results:
+        def emit(event: str, file_path: str = '', **info):
+            if on_event is not None:
+                on_event(event, file_path, info)
+        return emit
+
+    def _broadcast_breaker(self, state: str, message: str):
+        """熔断状态变化（客户端共享）通知所有正在进行的运行，没有运行时通知实例的 on_event 回调"""
+        with self.lock:
+            callbacks = list(self.run_callbacks)
+        if not callbacks and self.on_event is not None:
+            callbacks = [self.on_event]
+        for callback in callbacks:
+            callback('breaker', '', {'state': state, 'message': message})
+
+    def _iter_valid_files(self, input_files: Iterable[str], emit: Callable[..., None]) -> Iterator[str]:
+        """
+        并行验证输入文件（按输入顺序），只产出验证通过的文件
+
+        Args:
+            input_files: 输入文件路径（可以是惰性生成器）
+            emit: 本次运行的事件函数
+
+        Yields:
+            验证通过的文件路径
+        """
+        for file_path, is_valid, error_msg in self.validator.iter_validate(input_files):
             if is_valid:
-                valid_files.append(file_path)
-                print(f"✓ 验证通过: {Path(file_path).name}")
+                emit('validated', file_path)
+                yield file_path
             else:
-                print(f"✗ 验证失败: {error_msg}")
-        
-        if not valid_files:
-            print("没有有效的文件需要转换")
-            return []
-        
+                self.progress.reject()
+                emit('rejected', file_path, error=error_msg)
+
+    def _prepare(self, file_path: str, prepare: bool
+                 ) -> Optional[Tuple[str, Optional[List[Tuple[int, int]]], Optional[Dict]]]:
+        """领取租约，计算页码区间和转换选项规划，租约被其他节点持有时返回None"""
+        # 多节点模式：只处理本节点成功领取的文件
+        if self.work_leases is not None and not self.work_leases.claim(file_path):
+            return None
+        if not prepare or self.local_converters.handles(file_path):
+            return file_path, None, None
+        try:
+            return file_path, self.pdf_splitter.plan_ranges(Path(file_path)), self.planner.plan(file_path)
+        except Exception:
+            # 读取失败时交给工作线程重新计算并报告错误
+            return file_path, None, None
+
+    def _iter_prepared(self, file_paths: Iterable[str], prepare: bool
+                       ) -> Iterator[Tuple[str, Optional[List[Tuple[int, int]]], Optional[Dict]]]:
+        """
+        在线程池中领取租约、统计PDF页数并规划转换选项（按输入顺序惰性产出），不占用分发线程
+
+        页数统计和选项探测都要读取PDF，每个文件只计算一次，结果随文件交给工作线程。
+
+        Args:
+            file_paths: 验证通过的文件路径
+            prepare: 是否在分发前计算页码区间和规划（合并小文件和异步模式在分发时就需要）
+
+        Yields:
+            (文件路径, 页码区间, 转换选项规划)，页码区间为None表示由工作线程计算；被其他节点领取的文件不产出
+        """
+        if self.work_leases is None and not prepare:
+            for file_path in file_paths:
+                yield file_path, None, None
+            return
+
+        window = deque()
+        max_pending = self.validator.max_workers * 2
+        with ThreadPoolExecutor(max_workers=self.validator.max_workers) as executor:
+            for file_path in file_paths:
+                window.append(executor.submit(self._prepare, file_path, prepare))
+                while len(window) >= max_pending or (window and window[0].done()):
+                    prepared = window.popleft().result()
+                    if prepared is not None:
+                        yield prepared
+
+            while window:
+                prepared = window.popleft().result()
+                if prepared is not None:
+                    yield prepared
+
+    def _begin_run(self):
+        """标记运行开始，已有运行在进行时抛出异常"""
+        with self.lock:
+            if self.running:
+                raise Exception("该转换器已有一次运行在进行中，同时进行多次运行请分别创建转换器")
+            self.running = True
+
+    def _end_run(self):
+        """标记运行结束"""
+        with self.lock:
+            self.running = False
+
+    def iter_convert(self, input_files: Iterable[str], output_dir: str = None, source_root: str = None,
+                     on_progress: ProgressCallback = None, on_event: EventCallback = None
+                     ) -> Iterator[ConversionResult]:
+        """
+        批量转换文件，按完成顺序逐个产出结果
+
+        input_files 可以是列表，也可以是 FileScanner.scan 返回的生成器。
+        文件边验证边提交，扫描尚未结束时转换就已经开始；在途任务数有上限，
+        结果产出后不再保留（报告明细写入临时文件），内存占用不随文件数增长。
+        库代码不打印任何内容，进度和各阶段事件通过回调通知。
+        同一个转换器同时只能进行一次运行（上一次运行的迭代器结束或关闭后才能开始下一次）。
+
+        Args:
+            input_files: 输入文件路径列表或可迭代对象
+            output_dir: 输出目录
+            source_root: 扫描根目录，指定后按相对路径镜像输出目录结构
+            on_progress: 每完成一个文件调用 (结果, 已完成数, 总数或None)
+            on_event: 各阶段事件回调 (事件名, 文件路径, 附加信息)
+
+        Yields:
+            转换结果
+        """
+        self._begin_run()
+        try:
+            yield from self._run(input_files, output_dir, source_root, on_progress, on_event)
+        finally:
+            self._end_run()
+
+    def _run(self, input_files: Iterable[str], output_dir: Optional[str], source_root: Optional[str],
+             on_progress: Optional[ProgressCallback], on_event: Optional[EventCallback]
+             ) -> Iterator[ConversionResult]:
+        """一次批量转换运行（参数同 iter_convert）"""
+        emit = self._emitter(on_event)
+        self.run_started = time.time()
+        self.memory_baseline = self._peak_memory()
+        self.memory_budget.reset()
+        self.output_manager.reset()
+        self.capacity_planner.reset()
+        self.validator.reset()
+        total = len(input_files) if isinstance(input_files, Sized) else None
+        self.progress.reset(total)
+        valid_files = self._iter_valid_files(input_files, emit)
+
+        # 取第一个有效文件以确定默认输出目录
+        first_file = next(valid_files, None)
+        if first_file is None:
+            emit('empty')
+            return
+
         # 确定输出目录
         if output_dir:
             output_path = Path(output_dir)
+        elif source_root:
+            output_path = Path(source_root)
         else:
-            output_path = Path(valid_files[0]).parent
-        
+            output_path = Path(first_file).parent
+
         output_path.mkdir(parents=True, exist_ok=True)
+        self.output_root = output_path
+
+        # 生成报告（多节点模式下每个节点单独一份报告）
+        report_name = "conversion_report.txt"
+        if self.work_leases is not None:
+            report_name = f"conversion_report_{self.work_leases.node_id}.txt"
+        report = self.output_manager.open_report(output_path, report_name)
+
+        emit(
+            'started',
+            output_dir=str(output_path.absolute()),
+            total=total,
+            workers=self.max_workers,
+            async_inflight=self.async_inflight if self.client.async_mode else None
+        )
+        if self.progress_interval > 0 or self.status_file:
+            self.progress.start_reporting(self.progress_interval or 5.0,
+                                          lambda event, file_path, info: emit(event, file_path, **info),
+                                          self.status_file)
+
+        # 并发处理文件，限制在途任务数量
+        max_pending = self.async_inflight if self.client.async_mode else self.max_workers * 2
+        completed = 0
+        finished = False
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = set()
+        # 异步任务future -> (文件路径, 输出目录, 提交时间, 转换选项规划)
+        tasks = {}
+        # 文件路径 -> (文件大小, 占用的内存预算)
+        admitted = {}
+        # 尚未提交的小文件组：转换选项 -> ([(文件路径, 输出目录, 规划)], 总字节数, 创建时间)
+        open_groups = {}
+        # 多文件请求的future
+        groups_submitted = set()
+        batching = self.batch_files > 0 and not self.client.async_mode
+        # 合并小文件和异步模式在分发时就需要页码区间和规划，提前在线程池中计算
+        prepare = batching or self.client.async_mode
+
+        def submit_group(group):
+            future = executor.submit(self._process_group, group, emit)
+            groups_submitted.add(future)
+            pending.add(future)
+
+        def flush_groups(max_wait: float = 0.0):
+            # 提交等待时间超过 max_wait 的文件组（默认全部提交），避免小文件长期占用内存预算和租约
+            now = time.monotonic()
+            for key, (group, _, opened_at) in list(open_groups.items()):
+                if now - opened_at >= max_wait:
+                    submit_group(group)
+                    del open_groups[key]
+
+        def collect(done) -> Iterator[ConversionResult]:
+            for future in done:
+                if future in groups_submitted:
+                    # 多文件请求：每个文件单独计数和汇报，未转换的文件作为单独的任务重新提交
+                    groups_submitted.discard(future)
+                    results, retry = future.result()
+                    for file_path, file_output_dir, file_plan in retry:
+                        pending.add(executor.submit(self.process_single_file, file_path, file_output_dir,
+                                                    plan=file_plan, emit=emit, page_ranges=[]))
+                    for result in results:
+                        yield from finish(result)
+                    continue
+                if future in tasks:
+                    # 服务端任务已完成，交给线程池做后处理
+                    file_path, file_output_dir, submitted_at, plan = tasks.pop(future)
+                    pending.add(executor.submit(
+                        self.process_single_file, file_path, file_output_dir, future, submitted_at, plan, emit
+                    ))
+                    continue
+
+                yield from finish(future.result())
+
+        def finish(result: ConversionResult) -> Iterator[ConversionResult]:
+            nonlocal completed
+            completed += 1
+
+            # 释放内存预算，并用实际响应大小修正估算
+            file_size, cost = admitted.pop(result.input_file, (0, 0))
+            self.memory_budget.release(cost)
+            self.memory_budget.observe(result.input_file, file_size, result.response_size)
+
+            # 多节点模式：写入共享日志并释放租约
+            if self.work_leases is not None:
+                self.work_leases.complete(result.to_dict())
+
+            report.add(result)
+            self.capacity_planner.observe(result)
+            self.progress.finish(result)
+            if on_progress is not None:
+                on_progress(result, completed, total)
+            yield result
+
+        def admit(file_path: str, page_ranges: Optional[List[Tuple[int, int]]],
+                  plan: Optional[Dict]) -> Iterator[ConversionResult]:
+            # 内存准入并提交一个已领取的文件，在途任务达到上限时先收集已完成的结果
+            nonlocal pending
+            # 输出目录在写入时才创建
+            file_output_dir = FileScanner.mirrored_output_dir(file_path, source_root, output_path)
+
+            # 内存准入：预算不足时先提交未满的文件组，再等待已提交的文件完成
+            file_size = self.validator.get_file_size(file_path)
+            cost = self.memory_budget.estimate(file_path, file_size)
+            while not self.memory_budget.try_acquire(cost):
+                flush_groups()
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+            admitted[file_path] = (file_size, cost)
+            self.capacity_planner.add(file_path, file_size)
+            self.progress.queue(file_path, file_size)
+
+            if (batching and file_size <= self.batch_small_bytes
+                    and not self.local_converters.handles(file_path) and not page_ranges):
+                # 小文件：按转换选项分组，达到文件数或字节数上限时作为一个请求提交
+                key = json.dumps(plan['options'] if plan else None, sort_keys=True)
+                group, group_bytes, opened_at = open_groups.pop(key, ([], 0, time.monotonic()))
+                if group and group_bytes + file_size > self.batch_max_bytes:
+                    submit_group(group)
+                    group, group_bytes, opened_at = [], 0, time.monotonic()
+                group.append((file_path, file_output_dir, plan))
+                if len(group) >= self.batch_files:
+                    submit_group(group)
+                else:
+                    open_groups[key] = (group, group_bytes + file_size, opened_at)
+            elif self.client.async_mode and not self.local_converters.handles(file_path) and not page_ranges:
+                task = self.client.submit_file(file_path, options=plan['options'] if plan else None)
+                tasks[task] = (file_path, file_output_dir, time.time(), plan)
+                pending.add(task)
+                self.progress.start(file_path)
+            else:
+                pending.add(executor.submit(self.process_single_file, file_path, file_output_dir,
+                                            plan=plan, emit=emit, page_ranges=page_ranges))
+
+            if open_groups:
+                flush_groups(self.batch_max_wait)
+            while len(pending) >= max_pending:
+                # 有未满的文件组时限时等待，超时后提交等待过久的文件组
+                done, pending = wait(pending, timeout=self.batch_max_wait if open_groups else None,
+                                     return_when=FIRST_COMPLETED)
+                flush_groups(self.batch_max_wait)
+                yield from collect(done)
+
+        def take_expired_leases() -> Iterator[ConversionResult]:
+            # 接管已崩溃节点遗留的过期租约
+            nonlocal leases_checked
+            leases_checked = time.monotonic()
+            expired = self._iter_valid_files(self.work_leases.iter_expired(), emit)
+            for file_path, page_ranges, plan in self._iter_prepared(expired, prepare):
+                yield from admit(file_path, page_ranges, plan)
+
+        # 多节点模式下收尾阶段定期检查过期租约，运行期间崩溃的节点留下的文件也能接管
+        lease_check_interval = self.work_leases.lease_ttl / 2 if self.work_leases is not None else None
+        leases_checked = time.monotonic()
+
+        if on_event is not None:
+            with self.lock:
+                self.run_callbacks.append(on_event)
+        try:
+            candidates = itertools.chain([first_file], valid_files)
+            for file_path, page_ranges, plan in self._iter_prepared(candidates, prepare):
+                yield from admit(file_path, page_ranges, plan)
+            if self.work_leases is not None:
+                yield from take_expired_leases()
+
+            # 提交未满的文件组，收集剩余结果（异步任务完成后还会产生后处理任务）
+            flush_groups()
+            while pending:
+                done, pending = wait(pending, timeout=lease_check_interval, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+                if (self.work_leases is not None
+                        and time.monotonic() - leases_checked >= lease_check_interval):
+                    yield from take_expired_leases()
+                    flush_groups()
+            finished = True
+        finally:
+            # 调用方提前停止迭代时取消尚未开始的后处理任务（服务端任务由轮询线程完成）
+            for future in pending:
+                if future not in tasks:
+                    future.cancel()
+            executor.shutdown(wait=True)
+            # 未经 finish 的文件（提前停止、出错或被取消）归还占用的内存预算
+            for _, cost in admitted.values():
+                self.memory_budget.release(cost)
+            admitted.clear()
+            if on_event is not None:
+                with self.lock:
+                    self.run_callbacks.remove(on_event)
+            self._finish(output_path, report, completed, finished, emit)
+
+    def _finish(self, output_path: Path, report, completed: int, finished: bool, emit: Callable[..., None]):
+        """收尾：停止进度汇报，生成报告（输出库和租约由调用方关闭）"""
+        self.progress.stop_reporting()
+        if self.memory_budget.enabled:
+            emit('memory_budget', peak_bytes=self.memory_budget.peak_bytes,
+                       budget_bytes=self.memory_budget.budget_bytes)
+
+        if self.client.hedge_percentile:
+            emit('hedging', **self.client.hedge_stats)
+
+        if self.work_leases is not None:
+            emit('leases', node_id=self.work_leases.node_id, processed=completed,
+                       stolen=self.work_leases.stolen_count)
+
+        if not finished:
+            report.discard()
+            return
         
-        print(f"\n开始批量转换 {len(valid_files)} 个文件...")
-        print(f"输出目录: {output_path.absolute()}")
-        print(f"并发数: {self.max_workers}")
-        
-        # 并发处理文件
-        results = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交任务
-            future_to_file = {
-                executor.submit(self.process_single_file, file_path, output_path): file_path 
-                for file_path in valid_files
-            }
-            
-            # 收集结果
-            completed = 0
-            for future in as_completed(future_to_file):
-                result = future.result()
-                results.append(result)
-                completed += 1
-                
-                # 显示进度
-                status_symbol = "✓" if result['status'] == 'success' else "✗"
-                print(f"[{completed}/{len(valid_files)}] {status_symbol} {Path(result['input_file']).name}")
-        
-        # 清理空的图片目录
-        self.image_processor.cleanup_empty_image_dirs(output_path)
-        
-        # 生成报告
-        self.output_manager.generate_report(results, output_path)
+        # 记录运行级信息（后续运行的容量规划读取），并与运行前的预测对比
+        wall_seconds = time.time() - self.run_started
+        peak_memory = self._peak_memory()
+        report.run_lines = [
+            f"并发线程: {self.max_workers}，服务实例: {len(self.client.endpoints)}",
+            f"运行时长: {wall_seconds:.1f}秒",
+        ]
+        if peak_memory:
+            report.run_lines.append(f"内存峰值: {peak_memory / 1024 / 1024:.0f} MB")
+        if self.check_capacity:
+            report.plan_lines = self.capacity_planner.format_comparison(wall_seconds,
+                                                                        peak_memory - self.memory_baseline)
+            emit('capacity', lines=report.plan_lines)
+        report_path = report.close(self.validator.get_rejection_summary())
+        emit('report', path=str(report_path))
+
+    @staticmethod
+    def _peak_memory() -> int:
+        """进程的内存峰值（字节），无法获取时为0"""
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 上单位为KB，macOS 上为字节
+        return peak if sys.platform == 'darwin' else peak * 1024
+    
+    def estimate_capacity(self, input_files: Iterable[str], on_event: EventCallback = None) -> List[str]:
+        """
+        只验证和统计输入文件，按历史统计预测运行时长、内存峰值和输出大小，不上传任何文件
         
-        return results
\ No newline at end of file
+        Args:
+            input_files: 输入文件路径列表或可迭代对象
+            on_event: 验证事件回调 (事件名, 文件路径, 附加信息)
+            
+        Returns:
+            预测结果的文本行
+        """
+        self._begin_run()
+        try:
+            self.capacity_planner.reset()
+            self.validator.reset()
+            for file_path in self._iter_valid_files(input_files, self._emitter(on_event)):
+                self.capacity_planner.add(file_path, self.validator.get_file_size(file_path))
+            return self.capacity_planner.format_plan()
+        finally:
+            self._end_run()
+
+    def close(self):
+        """关闭转换器创建的进程池和线程池（不再使用该转换器时调用）"""
+        self.local_converters.close()
+        if self.range_executor is not None:
+            self.range_executor.shutdown(wait=True)
+    
+    def batch_convert(self, input_files: Iterable[str], output_dir: str = None, source_root: str = None,
+                      on_progress: ProgressCallback = None, on_event: EventCallback = None
+                      ) -> List[Dict]:
+        """
+        批量转换文件并返回全部结果
+
+        结果全部保留在内存中，适合小批量；海量文件请直接迭代 iter_convert。
+
+        Args:
+            input_files: 输入文件路径列表或可迭代对象
+            output_dir: 输出目录
+            source_root: 扫描根目录，指定后按相对路径镜像输出目录结构
+            on_progress: 每完成一个文件调用 (结果, 已完成数, 总数或None)
+            on_event: 各阶段事件回调 (事件名, 文件路径, 附加信息)
+
+        Returns:
+            转换结果字典列表（字段同 ConversionResult.to_dict）
+        """
+        return [result.to_dict()
+                for result in self.iter_convert(input_files, output_dir, source_root, on_progress, on_event)]
+
+    async def aiter_convert(self, input_files: Iterable[str], output_dir: str = None, source_root: str = None,
+                            on_progress: ProgressCallback = None, on_event: EventCallback = None,
+                            buffer_size: int = 64) -> AsyncIterator[ConversionResult]:
+        """
+        异步迭代转换结果（转换在后台线程中进行）
+
+        结果经有界队列交给事件循环，消费变慢时转换线程会等待，内存占用保持有界。
+        回调在后台线程中调用。
+
+        Args:
+            input_files: 输入文件路径列表或可迭代对象
+            output_dir: 输出目录
+            source_root: 扫描根目录
+            on_progress: 每完成一个文件调用 (结果, 已完成数, 总数或None)
+            on_event: 各阶段事件回调 (事件名, 文件路径, 附加信息)
+            buffer_size: 尚未被消费的结果数上限
+
+        Yields:
+            转换结果
+        """
+        loop = asyncio.get_running_loop()
+        results = asyncio.Queue(maxsize=buffer_size)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(results.put(item), loop).result()
+
+        def produce():
+            try:
+                for result in self.iter_convert(input_files, output_dir, source_root, on_progress, on_event):
+                    put(result)
+                    if stop.is_set():
+                        break
+            except BaseException as e:
+                put(e)
+            else:
+                put(end)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await results.get()
+                if item is end:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 调用方提前退出时通知转换线程停止，并排空队列让其不再阻塞
+            stop.set()
+            while not producer.done():
+                while not results.empty():
+                    results.get_nowait()
+                await asyncio.sleep(0.05)
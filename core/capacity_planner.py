@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   capacity_planner.py
+@Time    :   2026/02/24 09:52:16
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+容量规划模块
+从历史转换报告和多节点日志中学习各扩展名、各大小区间的处理耗时和输出比例，
+预测一批文件的运行时长、内存峰值和输出大小；实际运行结束后与预测对比
+"""
+
+import os
+import re
+import json
+import math
+import heapq
+import random
+import sqlite3
+import statistics
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from .conversion_result import ConversionResult
+from .memory_budget import MemoryBudget
+
+
+class CapacityPlanner:
+    """容量规划器 - 基于历史运行统计预测批量转换的资源需求"""
+
+    # 大小区间按4倍划分（1KB-4KB、4KB-16KB ...）
+    BUCKET_BASE = 4
+    # 区间内样本数不少于此值才使用
+    MIN_SAMPLES = 3
+    # 每个区间保留的最大样本数（超出后蓄水池抽样）
+    MAX_SAMPLES = 1000
+    # 没有任何历史数据时的估计：每个文件的固定开销和每MB耗时（秒）
+    DEFAULT_OVERHEAD = 2.0
+    DEFAULT_SECONDS_PER_MB = 4.0
+    # 没有历史数据时输出大小 / 输入大小的估计
+    DEFAULT_OUTPUT_RATIO = 1.0
+
+    def __init__(self, workers: int = 1, endpoints: int = 1, memory_budget: MemoryBudget = None):
+        """
+        初始化容量规划器
+
+        Args:
+            workers: 计划使用的并发数
+            endpoints: 计划使用的Docling服务实例数
+            memory_budget: 内存预算（用于估算单个文件的内存占用，启用时限制峰值）
+        """
+        self.workers = max(1, workers)
+        self.endpoints = max(1, endpoints)
+        self.memory_budget = memory_budget or MemoryBudget()
+
+        # (扩展名, 大小区间) -> [(输入字节数, 耗时, 输出字节数)]，扩展名 '*' 汇总所有扩展名
+        self.samples: Dict[Tuple[str, int], List[Tuple[int, float, int]]] = defaultdict(list)
+        self.seen: Dict[Tuple[str, int], int] = defaultdict(int)
+        # 扩展名 -> 响应大小/输入大小 的历史比例
+        self.response_ratios: Dict[str, List[float]] = defaultdict(list)
+        # 历史运行的每实例并发数（并发数 / 实例数）
+        self.history_loads: List[float] = []
+        self.history_count = 0
+        self.sources: List[str] = []
+        self.curves: Dict[str, List[Tuple[float, float, float]]] = {}
+        self.memory_ratios: Dict[str, float] = {}
+        self.reset()
+
+    def reset(self):
+        """清空本次预测与实际值的累计"""
+        self.predicted_files = 0
+        self.predicted_bytes = 0
+        self.predicted_seconds = 0.0
+        self.predicted_longest = 0.0
+        self.predicted_output = 0
+        self.uncovered_files = 0
+        self.largest_costs: List[int] = []
+        # 扩展名 -> [文件数, 输入字节数, 预测耗时]
+        self.by_extension: Dict[str, List] = defaultdict(lambda: [0, 0, 0.0])
+
+        self.actual_files = 0
+        self.actual_output = 0
+        self.actual_seconds: Dict[str, float] = defaultdict(float)
+
+    # ---------------------- 历史数据 ----------------------
+
+    def load_history(self, paths: Iterable[str]) -> int:
+        """
+        读取历史运行统计
+
+        支持转换报告（conversion_report*.txt）、多节点日志（journal/*.jsonl）、
+        SQLite输出库（--store），以及包含报告和日志的目录（输出目录或 --work-dir）。
+
+        Args:
+            paths: 报告文件、日志文件、输出库或目录
+
+        Returns:
+            读取到的历史样本数
+        """
+        before = self.history_count
+        for path in paths:
+            path = Path(path)
+            if path.is_dir():
+                files = sorted(path.glob('conversion_report*.txt')) + sorted(path.glob('journal/*.jsonl'))
+            elif path.is_file():
+                files = [path]
+            else:
+                continue
+
+            for file in files:
+                if file.suffix == '.jsonl':
+                    self._load_journal(file)
+                elif file.suffix in ('.db', '.sqlite', '.sqlite3'):
+                    self._load_store(file)
+                else:
+                    self._load_report(file)
+                self.sources.append(str(file))
+
+        self.curves.clear()
+        self.memory_ratios.clear()
+        return self.history_count - before
+
+    def _load_report(self, report_path: Path):
+        """解析转换报告中成功文件的明细"""
+        load = None
+        record = None
+        with open(report_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if line.startswith('并发线程:'):
+                    match = re.match(r'并发线程: (\d+)，服务实例: (\d+)', line)
+                    if match:
+                        load = int(match.group(1)) / max(1, int(match.group(2)))
+                elif line.startswith('✓ '):
+                    self._add_record(record)
+                    input_file, _, output_file = line[2:].rstrip('\n').partition(' -> ')
+                    record = {'input_file': input_file, 'output_file': output_file}
+                elif record is not None and line.startswith('  '):
+                    key, _, value = line.strip().partition(': ')
+                    if key == '处理时间':
+                        record['duration'] = float(value.rstrip('秒'))
+                    elif key == '文件大小':
+                        record['input_size'] = int(value)
+                    elif key == '输出大小':
+                        record['output_size'] = int(value)
+                    elif key == '响应大小':
+                        record['response_size'] = int(value)
+                    elif key == '转换路径':
+                        record['converter'] = value
+                elif record is not None and line.strip():
+                    # 进入失败明细等其他段落
+                    self._add_record(record)
+                    record = None
+        self._add_record(record)
+        if load is not None:
+            self.history_loads.append(load)
+
+    def _load_journal(self, journal_path: Path):
+        """读取多节点日志中的成功记录"""
+        with open(journal_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('status') == 'success':
+                    self._add_record(entry)
+
+    def _load_store(self, db_path: Path):
+        """读取SQLite输出库中成功文档的结果记录"""
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            for (result_json,) in conn.execute("SELECT result_json FROM documents WHERE status = 'success'"):
+                self._add_record(json.loads(result_json))
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+
+    def _add_record(self, record: Optional[Dict]):
+        """
+        记录一个历史样本
+
+        旧版本的报告和日志没有文件大小，此时读取仍然存在的输入/输出文件的大小。
+        """
+        if not record or 'duration' not in record:
+            return
+
+        input_size = record.get('input_size') or self._file_size(record.get('input_file'))
+        if not input_size:
+            return
+        output_size = record.get('output_size') or self._file_size(record.get('output_file')) or 0
+
+        ext = Path(record['input_file']).suffix.lower()
+        sample = (input_size, float(record['duration']), output_size)
+        bucket = self._bucket(input_size)
+        for key in ((ext, bucket), ('*', bucket)):
+            self._keep(key, sample)
+
+        response_size = record.get('response_size') or 0
+        if response_size and len(self.response_ratios[ext]) < self.MAX_SAMPLES:
+            self.response_ratios[ext].append(response_size / input_size)
+        self.history_count += 1
+
+    def _keep(self, key: Tuple[str, int], sample: Tuple[int, float, int]):
+        """蓄水池抽样：每个区间最多保留 MAX_SAMPLES 个样本"""
+        self.seen[key] += 1
+        samples = self.samples[key]
+        if len(samples) < self.MAX_SAMPLES:
+            samples.append(sample)
+        else:
+            index = random.randrange(self.seen[key])
+            if index < self.MAX_SAMPLES:
+                samples[index] = sample
+
+    @staticmethod
+    def _file_size(path: Optional[str]) -> int:
+        """文件大小，文件不存在时为0"""
+        try:
+            return os.path.getsize(path) if path else 0
+        except OSError:
+            return 0
+
+    @classmethod
+    def _bucket(cls, size: int) -> int:
+        """大小区间编号"""
+        return int(math.log(max(size, 1), cls.BUCKET_BASE))
+
+    # ---------------------- 预测 ----------------------
+
+    def _curve(self, ext: str) -> List[Tuple[float, float, float]]:
+        """
+        扩展名的 大小 -> 耗时 曲线：各区间的 (中位大小, 中位耗时, 中位输出比例)，按大小排序
+        """
+        curve = self.curves.get(ext)
+        if curve is None:
+            curve = []
+            for (sample_ext, _), samples in self.samples.items():
+                if sample_ext != ext or len(samples) < self.MIN_SAMPLES:
+                    continue
+                curve.append((
+                    statistics.median(size for size, _, _ in samples),
+                    statistics.median(duration for _, duration, _ in samples),
+                    statistics.median(output / size for size, _, output in samples)
+                ))
+            curve.sort()
+            self.curves[ext] = curve
+        return curve
+
+    def estimate(self, file_path: str, file_size: int) -> Tuple[float, int, bool]:
+        """
+        估算单个文件的处理耗时和输出大小
+
+        在该扩展名各大小区间的中位点之间线性插值；小于最小区间时取最小区间的耗时，
+        大于最大区间时按最大区间的每字节耗时外推。该扩展名没有历史数据时使用所有扩展名的曲线。
+
+        Args:
+            file_path: 文件路径
+            file_size: 文件字节数
+
+        Returns:
+            (耗时秒数, 输出字节数, 是否有历史数据)
+        """
+        ext = Path(file_path).suffix.lower()
+        curve = self._curve(ext) or self._curve('*')
+        if not curve:
+            seconds = self.DEFAULT_OVERHEAD + file_size / 1024 / 1024 * self.DEFAULT_SECONDS_PER_MB
+            return seconds, int(file_size * self.DEFAULT_OUTPUT_RATIO), False
+
+        if file_size <= curve[0][0]:
+            _, seconds, ratio = curve[0]
+        elif file_size >= curve[-1][0]:
+            size, duration, ratio = curve[-1]
+            seconds = duration * file_size / size
+        else:
+            for (low_size, low_seconds, low_ratio), (high_size, high_seconds, high_ratio) in zip(curve, curve[1:]):
+                if file_size <= high_size:
+                    weight = (file_size - low_size) / (high_size - low_size)
+                    seconds = low_seconds + weight * (high_seconds - low_seconds)
+                    ratio = low_ratio + weight * (high_ratio - low_ratio)
+                    break
+        return seconds, int(file_size * ratio), True
+
+    @property
+    def contention(self) -> float:
+        """
+        服务端争用系数
+
+        历史耗时是在历史的每实例并发数下测得的；计划的每实例并发数更高时，
+        请求在服务端排队，单个文件的耗时按比例增加（更低时不缩短）。
+        """
+        if not self.history_loads:
+            return 1.0
+        history_load = statistics.median(self.history_loads)
+        return max(1.0, (self.workers / self.endpoints) / history_load)
+
+    def add(self, file_path: str, file_size: int):
+        """
+        将一个待转换文件计入预测
+
+        Args:
+            file_path: 文件路径
+            file_size: 文件字节数
+        """
+        seconds, output_size, covered = self.estimate(file_path, file_size)
+        seconds *= self.contention
+
+        self.predicted_files += 1
+        self.predicted_bytes += file_size
+        self.predicted_seconds += seconds
+        self.predicted_longest = max(self.predicted_longest, seconds)
+        self.predicted_output += output_size
+        if not covered:
+            self.uncovered_files += 1
+
+        ext = Path(file_path).suffix.lower() or '(无扩展名)'
+        stats = self.by_extension[ext]
+        stats[0] += 1
+        stats[1] += file_size
+        stats[2] += seconds
+
+        # 内存峰值：同时在处理的 workers 个最大文件的估算内存之和
+        ratio = self._memory_ratio(Path(file_path).suffix.lower())
+        if ratio:
+            cost = max(self.memory_budget.min_cost, int(file_size * ratio * self.memory_budget.overhead))
+        else:
+            cost = self.memory_budget.estimate(file_path, file_size)
+        if len(self.largest_costs) < self.workers:
+            heapq.heappush(self.largest_costs, cost)
+        elif cost > self.largest_costs[0]:
+            heapq.heapreplace(self.largest_costs, cost)
+
+    def _memory_ratio(self, ext: str) -> float:
+        """扩展名的历史 响应大小/输入大小 中位数，没有历史数据时为0"""
+        ratio = self.memory_ratios.get(ext)
+        if ratio is None:
+            ratios = self.response_ratios.get(ext)
+            ratio = statistics.median(ratios) if ratios else 0.0
+            self.memory_ratios[ext] = ratio
+        return ratio
+
+    def observe(self, result: ConversionResult):
+        """
+        记录一个文件的实际结果
+
+        Args:
+            result: 转换结果
+        """
+        self.actual_files += 1
+        self.actual_output += result.output_size
+        ext = Path(result.input_file).suffix.lower() or '(无扩展名)'
+        self.actual_seconds[ext] += result.duration
+
+    def plan(self) -> Dict:
+        """
+        汇总预测结果
+
+        Returns:
+            预测字典：文件数、输入字节数、运行时长、内存峰值、输出大小、按扩展名明细等
+        """
+        wall_seconds = max(self.predicted_seconds / self.workers, self.predicted_longest)
+        peak_memory = sum(self.largest_costs)
+        if self.memory_budget.enabled and self.largest_costs:
+            peak_memory = min(peak_memory, max(self.memory_budget.budget_bytes, max(self.largest_costs)))
+
+        return {
+            'files': self.predicted_files,
+            'input_bytes': self.predicted_bytes,
+            'wall_seconds': wall_seconds,
+            'file_seconds': self.predicted_seconds,
+            'peak_memory': peak_memory,
+            'output_bytes': self.predicted_output,
+            'workers': self.workers,
+            'endpoints': self.endpoints,
+            'contention': self.contention,
+            'history_samples': self.history_count,
+            'uncovered_files': self.uncovered_files,
+            'by_extension': {ext: tuple(stats) for ext, stats in sorted(self.by_extension.items())},
+        }
+
+    def format_plan(self) -> List[str]:
+        """预测结果的文本行"""
+        plan = self.plan()
+        lines = [
+            f"待转换文件: {plan['files']} 个，共 {plan['input_bytes'] / 1024 / 1024:.1f} MB",
+            f"并发数: {plan['workers']}，服务实例: {plan['endpoints']}",
+            f"历史样本: {plan['history_samples']} 个（{len(self.sources)} 个报告/日志）",
+            f"预计运行时长: {self._duration(plan['wall_seconds'])}",
+            f"预计内存峰值: {plan['peak_memory'] / 1024 / 1024:.0f} MB（不含进程基础占用）",
+            f"预计输出大小: {plan['output_bytes'] / 1024 / 1024:.1f} MB",
+        ]
+        if plan['contention'] > 1.0:
+            lines.append(f"每实例并发高于历史运行，单文件耗时按 {plan['contention']:.1f} 倍估算")
+        if plan['uncovered_files']:
+            lines.append(f"无历史数据: {plan['uncovered_files']} 个文件按默认吞吐估算，误差可能较大")
+        lines.append("")
+        lines.append("按扩展名:")
+        for ext, (count, size, seconds) in plan['by_extension'].items():
+            lines.append(f"  {ext:<12} {count:>8} 个  {size / 1024 / 1024:>10.1f} MB  "
+                         f"累计处理 {self._duration(seconds)}")
+        return lines
+
+    def format_comparison(self, wall_seconds: float, peak_memory: int = 0) -> List[str]:
+        """
+        预测值与本次实际运行结果的对比
+
+        Args:
+            wall_seconds: 实际运行时长（秒）
+            peak_memory: 运行期间进程内存峰值的增量（字节），0表示未知
+
+        Returns:
+            文本行
+        """
+        plan = self.plan()
+        lines = [
+            self._compare_line('运行时长', plan['wall_seconds'], wall_seconds, self._duration),
+            self._compare_line('输出大小', plan['output_bytes'], self.actual_output,
+                               lambda value: f"{value / 1024 / 1024:.1f} MB"),
+        ]
+        if peak_memory:
+            lines.append(self._compare_line('内存增量峰值', plan['peak_memory'], peak_memory,
+                                            lambda value: f"{value / 1024 / 1024:.0f} MB"))
+        for ext, (_, _, seconds) in plan['by_extension'].items():
+            lines.append(self._compare_line(f"{ext} 累计处理", seconds, self.actual_seconds.get(ext, 0.0),
+                                            self._duration))
+        return lines
+
+    @staticmethod
+    def _compare_line(name: str, predicted: float, actual: float, fmt) -> str:
+        if actual:
+            error = f"{(predicted - actual) / actual:+.0%}"
+        else:
+            error = '-'
+        return f"{name}: 预测 {fmt(predicted)}，实际 {fmt(actual)}（偏差 {error}）"
+
+    @staticmethod
+    def _duration(seconds: float) -> str:
+        if seconds < 120:
+            return f"{seconds:.1f}秒"
+        if seconds < 7200:
+            return f"{seconds / 60:.1f}分钟"
+        return f"{seconds / 3600:.1f}小时"
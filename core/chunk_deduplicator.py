@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   chunk_deduplicator.py
+@Time    :   2026/02/18 10:31:07
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+切片去重模块
+基于MinHash签名和LSH分段索引，在整个输出集合范围内识别近似重复的切片
+"""
+
+import json
+import tempfile
+from array import array
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 只在启用切片去重时需要
+    np = None
+
+
+# n-gram滚动哈希的乘数
+SHINGLE_PRIME = 1000003
+# 签名中空桶的标记值，以及致密化时每跨过一个桶叠加的偏移
+EMPTY_BIN = 0xFFFFFFFF
+DENSIFY_OFFSET = 0x9E3779B1
+
+
+class SortedRuns:
+    """有序分段索引 - 新数据作为有序段追加，相邻段大小接近时合并，插入摊还开销为对数级"""
+
+    def __init__(self):
+        self.runs: List[Tuple['np.ndarray', 'np.ndarray']] = []  # [(有序键, 对应的切片编号)]
+
+    def add(self, keys: 'np.ndarray', ids: 'np.ndarray'):
+        """添加一批键"""
+        order = np.argsort(keys, kind='stable')
+        self.runs.append((keys[order], ids[order]))
+
+        # 较新的段不小于前一段的一半时合并（stable排序保证相同键的旧编号在前）
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= 2 * len(self.runs[-1][0]):
+            (old_keys, old_ids), (new_keys, new_ids) = self.runs[-2], self.runs[-1]
+            keys = np.concatenate([old_keys, new_keys])
+            ids = np.concatenate([old_ids, new_ids])
+            order = np.argsort(keys, kind='stable')
+            self.runs[-2:] = [(keys[order], ids[order])]
+
+    def lookup(self, keys: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        查找键对应的已有切片编号（每个键在每个段中取最早的一个）
+
+        Returns:
+            (命中的查询下标, 对应的切片编号)
+        """
+        rows, ids = [], []
+        for run_keys, run_ids in self.runs:
+            pos = np.searchsorted(run_keys, keys)
+            pos[pos == len(run_keys)] = 0
+            hit = np.nonzero(run_keys[pos] == keys)[0]
+            rows.append(hit)
+            ids.append(run_ids[pos[hit]])
+        if not rows:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        return np.concatenate(rows), np.concatenate(ids)
+
+
+class ChunkDeduplicator:
+    """切片去重器 - 向量化MinHash（单次置换哈希）+ LSH分段，跨文件识别近似重复切片"""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, mode: str = 'drop', report_path: str = None, seed: int = 1):
+        """
+        初始化切片去重器
+
+        Args:
+            threshold: 估计的Jaccard相似度达到该值时视为重复
+            num_perm: MinHash签名长度（2的幂）
+            bands: LSH分段数（每段 num_perm / bands 行），同一段完全相同的切片才会进入比较
+            shingle_size: 字符n-gram的长度（对中文和英文都适用）
+            mode: 'drop' 从输出中移除重复切片；'flag' 保留切片，只在报告中标记
+            report_path: 重复切片明细（JSON Lines）的保存路径，None表示不保存
+            seed: 哈希函数的随机种子
+        """
+        if np is None:
+            raise Exception("切片去重需要安装 numpy: pip install numpy")
+        if mode not in ('drop', 'flag'):
+            raise Exception(f"不支持的去重模式: {mode} (支持: drop, flag)")
+        if num_perm & (num_perm - 1):
+            raise Exception(f"MinHash签名长度 {num_perm} 必须是2的幂")
+        if num_perm % bands != 0:
+            raise Exception(f"MinHash签名长度 {num_perm} 必须能被分段数 {bands} 整除")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.mode = mode
+        self.bin_bits = num_perm.bit_length() - 1
+
+        rng = np.random.default_rng(seed)
+        max_value = np.iinfo(np.uint64).max
+        self.seed_offset = rng.integers(0, max_value, dtype=np.uint64, endpoint=True)
+        self.band_mult = rng.integers(0, max_value, size=self.rows, dtype=np.uint64, endpoint=True) | np.uint64(1)
+
+        # 已保留切片：签名写入临时文件（内存映射读取），索引只保存键和编号
+        self.index = [SortedRuns() for _ in range(bands)]
+        self.signature_file = tempfile.TemporaryFile()
+        self.signatures = None
+        self.kept_count = 0
+        self.sources: List[str] = []
+        self.kept_source = array('I')
+        self.kept_chunk = array('I')
+
+        self.total_count = 0
+        self.duplicate_count = 0
+        self.report = open(report_path, 'w', encoding='utf-8') if report_path else None
+
+    def filter(self, texts: List[str], source: str) -> List[Optional[Tuple[str, int, float]]]:
+        """
+        检查一个文件的切片，并把不重复的切片加入索引
+
+        Args:
+            texts: 切片文本列表（按文件内顺序）
+            source: 切片所属的文件名
+
+        Returns:
+            与texts等长的列表：不重复为None，重复为 (相似切片所在文件, 切片序号, 估计相似度)
+        """
+        n = len(texts)
+        if n == 0:
+            return []
+
+        sigs = self._signatures(texts)
+        keys = self._band_keys(sigs)
+        best_sim = np.zeros(n)
+        # >=0 为已保留切片的编号；<0 为本批内更早切片的下标（编码为 -(下标+1)）
+        best_id = np.zeros(n, dtype=np.int64)
+
+        # 1. 与已保留切片比较（任一分段相同即为候选，再用完整签名估计相似度）
+        stored = self._stored_signatures()
+        for band in range(self.bands):
+            rows, cand = self.index[band].lookup(keys[:, band])
+            if rows.size:
+                self._update_best(best_sim, best_id, rows, cand,
+                                  (sigs[rows] == stored[cand]).mean(axis=1))
+
+        # 2. 与本批内更早的切片比较（同一文件中的重复段落）
+        positions = np.arange(n)
+        for band in range(self.bands):
+            _, first_index, inverse = np.unique(keys[:, band], return_index=True, return_inverse=True)
+            first = first_index[inverse.reshape(-1)]
+            rows = np.nonzero(first < positions)[0]
+            if rows.size:
+                cand = first[rows]
+                self._update_best(best_sim, best_id, rows, -(cand + 1),
+                                  (sigs[rows] == sigs[cand]).mean(axis=1))
+
+        duplicate = best_sim >= self.threshold
+        kept = np.nonzero(~duplicate)[0]
+        self._add(sigs[kept], keys[kept], source, kept)
+
+        # 整理结果：本批内的重复指向其最终保留的切片
+        new_ids = np.full(n, -1, dtype=np.int64)
+        new_ids[kept] = np.arange(self.kept_count - len(kept), self.kept_count)
+        results: List[Optional[Tuple[str, int, float]]] = [None] * n
+        for i in np.nonzero(duplicate)[0].tolist():
+            target = int(best_id[i])
+            while target < 0:
+                local = -target - 1
+                target = int(new_ids[local]) if new_ids[local] >= 0 else int(best_id[local])
+            match = (self.sources[self.kept_source[target]], self.kept_chunk[target], round(float(best_sim[i]), 3))
+            results[i] = match
+            if self.report is not None:
+                self.report.write(json.dumps({
+                    'file': source,
+                    'chunk': i,
+                    'duplicate_of_file': match[0],
+                    'duplicate_of_chunk': match[1],
+                    'similarity': match[2],
+                    'action': self.mode,
+                }, ensure_ascii=False) + '\n')
+
+        self.total_count += n
+        self.duplicate_count += int(duplicate.sum())
+        return results
+
+    @staticmethod
+    def _update_best(best_sim: 'np.ndarray', best_id: 'np.ndarray', rows: 'np.ndarray',
+                     cand: 'np.ndarray', sims: 'np.ndarray'):
+        """
+        记录每个切片相似度最高的候选
+
+        同一分段的多个有序段都可能命中，rows 中同一切片可能出现多次；
+        先按切片归并、只保留相似度最高的候选，避免重复下标赋值时低相似度覆盖高相似度。
+        """
+        order = np.lexsort((-sims, rows))
+        rows, cand, sims = rows[order], cand[order], sims[order]
+        _, first = np.unique(rows, return_index=True)
+        rows, cand, sims = rows[first], cand[first], sims[first]
+
+        better = sims > best_sim[rows]
+        best_sim[rows[better]] = sims[better]
+        best_id[rows[better]] = cand[better]
+
+    def _shingles(self, text: str) -> 'np.ndarray':
+        """文本的字符n-gram哈希（重复的n-gram不影响最小值，无需去重）"""
+        normalized = ' '.join(text.lower().split())
+        codes = np.frombuffer(normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        if len(codes) == 0:
+            return np.zeros(1, dtype=np.uint64)
+
+        width = min(self.shingle_size, len(codes))
+        count = len(codes) - width + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(width):
+            hashes = hashes * np.uint64(SHINGLE_PRIME) + codes[offset:offset + count]
+        return hashes
+
+    def _signatures(self, texts: List[str]) -> 'np.ndarray':
+        """
+        计算MinHash签名（单次置换哈希 + 旋转致密化）
+
+        每个n-gram只哈希一次，按哈希高位分到 num_perm 个桶中，桶内取最小值；
+        开销与n-gram数成正比，而不是 n-gram数 × num_perm。空桶借用右侧
+        最近的非空桶的值（加上距离偏移），保证短切片的签名同样可比较。
+
+        Returns:
+            (切片数, num_perm) 的uint32签名矩阵
+        """
+        n, k = len(texts), self.num_perm
+        shingles = [self._shingles(text) for text in texts]
+        lengths = np.array([len(s) for s in shingles], dtype=np.int64)
+        owner = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        hashed = self._mix(np.concatenate(shingles))
+        bins = (hashed >> np.uint64(64 - self.bin_bits)).astype(np.int64)
+        values = np.minimum(hashed & np.uint64(0xFFFFFFFF), np.uint64(EMPTY_BIN - 1)).astype(np.uint32)
+
+        sigs = np.full(n * k, EMPTY_BIN, dtype=np.uint32)
+        np.minimum.at(sigs, owner * k + bins, values)
+        sigs = sigs.reshape(n, k)
+
+        empty = sigs == EMPTY_BIN
+        if empty.any():
+            # 在首尾相接的 2k 列上求每列右侧（含自身）最近的非空桶
+            columns = np.arange(2 * k)
+            valid = np.concatenate([~empty, ~empty], axis=1)
+            nearest = np.where(valid, columns, 2 * k)
+            nearest = np.minimum.accumulate(nearest[:, ::-1], axis=1)[:, ::-1][:, :k]
+            borrowed = sigs[np.arange(n)[:, None], nearest % k].astype(np.uint64)
+            distance = (nearest - np.arange(k)).astype(np.uint64)
+            densified = ((borrowed + distance * np.uint64(DENSIFY_OFFSET)) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+            sigs[empty] = densified[empty]
+
+        return sigs
+
+    def _mix(self, values: 'np.ndarray') -> 'np.ndarray':
+        """splitmix64 混合函数，把n-gram哈希映射为均匀分布的64位值"""
+        h = values + self.seed_offset
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return h ^ (h >> np.uint64(31))
+
+    def _band_keys(self, sigs: 'np.ndarray') -> 'np.ndarray':
+        """每个LSH分段的哈希键，(切片数, bands) 的uint64矩阵"""
+        banded = sigs.astype(np.uint64).reshape(len(sigs), self.bands, self.rows)
+        return (banded * self.band_mult).sum(axis=2, dtype=np.uint64)
+
+    def _stored_signatures(self) -> 'np.ndarray':
+        """已保留切片的签名（内存映射，按需读入）"""
+        if self.kept_count == 0:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        if self.signatures is None or len(self.signatures) != self.kept_count:
+            self.signature_file.flush()
+            self.signatures = np.memmap(self.signature_file, dtype=np.uint32, mode='r',
+                                        shape=(self.kept_count, self.num_perm))
+        return self.signatures
+
+    def _add(self, sigs: 'np.ndarray', keys: 'np.ndarray', source: str, chunk_indexes: 'np.ndarray'):
+        """把保留的切片加入签名文件和分段索引"""
+        if len(sigs) == 0:
+            return
+
+        ids = np.arange(self.kept_count, self.kept_count + len(sigs), dtype=np.int64)
+        self.signature_file.seek(0, 2)
+        self.signature_file.write(np.ascontiguousarray(sigs).tobytes())
+        for band in range(self.bands):
+            self.index[band].add(keys[:, band].copy(), ids)
+
+        self.sources.append(source)
+        self.kept_source.extend([len(self.sources) - 1] * len(sigs))
+        self.kept_chunk.extend(chunk_indexes.tolist())
+        self.kept_count += len(sigs)
+
+    def close(self):
+        """关闭签名文件和报告"""
+        self.signatures = None
+        self.signature_file.close()
+        if self.report is not None:
+            self.report.close()
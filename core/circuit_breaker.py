@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   circuit_breaker.py
+@Time    :   2026/02/05 10:03:48
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+熔断器模块
+服务连续失败时暂停派发请求，冷却后放行探测请求以恢复
+"""
+
+import time
+import threading
+from typing import Callable
+
+
+class CircuitBreaker:
+    """熔断器 - 连续失败达到阈值后熔断，冷却后半开探测"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0,
+                 listener: Callable[[str, str], None] = None):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断后的初始冷却时间（秒）
+            max_cooldown: 探测连续失败时冷却时间的上限（秒）
+            listener: 状态变化回调 (新状态, 说明)，在持有内部锁时调用，应尽快返回
+        """
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trip_count = 0
+        self.probe_in_flight = False
+        self.condition = threading.Condition()
+        self.listener = listener
+
+    def is_open(self) -> bool:
+        """是否处于熔断冷却中（此时发往该服务的请求会在 acquire 中等待）"""
+        with self.condition:
+            return self.state == self.OPEN and time.monotonic() < self.opened_at + self.cooldown
+
+    def acquire(self):
+        """
+        等待直到允许发送请求
+
+        熔断期间调用方会在这里阻塞，而不是逐个失败耗尽整个队列；
+        冷却结束后只放行一个探测请求，其余请求继续等待探测结果。
+        """
+        with self.condition:
+            while True:
+                if self.state == self.CLOSED:
+                    return
+
+                if self.state == self.OPEN:
+                    remaining = self.opened_at + self.cooldown - time.monotonic()
+                    if remaining > 0:
+                        self.condition.wait(remaining)
+                        continue
+                    self.state = self.HALF_OPEN
+
+                if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                    self.probe_in_flight = True
+                    return
+
+                self.condition.wait()
+
+    def record_success(self):
+        """记录一次成功请求，关闭熔断器"""
+        with self.condition:
+            self.failures = 0
+            self.probe_in_flight = False
+            self.cooldown = self.base_cooldown
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self._notify("Docling服务已恢复，继续派发请求")
+            self.condition.notify_all()
+
+    def record_failure(self):
+        """记录一次服务端失败，必要时熔断"""
+        with self.condition:
+            self.failures += 1
+
+            if self.state == self.HALF_OPEN:
+                # 探测失败，延长冷却时间后重新熔断
+                self.probe_in_flight = False
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._trip()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._trip()
+
+            self.condition.notify_all()
+
+    def release(self):
+        """请求未产生健康结论时（如客户端错误）释放探测名额"""
+        with self.condition:
+            if self.probe_in_flight:
+                self.probe_in_flight = False
+                self.condition.notify_all()
+
+    def _trip(self):
+        """进入熔断状态"""
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trip_count += 1
+        self._notify(f"Docling服务连续失败 {self.failures} 次，暂停派发 {self.cooldown:.0f} 秒")
+
+    def _notify(self, message: str):
+        """通知状态变化"""
+        if self.listener is not None:
+            self.listener(self.state, message)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   conversion_result.py
+@Time    :   2026/02/17 14:05:18
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+转换结果模块
+单个文件的转换结果，使用 __slots__ 保持对象紧凑
+"""
+
+from typing import Dict
+
+
+class ConversionResult:
+    """转换结果 - 单个文件的处理结果"""
+
+    __slots__ = (
+        'input_file',
+        'output_file',
+        'status',
+        'error',
+        'image_count',
+        'formula_count',
+        'page_ranges',
+        'response_size',
+        'transfer_bytes',
+        'cpu_time',
+        'conversion_plan',
+        'plan_saved_seconds',
+        'converter',
+        'hedged_requests',
+        'hedge_wins',
+        'input_size',
+        'output_size',
+        'duration',
+    )
+
+    def __init__(self, input_file: str, output_file: str = '', status: str = 'pending', error: str = '',
+                 image_count: int = 0, formula_count: int = 0, page_ranges: int = 0, response_size: int = 0,
+                 transfer_bytes: int = 0, cpu_time: float = 0.0, conversion_plan: str = '',
+                 plan_saved_seconds: float = 0.0, converter: str = 'docling', hedged_requests: int = 0,
+                 hedge_wins: int = 0, input_size: int = 0, output_size: int = 0, duration: float = 0.0):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.status = status
+        self.error = error
+        self.image_count = image_count
+        self.formula_count = formula_count
+        self.page_ranges = page_ranges
+        self.response_size = response_size
+        self.transfer_bytes = transfer_bytes
+        self.cpu_time = cpu_time
+        self.conversion_plan = conversion_plan
+        self.plan_saved_seconds = plan_saved_seconds
+        self.converter = converter
+        self.hedged_requests = hedged_requests
+        self.hedge_wins = hedge_wins
+        self.input_size = input_size
+        self.output_size = output_size
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        """是否转换成功"""
+        return self.status == 'success'
+
+    def to_dict(self) -> Dict:
+        """转换为字典（用于JSON日志和输出库）"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ConversionResult':
+        """从字典还原，忽略未知字段"""
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def __repr__(self) -> str:
+        return f"ConversionResult({self.input_file!r}, status={self.status!r})"
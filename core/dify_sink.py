@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   dify_sink.py
+@Time    :   2026/02/19 15:12:40
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+Dify知识库推送模块
+将切片结果直接写入Dify知识库：按内容哈希幂等更新，批量创建分段，并发受限
+"""
+
+import json
+import time
+import random
+import hashlib
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class DifySink:
+    """Dify知识库推送 - 每个切片文件对应知识库中的一个文档，每个切片对应一个分段"""
+
+    def __init__(self, api_base: str, api_key: str, dataset_id: str, concurrency: int = 4,
+                 batch_size: int = 50, max_retries: int = 5, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0, timeout: float = 60.0, state_path: str = None,
+                 indexing_technique: str = 'high_quality', max_tokens: int = 1000,
+                 index_timeout: float = 600.0):
+        """
+        初始化Dify知识库推送
+
+        Args:
+            api_base: Dify API地址，例如 http://localhost/v1
+            api_key: 知识库API密钥
+            dataset_id: 知识库ID
+            concurrency: 同时推送的文档数
+            batch_size: 每个请求创建的分段数
+            max_retries: 连接失败、超时、429/5xx时的最大重试次数
+            backoff_base: 指数退避的基础等待时间（秒）
+            backoff_max: 单次退避等待的上限（秒）
+            timeout: 单次请求的超时时间（秒）
+            state_path: 推送状态文件（JSON Lines），记录每个文档的ID和内容哈希，内容未变的文档直接跳过
+            indexing_technique: 新建文档的索引方式（high_quality / economy）
+            max_tokens: 新建文档时的分段长度上限，需不小于单个切片的长度
+            index_timeout: 等待新建文档索引完成的最长时间（秒）
+        """
+        self.api_base = api_base.rstrip('/')
+        self.dataset_url = f"{self.api_base}/datasets/{dataset_id}"
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.indexing_technique = indexing_technique
+        self.max_tokens = max_tokens
+        self.index_timeout = index_timeout
+
+        # 长连接池，大小与并发数一致
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': f"Bearer {api_key}"})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='dify-push')
+        # 限制排队中的文档数，避免切片内容在内存中堆积
+        self.slots = threading.BoundedSemaphore(concurrency * 2)
+        self.lock = threading.Lock()
+        self.futures: List[Future] = []
+
+        self.documents: Dict[str, str] = {}  # 文档名 -> 文档ID（首次查找时加载知识库中已有的文档）
+        self.documents_loaded = False
+        self.load_lock = threading.Lock()  # 只让一个线程分页加载文档列表，不占用self.lock
+        self.state_path = Path(state_path) if state_path else None
+        self.state = self._load_state()
+        self.state_file = open(self.state_path, 'a', encoding='utf-8') if self.state_path else None
+
+        self.stats = {
+            'created': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'failed': 0,
+            'segments_added': 0,
+            'segments_deleted': 0,
+        }
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """切片内容哈希（忽略首尾空白）"""
+        return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+    def _load_state(self) -> Dict[str, Dict]:
+        """读取推送状态（同一文档以最后一条记录为准）"""
+        state = {}
+        if self.state_path is None or not self.state_path.exists():
+            return state
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    state[entry['name']] = entry
+                except (ValueError, KeyError):
+                    continue
+        return state
+
+    def submit(self, name: str, chunks: List[str]) -> Future:
+        """
+        异步推送一个文档（排队文档数达到上限时阻塞）
+
+        Args:
+            name: 文档名（通常为切片文件名）
+            chunks: 切片文本列表
+
+        Returns:
+            结果为推送结果字典的future
+        """
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self.push_document, name, chunks)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    def push_file(self, file_path: Path) -> Future:
+        """
+        推送已有的切片文件（切片之间以空行分隔）
+
+        Args:
+            file_path: 切片文件路径
+
+        Returns:
+            结果为推送结果字典的future
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            chunks = [chunk for chunk in f.read().split('\n\n') if chunk.strip()]
+        return self.submit(Path(file_path).name, chunks)
+
+    def push_document(self, name: str, chunks: List[str]) -> Dict:
+        """
+        幂等地更新一个文档：保留与切片序列开头一致的已有分段，其后的分段删除后按切片顺序重新创建
+
+        Args:
+            name: 文档名
+            chunks: 切片文本列表
+
+        Returns:
+            推送结果 {'name', 'status', 'added', 'deleted', 'error'}
+        """
+        result = {'name': name, 'status': 'unchanged', 'added': 0, 'deleted': 0, 'error': ''}
+        try:
+            chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
+            hashes = [self.content_hash(chunk) for chunk in chunks]
+            doc_hash = hashlib.sha256(''.join(hashes).encode('ascii')).hexdigest()
+
+            state = self.state.get(name)
+            if state and state.get('hash') == doc_hash:
+                self._count(result)
+                return result
+
+            document_id = state['document_id'] if state else self._find_document(name)
+            if document_id is None:
+                if not chunks:
+                    self._count(result)
+                    return result
+                document_id, batch = self._create_document(name, chunks[0])
+                self._wait_indexed(batch)
+                result['status'] = 'created'
+            else:
+                result['status'] = 'updated'
+
+            # 以分段内容哈希为准对比差异，重复执行不会产生重复分段（内容相同的切片只保留第一个）
+            wanted, seen = [], set()
+            for chunk, chunk_hash in zip(chunks, hashes):
+                if chunk_hash not in seen:
+                    wanted.append((chunk_hash, chunk))
+                    seen.add(chunk_hash)
+            # Dify只能在文档末尾追加分段：保留与切片序列开头一致的分段，其后的全部按顺序重建
+            existing = self._list_segments(document_id)
+            kept = 0
+            while kept < min(len(existing), len(wanted)) and existing[kept][0] == wanted[kept][0]:
+                kept += 1
+            stale = [segment_id for _, segment_id in existing[kept:]]
+            missing = [chunk for _, chunk in wanted[kept:]]
+
+            for segment_id in stale:
+                self._request('DELETE', f"{self.dataset_url}/documents/{document_id}/segments/{segment_id}")
+                result['deleted'] += 1
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                self._request('POST', f"{self.dataset_url}/documents/{document_id}/segments",
+                              json={'segments': [{'content': chunk, 'answer': '', 'keywords': []} for chunk in batch]})
+                result['added'] += len(batch)
+
+            if result['status'] == 'updated' and not result['added'] and not result['deleted']:
+                result['status'] = 'unchanged'
+            self._record_state(name, document_id, doc_hash)
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+
+        self._count(result)
+        return result
+
+    def _count(self, result: Dict):
+        """累计推送统计"""
+        with self.lock:
+            self.stats[result['status']] += 1
+            self.stats['segments_added'] += result['added']
+            self.stats['segments_deleted'] += result['deleted']
+
+    def _record_state(self, name: str, document_id: str, doc_hash: str):
+        """记录文档的推送状态"""
+        entry = {'name': name, 'document_id': document_id, 'hash': doc_hash}
+        with self.lock:
+            self.state[name] = entry
+            self.documents[name] = document_id
+            if self.state_file is not None:
+                self.state_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self.state_file.flush()
+
+    def _find_document(self, name: str) -> Optional[str]:
+        """按文档名查找知识库中已有的文档（首次调用时分页加载全部文档）"""
+        with self.load_lock:
+            # 分页请求期间不持有self.lock，其他线程仍可记录状态和统计
+            if not self.documents_loaded:
+                documents = {}
+                page = 1
+                while True:
+                    data = self._request('GET', f"{self.dataset_url}/documents",
+                                         params={'page': page, 'limit': 100}).json()
+                    for document in data.get('data', []):
+                        documents.setdefault(document['name'], document['id'])
+                    if not data.get('has_more'):
+                        break
+                    page += 1
+                with self.lock:
+                    # 加载期间新建的文档以本地记录为准
+                    for document_name, document_id in documents.items():
+                        self.documents.setdefault(document_name, document_id)
+                    self.documents_loaded = True
+        with self.lock:
+            return self.documents.get(name)
+
+    def _create_document(self, name: str, first_chunk: str) -> Tuple[str, str]:
+        """
+        以第一个切片创建文档（分隔符为空行，切片内不含空行，因此保持为一个分段）
+
+        Returns:
+            (文档ID, 索引批次)
+        """
+        payload = {
+            'name': name,
+            'text': first_chunk,
+            'indexing_technique': self.indexing_technique,
+            'process_rule': {
+                'mode': 'custom',
+                'rules': {
+                    'pre_processing_rules': [],
+                    'segmentation': {'separator': '\n\n', 'max_tokens': self.max_tokens}
+                }
+            }
+        }
+        data = self._request('POST', f"{self.dataset_url}/document/create-by-text", json=payload).json()
+        document_id = data['document']['id']
+        with self.lock:
+            self.documents[name] = document_id
+        return document_id, data.get('batch', '')
+
+    def _wait_indexed(self, batch: str):
+        """等待新建文档索引完成（Dify只允许向已完成索引的文档添加分段）"""
+        if not batch:
+            return
+        deadline = time.monotonic() + self.index_timeout
+        delay = 0.5
+        while True:
+            data = self._request('GET', f"{self.dataset_url}/documents/{batch}/indexing-status").json()
+            statuses = [item.get('indexing_status') for item in data.get('data', [])]
+            if statuses and all(status == 'completed' for status in statuses):
+                return
+            if any(status == 'error' for status in statuses):
+                raise Exception("Dify文档索引失败")
+            if time.monotonic() > deadline:
+                raise Exception(f"等待Dify文档索引超时（{self.index_timeout:.0f}秒）")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def _list_segments(self, document_id: str) -> List[Tuple[str, str]]:
+        """
+        按位置顺序获取文档已有的分段
+
+        Returns:
+            [(内容哈希, 分段ID), ...]
+        """
+        segments: List[Tuple[str, str]] = []
+        page = 1
+        while True:
+            data = self._request('GET', f"{self.dataset_url}/documents/{document_id}/segments",
+                                 params={'page': page, 'limit': 100}).json()
+            for segment in data.get('data', []):
+                segments.append((self.content_hash(segment.get('content', '')), segment['id']))
+            if not data.get('has_more'):
+                break
+            page += 1
+        return segments
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        发送请求，对连接失败、超时和429/5xx做带抖动的指数退避重试
+
+        Returns:
+            成功的响应
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = e
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    if response.status_code >= 400:
+                        raise Exception(f"Dify请求失败 ({response.status_code}): {response.text[:200]}")
+                    return response
+                value = response.headers.get('Retry-After')
+                if value and value.isdigit():
+                    retry_after = min(float(value), self.backoff_max)
+                last_error = Exception(f"Dify服务返回 {response.status_code}")
+
+            if attempt < self.max_retries:
+                time.sleep(retry_after if retry_after is not None else
+                           random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+        raise Exception(f"Dify请求失败（已重试 {self.max_retries} 次）: {last_error}")
+
+    def close(self) -> Tuple[Dict, List[Dict]]:
+        """
+        等待所有文档推送完成
+
+        Returns:
+            (统计, 失败的推送结果列表)
+        """
+        self.executor.shutdown(wait=True)
+        failed = [f.result() for f in self.futures if f.result()['status'] == 'failed']
+        self.futures.clear()
+        if self.state_file is not None:
+            self.state_file.close()
+        self.session.close()
+        return dict(self.stats), failed
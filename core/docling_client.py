@@ -18,85 +18,684 @@ Docling客户端模块
 负责与Docling服务通信
 """
 
+import re
+import math
 import requests
 import json
+import time
+import random
+import itertools
+import zipfile
+import tempfile
+import posixpath
 import mimetypes
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Tuple
+from .circuit_breaker import CircuitBreaker
+from .task_poller import TaskPoller
+
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
 
 
 class DoclingClient:
     """Docling客户端 - 负责与Docling服务通信"""
     
-    def __init__(self, service_url: str = "http://localhost:9969/v1/convert/file"):
+    # ZIP结果在内存中缓冲的上限，超过后写入临时文件
+    SPOOL_SIZE = 8 * 1024 * 1024
+    
+    def __init__(self, service_url: str = "http://localhost:9969/v1/convert/file",
+                 max_retries: int = 3, backoff_base: float = 2.0, backoff_max: float = 60.0,
+                 connect_timeout: float = 10.0, min_timeout: float = 120.0, max_timeout: float = 1000.0,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30.0,
+                 async_mode: bool = False, transfer_workers: int = 4,
+                 poll_interval: float = 1.0, poll_max_interval: float = 30.0,
+                 image_mode: str = 'base64', extra_urls: List[str] = None,
+                 hedge_percentile: float = 0.0, hedge_budget: float = 0.05, hedge_min_samples: int = 20,
+                 keep_document: bool = False):
         """
         初始化Docling客户端
         
         Args:
             service_url: Docling服务的URL
+            max_retries: 可重试错误（连接失败、读超时、5xx/429）的最大重试次数
+            backoff_base: 指数退避的基础等待时间（秒）
+            backoff_max: 单次退避等待的上限（秒）
+            connect_timeout: 建立连接的超时时间（秒）
+            min_timeout: 单次请求截止时间的下限（秒）
+            max_timeout: 单次请求截止时间的上限（秒）
+            breaker_threshold: 连续失败多少次后熔断（每个实例单独计数和熔断）
+            breaker_cooldown: 熔断后的冷却时间（秒）
+            async_mode: 是否使用异步任务接口（提交、轮询、获取结果）
+            transfer_workers: 异步模式下上传文件和下载结果的线程数
+            poll_interval: 异步任务的初始轮询间隔（秒）
+            poll_max_interval: 异步任务轮询间隔上限（秒）
+            image_mode: 'base64' 图片以base64内嵌在JSON中；'zip' 请求ZIP结果，图片以独立文件返回
+            extra_urls: 其他Docling服务实例的URL，同步请求在所有实例间轮流发送（异步任务只使用service_url）
+            hedge_percentile: 请求耗时超过同类请求该百分位时向另一个实例发送副本，先完成的结果生效，0表示不对冲
+            hedge_budget: 对冲请求占普通请求的比例上限
+            hedge_min_samples: 同类请求的耗时样本达到该数量后才开始对冲
+            keep_document: 同时请求Docling的结构化文档（JSON），结果中带有 json_content
+                           （ZIP模式下为压缩包中的 .json 条目）
         """
+        if image_mode not in ('base64', 'zip'):
+            raise Exception(f"不支持的图片模式: {image_mode} (支持: base64, zip)")
+        
         self.service_url = service_url
+        self.image_mode = image_mode
+        self.keep_document = keep_document
+        self.async_mode = async_mode
+        # 服务根地址，例如 http://localhost:9969
+        self.api_base = service_url.split('/v1/')[0]
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        # 多实例：同步请求轮流发送（跳过熔断中的实例）；对冲请求发往在途请求最少的其他实例
+        self.endpoints = [service_url] + [url for url in (extra_urls or []) if url != service_url]
+        # 每个实例一个熔断器，一个实例故障不影响发往其他实例的请求（异步任务接口使用service_url的熔断器）
+        self.breakers = {url: CircuitBreaker(breaker_threshold, breaker_cooldown) for url in self.endpoints}
+        self.breaker = self.breakers[service_url]
+        self.endpoint_cycle = itertools.cycle(self.endpoints)
+        self.endpoint_inflight = {url: 0 for url in self.endpoints}
+        self.hedge_percentile = hedge_percentile if len(self.endpoints) > 1 else 0.0
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+        # 按大小分类的最近请求耗时，用于计算对冲延迟
+        self.latencies = defaultdict(lambda: deque(maxlen=256))
+        # 对冲令牌：每个普通请求增加 hedge_budget 个，每次对冲消耗1个
+        self.hedge_tokens = 1.0
+        self.hedge_stats = {'fired': 0, 'denied': 0}
+        self.hedge_executor = None
+        if self.hedge_percentile:
+            self.hedge_executor = ThreadPoolExecutor(max_workers=256, thread_name_prefix='docling-hedge')
+        
+        # 观测到的处理吞吐（字节/秒），用指数加权平均估计
+        self.deadline_factor = 4.0
+        self.observed_bytes = 50 * 1024.0
+        self.observed_seconds = 1.0
+        self.lock = threading.Lock()
+        
         self.session = requests.Session()
-        # 设置连接池和重试策略
+        # 设置连接池；重试由 _request_with_retry 统一处理
         adapter = requests.adapters.HTTPAdapter(
             pool_connections=10,
             pool_maxsize=10,
-            max_retries=3
+            max_retries=0
         )
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
+        
+        # 异步模式：少量传输线程 + 单个轮询线程
+        self.transfer_executor = None
+        self.poller = None
+        if async_mode:
+            self.transfer_executor = ThreadPoolExecutor(max_workers=transfer_workers, thread_name_prefix='docling-transfer')
+            self.poller = TaskPoller(
+                self.session,
+                f"{self.api_base}/v1/status/poll/{{task_id}}",
+                self._schedule_fetch,
+                interval=poll_interval,
+                max_interval=poll_max_interval
+            )
     
-    def convert_file(self, file_path: str) -> Dict:
+    def convert_file(self, file_path: str, page_range: Tuple[int, int] = None,
+                     options: Dict[str, str] = None) -> Dict:
         """
         调用Docling服务转换单个文件
         
+        异步模式下提交任务并等待结果；批量场景应直接使用 submit_file，
+        避免每个文件占用一个等待线程。
+        
         Args:
             file_path: 文件路径
+            page_range: 只转换的页码区间 (起始页, 结束页)，从1开始，None表示全部页面
+            options: 覆盖默认值的转换参数（例如 do_ocr、do_formula_enrichment）
             
         Returns:
-            转换结果字典
+            转换结果字典；ZIP模式下为 {'archive': 压缩包文件对象, 'transfer_bytes': 字节数}
         """
+        if self.async_mode:
+            return self.submit_file(file_path, page_range, options).result()
+        
         file_path = Path(file_path)
+        size_class = self._size_class(file_path.stat().st_size, page_range)
+        delay = self._hedge_delay(size_class)
+        if delay is None:
+            return self._convert_on(self._next_endpoint(), file_path, page_range, options, size_class)
+        return self._convert_hedged(file_path, page_range, options, size_class, delay)
+    
+    def _convert_on(self, url: str, file_path: Path, page_range: Tuple[int, int], options: Dict[str, str],
+                    size_class: Tuple) -> Dict:
+        """向指定实例发送同步转换请求，并记录耗时"""
+        with self.lock:
+            self.endpoint_inflight[url] += 1
+        start_time = time.monotonic()
+        try:
+            response = self._post_file(url, file_path, page_range, stream=self.image_mode == 'zip', options=options)
+            result = self._read_result(response)
+        except requests.exceptions.Timeout as e:
+            # 超时的请求同样计入耗时分布（至少这么久），否则对冲百分位会偏低
+            with self.lock:
+                self.latencies[size_class].append(time.monotonic() - start_time)
+            raise self._wrap_error(e)
+        except Exception as e:
+            raise self._wrap_error(e)
+        finally:
+            with self.lock:
+                self.endpoint_inflight[url] -= 1
+        
+        with self.lock:
+            self.latencies[size_class].append(time.monotonic() - start_time)
+        return result
+    
+    def _convert_hedged(self, file_path: Path, page_range: Tuple[int, int], options: Dict[str, str],
+                        size_class: Tuple, delay: float) -> Dict:
+        """
+        带对冲的同步转换：主请求超过对冲延迟仍未完成时，向另一个实例发送副本
+        
+        先成功的结果生效；另一个请求无法在传输中途中止，完成后结果被丢弃。
+        
+        Returns:
+            转换结果字典，附带 hedged（是否发出对冲请求）和 hedge_won（对冲请求是否先完成）
+        """
+        primary_url = self._next_endpoint()
+        primary = self.hedge_executor.submit(self._convert_on, primary_url, file_path, page_range, options, size_class)
+        
+        done, _ = wait([primary], timeout=delay)
+        hedge_url = None if done else self._take_hedge(primary_url)
+        if hedge_url is None:
+            return primary.result()
+        
+        hedge = self.hedge_executor.submit(self._convert_on, hedge_url, file_path, page_range, options, size_class)
+        remaining = {primary, hedge}
+        errors = {}
+        while remaining:
+            done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[future] = e
+                    continue
+                
+                # 丢弃仍在进行的另一个请求（完成后释放其结果）
+                for loser in remaining:
+                    loser.cancel()
+                    loser.add_done_callback(self._discard_result)
+                if isinstance(result, dict):
+                    result['hedged'] = 1
+                    result['hedge_won'] = int(future is hedge)
+                return result
+        
+        raise errors[primary]
+    
+    @staticmethod
+    def _discard_result(future: Future):
+        """释放被丢弃的对冲结果（ZIP临时文件）"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if isinstance(result, dict) and 'archive' in result:
+            result['archive'].close()
+    
+    def set_breaker_listener(self, listener: Callable[[str, str], None]):
+        """
+        设置各实例熔断器的状态变化回调
+
+        Args:
+            listener: 回调 (新状态, 说明)；多实例时说明前附带实例URL
+        """
+        for url, breaker in self.breakers.items():
+            if len(self.endpoints) > 1:
+                breaker.listener = lambda state, message, url=url: listener(state, f"[{url}] {message}")
+            else:
+                breaker.listener = listener
+
+    def _next_endpoint(self) -> str:
+        """轮流选择实例，跳过熔断中的实例（全部熔断时仍按顺序选择，请求在熔断器中等待）"""
+        with self.lock:
+            first = next(self.endpoint_cycle)
+            url = first
+            for _ in range(len(self.endpoints) - 1):
+                if not self.breakers[url].is_open():
+                    return url
+                url = next(self.endpoint_cycle)
+            return url if not self.breakers[url].is_open() else first
+    
+    @staticmethod
+    def _size_class(file_size: int, page_range: Tuple[int, int] = None) -> Tuple:
+        """请求的大小分类：页码区间按页数、整个文件按字节数，以2的幂分档"""
+        if page_range:
+            return ('pages', int(math.log2(max(1, page_range[1] - page_range[0] + 1))))
+        return ('bytes', int(math.log2(max(1, file_size // (64 * 1024)))))
+    
+    def _hedge_delay(self, size_class: Tuple) -> Optional[float]:
+        """
+        同类请求耗时的百分位，作为对冲延迟
+        
+        Returns:
+            对冲延迟（秒），未启用对冲或样本不足时返回None
+        """
+        if not self.hedge_percentile:
+            return None
+        with self.lock:
+            self.hedge_tokens = min(10.0, self.hedge_tokens + self.hedge_budget)
+            samples = sorted(self.latencies[size_class])
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+    
+    def _take_hedge(self, primary_url: str) -> Optional[str]:
+        """
+        在预算允许时为对冲请求选择实例
+        
+        Returns:
+            对冲实例URL，预算不足时返回None
+        """
+        with self.lock:
+            if self.hedge_tokens < 1.0:
+                self.hedge_stats['denied'] += 1
+                return None
+            candidates = [url for url in self.endpoints if url != primary_url and not self.breakers[url].is_open()]
+            if not candidates:
+                return None
+            self.hedge_tokens -= 1.0
+            self.hedge_stats['fired'] += 1
+            return min(candidates, key=lambda url: self.endpoint_inflight[url])
+    
+    def convert_files(self, file_paths: List[str], options: Dict[str, str] = None) -> Dict[str, Dict]:
+        """
+        在一个multipart请求中转换多个小文件，并按文件拆分结果
+        
+        多文件请求的结果总是ZIP，每个文档一个Markdown文件（保留结构化文档时还有一个JSON文件）。上传时文件名加上序号前缀，
+        同名文件也能准确对应。转换失败的文档不会出现在ZIP中，也不会出现在返回结果里，
+        由调用方单独重试。
+        
+        Args:
+            file_paths: 文件路径列表
+            options: 覆盖默认值的转换参数（所有文件相同）
+            
+        Returns:
+            {文件路径: 转换结果字典}，结果格式与 convert_file 相同
+        """
+        paths = [Path(file_path) for file_path in file_paths]
+        upload_names = [f"{index:04d}_{path.name}" for index, path in enumerate(paths)]
+        
+        data = self._form_data(options, archive=True)
+        if self.image_mode == 'base64':
+            # 图片以base64内嵌在各文档的Markdown中，与单文件请求的后处理相同
+            data['image_export_mode'] = 'embedded'
+        
+        url = self._next_endpoint()
+        
+        def send(timeout):
+            handles = []
+            try:
+                files = []
+                for path, upload_name in zip(paths, upload_names):
+                    handles.append(open(path, 'rb'))
+                    files.append(('files', (upload_name, handles[-1], self._get_mime_type(path))))
+                return self.session.post(url, files=files, data=data, timeout=timeout, stream=True)
+            finally:
+                for handle in handles:
+                    handle.close()
         
         try:
-            # 读取文件
+            response = self._request_with_retry(send, sum(path.stat().st_size for path in paths), url)
+            archive, _ = self._spool_response(response)
+        except Exception as e:
+            raise self._wrap_error(e)
+        
+        with archive:
+            return self._split_archive(archive, paths, upload_names)
+    
+    def _split_archive(self, archive, paths: List[Path], upload_names: List[str]) -> Dict[str, Dict]:
+        """按上传文件名把多文档ZIP结果拆分为各文件的结果"""
+        results = {}
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise Exception("服务返回的不是有效的ZIP结果")
+        
+        with zf:
+            entries = {info.filename for info in zf.infolist() if not info.is_dir()}
+            md_names = {}
+            json_names = {}
+            for name in entries:
+                stem, ext = posixpath.splitext(posixpath.basename(name))
+                if ext.lower() == '.md':
+                    md_names.setdefault(stem, name)
+                elif ext.lower() == '.json':
+                    json_names.setdefault(stem, name)
+            
+            for path, upload_name in zip(paths, upload_names):
+                md_name = md_names.get(Path(upload_name).stem)
+                if md_name is None:
+                    continue
+                content = zf.read(md_name)
+                json_name = json_names.get(Path(upload_name).stem)
+                
+                if self.image_mode == 'base64':
+                    document = {'md_content': content.decode('utf-8')}
+                    transfer_bytes = len(content)
+                    if json_name is not None:
+                        json_content = zf.read(json_name)
+                        document['json_content'] = json.loads(json_content)
+                        transfer_bytes += len(json_content)
+                    results[str(path)] = {'document': document, 'transfer_bytes': transfer_bytes}
+                    continue
+                
+                # ZIP模式：只把该文档引用的图片复制到单独的压缩包中
+                md_dir = posixpath.dirname(md_name)
+                part = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+                transfer_bytes = len(content)
+                with zipfile.ZipFile(part, 'w') as out:
+                    out.writestr(md_name, content)
+                    if json_name is not None:
+                        json_content = zf.read(json_name)
+                        out.writestr(json_name, json_content)
+                        transfer_bytes += len(json_content)
+                    targets = re.findall(r'!\[[^\]]*\]\(([^)\s]+)\)', content.decode('utf-8'))
+                    for target in set(targets):
+                        entry_name = posixpath.normpath(posixpath.join(md_dir, target))
+                        if entry_name in entries and entry_name != md_name:
+                            image = zf.read(entry_name)
+                            out.writestr(entry_name, image)
+                            transfer_bytes += len(image)
+                part.seek(0)
+                results[str(path)] = {'archive': part, 'transfer_bytes': transfer_bytes}
+        
+        return results
+    
+    def submit_file(self, file_path: str, page_range: Tuple[int, int] = None,
+                    options: Dict[str, str] = None) -> Future:
+        """
+        提交文件到异步转换接口，立即返回future
+        
+        上传在传输线程中进行，任务状态由单个轮询线程检查，
+        任务成功后在传输线程中下载结果并设置到future。
+        
+        Args:
+            file_path: 文件路径
+            page_range: 只转换的页码区间
+            options: 覆盖默认值的转换参数
+            
+        Returns:
+            完成时结果为转换结果字典的future
+        """
+        if not self.async_mode:
+            raise Exception("未启用异步模式，无法提交异步任务")
+        
+        future = Future()
+        started = time.monotonic()
+        try:
+            size = Path(file_path).stat().st_size
+        except OSError:
+            size = 0  # 文件错误由上传时报告
+        future.add_done_callback(lambda done: self._observe_task(done, size, started))
+        self.transfer_executor.submit(self._submit_task, Path(file_path), page_range, future, options)
+        return future
+    
+    def _submit_task(self, file_path: Path, page_range: Tuple[int, int], future: Future,
+                     options: Dict[str, str] = None):
+        """上传文件并登记异步任务"""
+        try:
+            response = self._post_file(f"{self.service_url}/async", file_path, page_range, options=options,
+                                       observe=False)
+            task_id = response.json()['task_id']
+        except KeyError:
+            future.set_exception(Exception("服务返回的异步任务缺少task_id"))
+            return
+        except Exception as e:
+            future.set_exception(self._wrap_error(e))
+            return
+        
+        self.poller.track(task_id, future)
+    
+    def _schedule_fetch(self, task_id: str, future: Future):
+        """任务成功后在传输线程中获取结果，不阻塞轮询线程"""
+        self.transfer_executor.submit(self._fetch_result, task_id, future)
+    
+    def _fetch_result(self, task_id: str, future: Future):
+        """下载异步任务的转换结果"""
+        def send(timeout):
+            return self.session.get(f"{self.api_base}/v1/result/{task_id}", timeout=timeout,
+                                    stream=self.image_mode == 'zip')
+        
+        try:
+            response = self._request_with_retry(send, 0)
+            future.set_result(self._read_result(response))
+        except Exception as e:
+            future.set_exception(self._wrap_error(e))
+    
+    def _read_result(self, response: requests.Response) -> Dict:
+        """
+        读取转换结果，并记录传输字节数
+        
+        ZIP模式下响应体分块写入临时文件（超过阈值才落盘），不在内存中保留完整副本。
+        """
+        if self.image_mode == 'zip':
+            archive, transfer_bytes = self._spool_response(response)
+            return {'archive': archive, 'transfer_bytes': transfer_bytes}
+        
+        result = response.json()
+        if isinstance(result, dict):
+            result['transfer_bytes'] = len(response.content)
+        return result
+    
+    def _spool_response(self, response: requests.Response):
+        """
+        将响应体分块写入临时文件（超过阈值才落盘）
+        
+        Returns:
+            (定位到开头的临时文件, 字节数)
+        """
+        archive = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        transfer_bytes = 0
+        try:
+            for block in response.iter_content(chunk_size=1024 * 1024):
+                archive.write(block)
+                transfer_bytes += len(block)
+        except Exception:
+            archive.close()
+            raise
+        finally:
+            response.close()
+        archive.seek(0)
+        return archive, transfer_bytes
+    
+    def _form_data(self, options: Dict[str, str] = None, archive: bool = False) -> Dict:
+        """
+        构建转换参数
+        
+        Args:
+            options: 覆盖默认值的转换参数
+            archive: 是否请求ZIP结果（图片以引用文件的形式打包）
+            
+        Returns:
+            表单数据
+        """
+        data = {
+            'output_format': 'markdown',
+            'image_mode': 'base64',
+            'do_formula_enrichment': 'true',
+            'do_ocr': 'true' 
+        }
+        if options:
+            data.update(options)
+        if archive:
+            # 图片以引用文件的形式打包进ZIP，避免base64膨胀和JSON解析
+            data.update({
+                'to_formats': 'md',
+                'image_export_mode': 'referenced',
+                'target_type': 'zip'
+            })
+            del data['image_mode']
+        if self.keep_document:
+            # 同时返回结构化文档，之后可在本地渲染为其他格式而无需重新转换
+            data['to_formats'] = ['md', 'json']
+        return data
+    
+    def _post_file(self, url: str, file_path: Path, page_range: Tuple[int, int] = None,
+                   stream: bool = False, options: Dict[str, str] = None, observe: bool = True) -> requests.Response:
+        """
+        以multipart形式上传文件到指定接口
+        
+        Args:
+            url: 接口URL
+            file_path: 文件路径
+            page_range: 只转换的页码区间
+            stream: 是否流式读取响应体
+            options: 覆盖默认值的转换参数
+            observe: 是否用本次请求的耗时修正吞吐估计（异步任务的上传请求不计入）
+            
+        Returns:
+            成功的响应
+        """
+        # 设置转换参数
+        data = self._form_data(options, archive=self.image_mode == 'zip')
+        if page_range:
+            data['page_range'] = [str(page_range[0]), str(page_range[1])]
+        
+        def send(timeout):
+            # 每次尝试重新打开文件，保证重试时上传完整内容
             with open(file_path, 'rb') as f:
                 files = {
                     'files': (file_path.name, f, self._get_mime_type(file_path))
                 }
-                
-                # 设置转换参数
-                data = {
-                    'output_format': 'markdown',
-                    'image_mode': 'base64',
-                    'do_formula_enrichment': 'true',
-                    'do_ocr': 'true' 
-                }
-                
-                # 发送请求
-                response = self.session.post(
-                    self.service_url,
+                return self.session.post(
+                    url,
                     files=files,
                     data=data,
-                    timeout=1000  # 5分钟超时
+                    timeout=timeout,
+                    stream=stream
                 )
-
-                response.raise_for_status()
-                result = response.json()
-                return result
-                
-        except requests.exceptions.ConnectionError:
-            raise Exception(f"无法连接到Docling服务 ({self.service_url})，请确认服务是否正在运行")
-        except requests.exceptions.Timeout:
-            raise Exception("请求超时，文件可能过大或服务响应缓慢")
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"请求失败: {str(e)}")
-        except json.JSONDecodeError:
-            raise Exception("服务返回的不是有效的JSON格式")
-        except Exception as e:
-            raise Exception(f"转换失败: {str(e)}")
+        
+        # 异步任务接口（{service_url}/async）使用 service_url 的熔断器
+        return self._request_with_retry(send, file_path.stat().st_size, url if url in self.breakers else None,
+                                        observe)
+    
+    def _wrap_error(self, error: Exception) -> Exception:
+        """将请求过程中的异常转换为可读的错误信息"""
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return Exception(f"无法连接到Docling服务 ({self.service_url})，请确认服务是否正在运行")
+        if isinstance(error, requests.exceptions.Timeout):
+            return Exception("请求超时，文件可能过大或服务响应缓慢")
+        if isinstance(error, requests.exceptions.RequestException):
+            return Exception(f"请求失败: {str(error)}")
+        if isinstance(error, json.JSONDecodeError):
+            return Exception("服务返回的不是有效的JSON格式")
+        return Exception(f"转换失败: {str(error)}")
+    
+    def _request_with_retry(self, send: Callable, payload_size: int, endpoint: str = None,
+                            observe: bool = True) -> requests.Response:
+        """
+        发送请求，对可重试错误做带抖动的指数退避重试，并接受熔断器控制
+        
+        Args:
+            send: 执行单次请求的函数，参数为 (连接超时, 读超时)
+            payload_size: 上传的字节数，用于计算截止时间
+            endpoint: 请求发往的实例（决定使用哪个熔断器），None表示 service_url
+            observe: 成功时是否用本次耗时修正吞吐估计（不上传文件的请求不计入）
+            
+        Returns:
+            成功的响应
+        """
+        read_timeout = self.get_deadline(payload_size)
+        breaker = self.breakers[endpoint or self.service_url]
+        last_error = None
+        
+        for attempt in range(self.max_retries + 1):
+            breaker.acquire()
+            start_time = time.monotonic()
+            retry_after = None
+            
+            try:
+                response = send((self.connect_timeout, read_timeout))
+            except requests.exceptions.ConnectionError as e:
+                breaker.record_failure()
+                last_error = e
+            except requests.exceptions.Timeout as e:
+                # 读超时后放宽截止时间再重试
+                breaker.record_failure()
+                last_error = e
+                read_timeout = min(read_timeout * 2, self.max_timeout)
+            except Exception:
+                breaker.release()
+                raise
+            else:
+                if response.status_code in RETRYABLE_STATUS:
+                    breaker.record_failure()
+                    retry_after = self._parse_retry_after(response)
+                    # 只保留状态码和URL，立即关闭响应把连接还给连接池（流式响应不会自动归还）
+                    last_error = requests.exceptions.HTTPError(
+                        f"{response.status_code} Server Error for url: {response.url}"
+                    )
+                    response.close()
+                else:
+                    # 服务有响应（包括4xx客户端错误），说明服务本身是健康的
+                    breaker.record_success()
+                    if not response.ok:
+                        response.close()
+                    response.raise_for_status()
+                    if observe and payload_size > 0:
+                        self._observe(payload_size, time.monotonic() - start_time)
+                    return response
+            
+            if attempt < self.max_retries:
+                time.sleep(retry_after if retry_after is not None else self._backoff_delay(attempt))
+        
+        raise last_error
+    
+    def get_deadline(self, payload_size: int) -> float:
+        """
+        根据文件大小和观测到的吞吐计算请求截止时间
+        
+        Args:
+            payload_size: 上传的字节数
+            
+        Returns:
+            读超时（秒）
+        """
+        with self.lock:
+            throughput = self.observed_bytes / self.observed_seconds
+        
+        expected = payload_size / throughput
+        # --timeout 小于下限时以 --timeout 为准
+        floor = min(self.min_timeout, self.max_timeout)
+        return max(floor, min(self.max_timeout, floor + self.deadline_factor * expected))
+    
+    def _observe_task(self, future: Future, payload_size: int, started: float):
+        """异步任务成功时按上传到取回结果的整体耗时修正吞吐（上传请求本身只占其中一小部分）"""
+        if payload_size > 0 and not future.cancelled() and future.exception() is None:
+            self._observe(payload_size, time.monotonic() - started)
+    
+    def _observe(self, payload_size: int, elapsed: float, alpha: float = 0.2):
+        """记录一次成功请求的字节数和耗时（分别做指数加权，按时间加权得到吞吐）"""
+        with self.lock:
+            self.observed_bytes = (1 - alpha) * self.observed_bytes + alpha * payload_size
+            self.observed_seconds = (1 - alpha) * self.observed_seconds + alpha * max(elapsed, 1e-3)
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """带完全抖动的指数退避等待时间"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _parse_retry_after(self, response: requests.Response):
+        """解析 Retry-After 响应头（只支持秒数形式）"""
+        value = response.headers.get('Retry-After')
+        if value and value.isdigit():
+            return min(float(value), self.backoff_max)
+        return None
     
     def _get_mime_type(self, file_path: Path) -> str:
         """获取文件的MIME类型"""
         mime_type, _ = mimetypes.guess_type(str(file_path))
-        return mime_type or 'application/octet-stream'
\ No newline at end of file
+        return mime_type or 'application/octet-stream'
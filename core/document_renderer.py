@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   document_renderer.py
+@Time    :   2026/02/26 14:18:43
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+文档渲染模块
+从转换时保存的Docling结构化文档（{name}.docling.json.gz）在本地渲染Markdown、纯文本、
+HTML和可直接导入知识库的切片文件，不需要再次调用Docling服务；多个文档在进程池中并行渲染
+"""
+
+import os
+import gzip
+import json
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Iterator, List, Tuple
+from .output_manager import DOCUMENT_SUFFIX
+
+try:
+    from docling_core.types.doc import DoclingDocument
+except ImportError:  # docling-core 只在渲染结构化文档时需要
+    DoclingDocument = None
+
+
+# 渲染格式 -> 输出文件名后缀（chunks 与 batch_chunk 的切片文件格式相同）
+RENDER_FORMATS = {
+    'md': '.md',
+    'text': '.txt',
+    'html': '.html',
+    'chunks': '_processed.txt',
+}
+
+
+def load_document(document_path: str) -> 'DoclingDocument':
+    """
+    读取压缩保存的结构化文档
+
+    按页码区间拆分转换的文档保存为JSON数组，读取后合并为一个文档。
+
+    Args:
+        document_path: {name}.docling.json.gz 文件路径
+
+    Returns:
+        Docling文档
+    """
+    with gzip.open(document_path, 'rb') as f:
+        data = json.load(f)
+
+    if not isinstance(data, list):
+        return DoclingDocument.model_validate(data)
+
+    parts = [DoclingDocument.model_validate(part) for part in data]
+    if len(parts) == 1:
+        return parts[0]
+    if not hasattr(DoclingDocument, 'concatenate'):
+        raise Exception("当前 docling-core 版本不支持合并分区间转换的文档，请升级 docling-core")
+    return DoclingDocument.concatenate(parts)
+
+
+def render_chunks(document: 'DoclingDocument') -> str:
+    """
+    按文档结构切片（带标题上下文），输出为以空行分隔的切片文件
+
+    Args:
+        document: Docling文档
+
+    Returns:
+        切片文件内容
+    """
+    try:
+        from docling_core.transforms.chunker.hierarchical_chunker import HierarchicalChunker
+    except ImportError:
+        raise Exception("渲染切片需要安装 docling-core 的切片组件：pip install 'docling-core[chunking]'")
+
+    chunker = HierarchicalChunker()
+    texts = []
+    for chunk in chunker.chunk(document):
+        lines = [line.rstrip() for line in chunker.contextualize(chunk).splitlines() if line.rstrip()]
+        if lines:
+            texts.append('\n'.join(lines))
+    return ''.join(f"{text}\n\n" for text in texts)
+
+
+def render_document(document_path: str, output_base: str, formats: Tuple[str, ...]) -> List[str]:
+    """
+    渲染单个结构化文档（在进程池中执行）
+
+    Args:
+        document_path: 结构化文档路径
+        output_base: 输出文件路径（不含后缀）
+        formats: 渲染格式
+
+    Returns:
+        写出的文件路径
+    """
+    document = load_document(document_path)
+    Path(output_base).parent.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    for fmt in formats:
+        if fmt == 'md':
+            content = document.export_to_markdown()
+        elif fmt == 'text':
+            content = document.export_to_text()
+        elif fmt == 'html':
+            content = document.export_to_html()
+        else:
+            content = render_chunks(document)
+
+        output_path = f"{output_base}{RENDER_FORMATS[fmt]}"
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        written.append(output_path)
+    return written
+
+
+class DocumentRenderer:
+    """文档渲染器 - 在进程池中把保存的结构化文档渲染为其他格式"""
+
+    def __init__(self, formats: Tuple[str, ...] = ('text',), max_workers: int = None):
+        """
+        初始化文档渲染器
+
+        Args:
+            formats: 渲染格式（md、text、html、chunks）
+            max_workers: 进程池大小（默认为CPU核数）
+        """
+        if DoclingDocument is None:
+            raise Exception("渲染结构化文档需要安装 docling-core：pip install docling-core")
+
+        unknown = [fmt for fmt in formats if fmt not in RENDER_FORMATS]
+        if unknown:
+            raise Exception(f"不支持的渲染格式: {', '.join(unknown)} (支持: {', '.join(RENDER_FORMATS)})")
+
+        self.formats = tuple(formats)
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def iter_render(self, input_dir: str, output_dir: str) -> Iterator[Tuple[str, List[str], str]]:
+        """
+        渲染目录（递归）中所有保存的结构化文档，按完成顺序逐个产出结果
+
+        输出目录镜像输入目录的结构；在途任务数有上限，文档数量不影响内存占用。
+
+        Args:
+            input_dir: 转换输出目录（包含 {name}.docling.json.gz）
+            output_dir: 渲染输出目录
+
+        Yields:
+            (结构化文档路径, 写出的文件路径列表, 错误信息)
+        """
+        input_root = Path(input_dir)
+        output_root = Path(output_dir)
+        max_pending = self.max_workers * 2
+        pending = {}
+
+        def collect(done) -> Iterator[Tuple[str, List[str], str]]:
+            for future in done:
+                document_path = pending.pop(future)
+                try:
+                    yield document_path, future.result(), ''
+                except Exception as e:
+                    yield document_path, [], str(e)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for document_path in input_root.rglob(f"*{DOCUMENT_SUFFIX}"):
+                relative = document_path.relative_to(input_root)
+                output_base = output_root / relative.parent / relative.name[:-len(DOCUMENT_SUFFIX)]
+                future = executor.submit(render_document, str(document_path), str(output_base), self.formats)
+                pending[future] = str(document_path)
+
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from collect(done)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   file_scanner.py
+@Time    :   2026/02/03 09:41:12
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+文件扫描器模块
+基于 os.scandir 的流式递归目录扫描，边遍历边产出文件
+"""
+
+import os
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterator, List, Optional, Set
+
+
+DEFAULT_EXTENSIONS = {'.pdf', '.docx', '.doc', '.txt', '.pptx', '.html', '.xml', '.xlsx', '.xls'}
+
+
+class FileScanner:
+    """文件扫描器 - 流式递归查找支持的文件"""
+
+    def __init__(self, extensions: Set[str] = None, include: List[str] = None,
+                 exclude: List[str] = None, recursive: bool = True):
+        """
+        初始化文件扫描器
+
+        Args:
+            extensions: 文件扩展名集合（不区分大小写）
+            include: 包含的glob模式列表（匹配相对路径或文件名），为空时全部包含
+            exclude: 排除的glob模式列表（匹配相对路径或文件/目录名）
+            recursive: 是否递归子目录
+        """
+        if extensions is None:
+            extensions = DEFAULT_EXTENSIONS
+        self.extensions = {ext.lower() for ext in extensions}
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.recursive = recursive
+
+    def _matches(self, rel_path: str, name: str, patterns: List[str]) -> bool:
+        """判断相对路径或文件名是否匹配任意glob模式"""
+        return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
+
+    def scan(self, directory: str) -> Iterator[str]:
+        """
+        递归扫描目录，惰性产出匹配的文件路径
+
+        只调用一次 scandir 遍历每个目录，不会预先构建完整列表，
+        调用方可以在遍历尚未结束时就开始处理文件。
+
+        Args:
+            directory: 目录路径
+
+        Yields:
+            文件路径
+        """
+        root = os.path.abspath(directory)
+        stack = [root]
+
+        while stack:
+            current = stack.pop()
+            try:
+                it = os.scandir(current)
+            except OSError:
+                # 无权限或目录在扫描期间被删除，跳过
+                continue
+
+            subdirs = []
+            with it:
+                yield from self._scan_entries(it, root, subdirs)
+
+            # 子目录在当前目录遍历结束后再处理，逆序入栈保证深度优先顺序与发现顺序一致
+            stack.extend(reversed(subdirs))
+
+    def _scan_entries(self, entries, root: str, subdirs: List[str]) -> Iterator[str]:
+        """遍历单个目录的条目，产出匹配文件，收集待遍历的子目录"""
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+
+            if self.exclude and self._matches(rel_path, entry.name, self.exclude):
+                continue
+
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive:
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+
+            if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                continue
+
+            if self.include and not self._matches(rel_path, entry.name, self.include):
+                continue
+
+            yield entry.path
+
+
+    def accepts(self, file_path: str, root: str) -> bool:
+        """
+        判断单个文件是否符合扫描条件（扩展名、include/exclude，以及被排除的上级目录）
+
+        Args:
+            file_path: 文件路径
+            root: 扫描根目录
+
+        Returns:
+            是否符合
+        """
+        name = os.path.basename(file_path)
+        if os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+
+        rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(root)).replace(os.sep, '/')
+        if rel_path.startswith('../'):
+            return False
+        if not self.recursive and '/' in rel_path:
+            return False
+
+        if self.exclude:
+            parts = rel_path.split('/')
+            for i in range(len(parts)):
+                if self._matches('/'.join(parts[:i + 1]), parts[i], self.exclude):
+                    return False
+
+        return not self.include or self._matches(rel_path, name, self.include)
+
+    @staticmethod
+    def mirrored_output_dir(input_file: str, source_root: Optional[str], output_root: Path) -> Path:
+        """
+        计算镜像输出目录，保持输入目录结构，避免不同子目录下同名文件冲突
+
+        Args:
+            input_file: 输入文件路径
+            source_root: 扫描根目录，为None或文件不在根目录下时不做镜像
+            output_root: 输出根目录
+
+        Returns:
+            该文件的输出目录
+        """
+        if not source_root:
+            return output_root
+
+        try:
+            rel_parent = Path(os.path.abspath(input_file)).relative_to(os.path.abspath(source_root)).parent
+        except ValueError:
+            return output_root
+
+        return output_root / rel_parent
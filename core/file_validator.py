@@ -18,15 +18,112 @@
 负责验证输入文件的有效性
 """
 
+import os
+import zipfile
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+# 文件头/尾特征
+PDF_MAGIC = b'%PDF-'
+PDF_EOF = b'%%EOF'
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# OOXML 文件在压缩包中必须包含的部件前缀
+OOXML_PARTS = {
+    '.docx': 'word/',
+    '.pptx': 'ppt/',
+    '.xlsx': 'xl/',
+}
+
+# 拒绝原因说明（用于报告）
+REJECTION_REASONS = {
+    'not_found': '文件不存在',
+    'unsupported_extension': '不支持的格式',
+    'empty': '空文件',
+    'unreadable': '无法读取',
+    'pdf_header': 'PDF文件头缺失',
+    'pdf_truncated': 'PDF文件被截断',
+    'zip_invalid': '压缩包结构损坏',
+    'ooxml_mismatch': 'Office文档内容与扩展名不符',
+    'ole_invalid': '旧版Office文档签名无效',
+    'markup_invalid': '不是有效的HTML/XML',
+    'binary_text': '文本文件包含二进制内容',
+}
 
 
 class FileValidator:
     """文件验证器 - 负责验证输入文件的有效性"""
     
-    def __init__(self):
+    # 读取文件头/尾的字节数
+    HEAD_SIZE = 4096
+    TAIL_SIZE = 1024
+    
+    def __init__(self, max_workers: int = 8, stat_cache_size: int = 65536):
+        """
+        初始化文件验证器
+        
+        Args:
+            max_workers: 并行验证的线程数
+            stat_cache_size: 文件stat结果缓存条目数
+        """
         self.supported_extensions = {'.pdf', '.docx', '.doc', '.txt', '.pptx', '.html', '.xml', '.xlsx', '.xls'}
+        self.max_workers = max_workers
+        self.stat_cache_size = stat_cache_size
+        self.rejection_counts = Counter()
+        self.lock = threading.Lock()
+        self.stat_cache = OrderedDict()  # 文件路径 -> stat结果
+    
+    def reset(self):
+        """清空拒绝统计和stat缓存（每次运行开始时调用）"""
+        with self.lock:
+            self.rejection_counts.clear()
+            self.stat_cache.clear()
+    
+    def _stat(self, file_path: str, refresh: bool = False):
+        """
+        获取文件stat信息，文件不存在时返回None
+        
+        验证文件时总是重新stat并更新缓存（文件可能在两次运行之间被修改），
+        之后同一运行中查询文件大小直接使用缓存结果。
+        """
+        if not refresh:
+            with self.lock:
+                st = self.stat_cache.get(file_path)
+                if st is not None:
+                    self.stat_cache.move_to_end(file_path)
+                    return st
+        
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            with self.lock:
+                self.stat_cache.pop(file_path, None)
+            return None
+        
+        with self.lock:
+            self.stat_cache[file_path] = st
+            self.stat_cache.move_to_end(file_path)
+            if len(self.stat_cache) > self.stat_cache_size:
+                self.stat_cache.popitem(last=False)
+        return st
+    
+    def get_file_size(self, file_path: str) -> int:
+        """
+        获取文件大小（使用缓存的stat结果）
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            文件字节数，文件不存在时返回0
+        """
+        st = self._stat(str(file_path))
+        return st.st_size if st else 0
     
     def validate_file(self, file_path: str) -> Tuple[bool, str]:
         """
@@ -38,18 +135,122 @@ class FileValidator:
         Returns:
             (是否有效, 错误信息)
         """
-        path = Path(file_path)
+        reason, error_msg = self._check_file(Path(file_path))
         
-        if not path.exists():
-            return False, f"文件不存在: {path}"
+        if reason:
+            with self.lock:
+                self.rejection_counts[reason] += 1
+            return False, error_msg
         
-        if path.suffix.lower() not in self.supported_extensions:
-            return False, f"不支持的文件格式: {path.suffix} (支持: {', '.join(self.supported_extensions)})"
+        return True, ""
+    
+    def _check_file(self, path: Path) -> Tuple[str, str]:
+        """
+        检查文件，返回 (拒绝原因代码, 错误信息)，通过时原因代码为空字符串
+        """
+        st = self._stat(str(path), refresh=True)
+        if st is None:
+            return 'not_found', f"文件不存在: {path}"
         
-        if path.stat().st_size == 0:
-            return False, f"文件为空: {path}"
+        suffix = path.suffix.lower()
+        if suffix not in self.supported_extensions:
+            return 'unsupported_extension', f"不支持的文件格式: {path.suffix} (支持: {', '.join(self.supported_extensions)})"
         
-        return True, ""
+        if st.st_size == 0:
+            return 'empty', f"文件为空: {path}"
+        
+        try:
+            reason = self._sniff_content(path, suffix, st.st_size)
+        except OSError as e:
+            return 'unreadable', f"无法读取文件: {path} ({str(e)})"
+        
+        if reason:
+            return reason, f"文件内容无效({REJECTION_REASONS[reason]}): {path}"
+        
+        return '', ''
+    
+    def _sniff_content(self, path: Path, suffix: str, size: int) -> str:
+        """
+        根据文件头/尾特征检查内容是否与扩展名一致
+        
+        只读取文件开头和结尾的少量字节，不读取整个文件。
+        
+        Returns:
+            拒绝原因代码，通过时返回空字符串
+        """
+        with open(path, 'rb') as f:
+            head = f.read(self.HEAD_SIZE)
+            
+            if suffix == '.pdf':
+                # PDF文件头允许前面有少量垃圾字节
+                if PDF_MAGIC not in head[:1024]:
+                    return 'pdf_header'
+                f.seek(max(0, size - self.TAIL_SIZE))
+                if PDF_EOF not in f.read(self.TAIL_SIZE):
+                    return 'pdf_truncated'
+                return ''
+        
+        if suffix in OOXML_PARTS:
+            if not head.startswith(ZIP_MAGIC):
+                return 'ooxml_mismatch'
+            return self._check_ooxml(path, OOXML_PARTS[suffix])
+        
+        if suffix in ('.doc', '.xls'):
+            return '' if head.startswith(OLE_MAGIC) else 'ole_invalid'
+        
+        if suffix in ('.html', '.xml'):
+            text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+            if b'\x00' in head or b'<' not in text[:1024]:
+                return 'markup_invalid'
+            return ''
+        
+        if suffix == '.txt':
+            # UTF-16 文本以BOM开头，允许包含空字节
+            if b'\x00' in head and not head.startswith((b'\xff\xfe', b'\xfe\xff')):
+                return 'binary_text'
+        
+        return ''
+    
+    def _check_ooxml(self, path: Path, part_prefix: str) -> str:
+        """检查OOXML压缩包的中央目录（只读取目录，不解压内容）"""
+        try:
+            with zipfile.ZipFile(path) as zf:
+                names = zf.namelist()
+        except (zipfile.BadZipFile, zipfile.LargeZipFile):
+            return 'zip_invalid'
+        
+        if '[Content_Types].xml' not in names:
+            return 'ooxml_mismatch'
+        if not any(name.startswith(part_prefix) for name in names):
+            return 'ooxml_mismatch'
+        return ''
+    
+    def iter_validate(self, file_paths: Iterable[str]) -> Iterator[Tuple[str, bool, str]]:
+        """
+        在线程池中并行验证文件，按输入顺序惰性产出结果
+        
+        在途任务数有上限，可以直接处理扫描器产生的生成器。
+        
+        Args:
+            file_paths: 文件路径可迭代对象
+            
+        Yields:
+            (文件路径, 是否有效, 错误信息)
+        """
+        window = deque()
+        max_pending = self.max_workers * 4
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for file_path in file_paths:
+                window.append((file_path, executor.submit(self.validate_file, file_path)))
+                
+                if len(window) >= max_pending:
+                    path, future = window.popleft()
+                    yield (path, *future.result())
+            
+            while window:
+                path, future = window.popleft()
+                yield (path, *future.result())
     
     def validate_files(self, file_paths: List[str]) -> List[Tuple[str, bool, str]]:
         """
@@ -61,8 +262,14 @@ class FileValidator:
         Returns:
             [(文件路径, 是否有效, 错误信息)]
         """
-        results = []
-        for file_path in file_paths:
-            is_valid, error_msg = self.validate_file(file_path)
-            results.append((file_path, is_valid, error_msg))
-        return results
\ No newline at end of file
+        return list(self.iter_validate(file_paths))
+    
+    def get_rejection_summary(self) -> Dict[str, int]:
+        """
+        获取按原因统计的拒绝数量
+        
+        Returns:
+            {原因说明: 数量}
+        """
+        with self.lock:
+            return {REJECTION_REASONS[reason]: count for reason, count in self.rejection_counts.most_common()}
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   folder_watcher.py
+@Time    :   2026/02/13 17:02:31
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+目录监听器模块
+Linux下使用inotify监听文件变化，不可用时退化为定期轮询
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Callable, Dict, List, Set, Tuple
+from .file_scanner import FileScanner
+
+
+# inotify 事件掩码
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class FolderWatcher:
+    """目录监听器 - 返回发生变化的候选文件"""
+
+    def __init__(self, directories: List[str], scanner: FileScanner, poll_interval: float = 5.0,
+                 listener: Callable[[str], None] = None):
+        """
+        初始化目录监听器
+
+        Args:
+            directories: 要监听的目录列表
+            scanner: 文件扫描器（复用其扩展名和include/exclude规则）
+            poll_interval: 轮询模式下的扫描间隔（秒）
+            listener: 监听方式变化时的通知回调
+        """
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.scanner = scanner
+        self.poll_interval = poll_interval
+        self.listener = listener
+
+        self.fd = None
+        self.watches: Dict[int, Tuple[str, str]] = {}  # wd -> (目录, 所属根目录)
+        self.snapshot: Dict[str, Tuple[int, int]] = {}  # 轮询模式: 文件 -> (mtime, size)
+        self.last_poll = 0.0
+        self.needs_rescan = False
+
+        self._init_inotify()
+
+    @property
+    def mode(self) -> str:
+        """当前监听方式"""
+        return 'inotify' if self.fd is not None else 'polling'
+
+    def _init_inotify(self):
+        """尝试初始化inotify，失败时使用轮询"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+
+        if fd < 0:
+            return
+
+        self.libc = libc
+        self.fd = fd
+        for root in self.directories:
+            self._watch_tree(root, root)
+
+    def _watch_tree(self, directory: str, root: str):
+        """递归为目录及其子目录添加监听"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    self._fallback_to_polling()
+                    if self.listener is not None:
+                        self.listener("inotify监听数量达到系统上限，改为轮询模式")
+                    return
+                continue
+            self.watches[wd] = (current, root)
+
+            if not self.scanner.recursive:
+                continue
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def _fallback_to_polling(self):
+        """关闭inotify，退化为轮询"""
+        os.close(self.fd)
+        self.fd = None
+        self.watches.clear()
+
+    def initial_files(self) -> Set[str]:
+        """
+        启动时的全量扫描结果
+
+        Returns:
+            所有符合条件的文件
+        """
+        files = set()
+        for root in self.directories:
+            for file_path in self.scanner.scan(root):
+                files.add(file_path)
+                if self.fd is None:
+                    self.snapshot[file_path] = self.signature(file_path)
+        self.last_poll = time.monotonic()
+        return files
+
+    def root_of(self, file_path: str) -> str:
+        """文件所属的监听根目录"""
+        path = os.path.abspath(file_path)
+        for root in self.directories:
+            if path == root or path.startswith(root + os.sep):
+                return root
+        return self.directories[0]
+
+    def wait_for_changes(self, timeout: float) -> Set[str]:
+        """
+        等待文件变化
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            发生变化（新建、写入、移入）的候选文件
+        """
+        if self.fd is None:
+            return self._poll_changes(timeout)
+
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                data = b''
+            changed = self._parse_events(data)
+
+        if self.needs_rescan:
+            # 事件队列溢出，全量扫描补齐可能丢失的事件
+            self.needs_rescan = False
+            changed |= self.initial_files()
+
+        return changed
+
+    def _parse_events(self, data: bytes) -> Set[str]:
+        """解析inotify事件"""
+        changed = set()
+        offset = 0
+
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                self.needs_rescan = True
+                continue
+
+            if wd not in self.watches or not name:
+                continue
+
+            directory, root = self.watches[wd]
+            path = os.path.join(directory, os.fsdecode(name))
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.scanner.recursive:
+                    # 新目录：添加监听，并补扫添加监听前已写入的文件
+                    self._watch_tree(path, root)
+                    changed.update(self.scanner.scan(path))
+                continue
+
+            if self.scanner.accepts(path, root):
+                changed.add(path)
+
+        return {p for p in changed if self.scanner.accepts(p, self.root_of(p))}
+
+    def _poll_changes(self, timeout: float) -> Set[str]:
+        """轮询模式：定期全量扫描，对比修改时间和大小"""
+        remaining = self.last_poll + self.poll_interval - time.monotonic()
+        if remaining > 0:
+            time.sleep(min(timeout, remaining))
+            if time.monotonic() < self.last_poll + self.poll_interval:
+                return set()
+
+        changed = set()
+        current = {}
+        for root in self.directories:
+            for file_path in self.scanner.scan(root):
+                signature = self.signature(file_path)
+                current[file_path] = signature
+                if self.snapshot.get(file_path) != signature:
+                    changed.add(file_path)
+
+        self.snapshot = current
+        self.last_poll = time.monotonic()
+        return changed
+
+    @staticmethod
+    def signature(file_path: str) -> Tuple[int, int]:
+        """文件签名 (修改时间, 大小)"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return (0, 0)
+        return (st.st_mtime_ns, st.st_size)
+
+    def close(self):
+        """释放inotify资源"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -20,9 +20,12 @@
 
 import base64
 import re
+import shutil
+import zipfile
+import posixpath
 from pathlib import Path
 from datetime import datetime
-from typing import Tuple
+from typing import Callable, Tuple
 
 
 class ImageProcessor:
@@ -31,7 +34,8 @@ class ImageProcessor:
     def __init__(self):
         pass
     
-    def extract_and_save_images(self, markdown_content: str, output_dir: Path, base_name: str) -> Tuple[str, int]:
+    def extract_and_save_images(self, markdown_content: str, output_dir: Path, base_name: str,
+                                image_sink: Callable[[Path, bytes], None] = None) -> Tuple[str, int]:
         """
         从Markdown中提取base64图片并保存为文件，更新Markdown中的引用
         图片文件名包含时间戳，避免重复
@@ -40,13 +44,13 @@ class ImageProcessor:
             markdown_content: Markdown内容
             output_dir: 输出目录
             base_name: 基础文件名
+            image_sink: 图片写入函数 (图片路径, 图片数据)，指定后不写入磁盘（如写入SQLite输出库）
             
         Returns:
             (更新后的Markdown内容, 图片数量)
         """
-        # 创建图片子目录
+        # 图片子目录在写入第一张图片时才创建，没有图片的文档不产生空目录
         images_dir = output_dir / f"{base_name}_images"
-        images_dir.mkdir(exist_ok=True)
         
         # 匹配base64图片的正则表达式
         base64_pattern = r'!\[([^\]]*)\]\(data:image/([^;]+);base64,([^)]+)\)'
@@ -70,8 +74,13 @@ class ImageProcessor:
                 image_path = images_dir / image_filename
                 
                 # 保存图片
-                with open(image_path, 'wb') as f:
-                    f.write(image_data)
+                if image_sink is not None:
+                    image_sink(image_path, image_data)
+                else:
+                    if image_count == 1:
+                        images_dir.mkdir(parents=True, exist_ok=True)
+                    with open(image_path, 'wb') as f:
+                        f.write(image_data)
                 
                 # 返回新的Markdown图片引用（相对路径）
                 relative_path = f"{base_name}_images/{image_filename}"
@@ -87,9 +96,69 @@ class ImageProcessor:
         
         return updated_content, image_count
     
-    def cleanup_empty_image_dirs(self, output_dir: Path):
-        """清理空的图片目录"""
-        for item in output_dir.iterdir():
-            if item.is_dir() and item.name.endswith('_images'):
-                if not any(item.iterdir()):
-                    item.rmdir()
+    def extract_zip_archive(self, archive, output_dir: Path, base_name: str,
+                            image_sink: Callable[[Path, bytes], None] = None,
+                            start_index: int = 0) -> Tuple[str, int]:
+        """
+        从Docling返回的ZIP结果中读取Markdown，并将引用的图片直接写入图片目录
+        
+        图片条目按块复制到目标文件，不做base64编解码；Markdown中的图片引用
+        只做路径替换。
+        
+        Args:
+            archive: ZIP文件路径或文件对象
+            output_dir: 输出目录
+            base_name: 基础文件名
+            image_sink: 图片写入函数 (图片路径, 图片数据)，指定后不写入磁盘
+            start_index: 图片编号起始值（拼接多个页码区间时保持编号连续）
+            
+        Returns:
+            (更新后的Markdown内容, 图片数量)
+        """
+        images_dir = output_dir / f"{base_name}_images"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        with zipfile.ZipFile(archive) as zf:
+            md_names = [name for name in zf.namelist() if name.lower().endswith('.md')]
+            if not md_names:
+                raise Exception("ZIP结果中没有Markdown文件")
+            
+            md_name = md_names[0]
+            md_dir = posixpath.dirname(md_name)
+            markdown_content = zf.read(md_name).decode('utf-8')
+            entries = {info.filename: info for info in zf.infolist() if not info.is_dir()}
+            
+            # 引用路径 -> 新的相对路径
+            replacements = {}
+            image_count = 0
+            
+            def replace_image(match):
+                nonlocal image_count
+                alt_text, target = match.group(1), match.group(2)
+                
+                if target not in replacements:
+                    entry_name = posixpath.normpath(posixpath.join(md_dir, target))
+                    if entry_name not in entries or entry_name == md_name:
+                        return match.group(0)  # 不是压缩包内的图片，保持原样
+                    
+                    image_count += 1
+                    image_format = posixpath.splitext(entry_name)[1].lstrip('.') or 'png'
+                    image_filename = f"image_{timestamp}_{start_index + image_count:03d}.{image_format}"
+                    image_path = images_dir / image_filename
+                    
+                    if image_sink is not None:
+                        image_sink(image_path, zf.read(entry_name))
+                    else:
+                        if image_count == 1:
+                            images_dir.mkdir(parents=True, exist_ok=True)
+                        with zf.open(entry_name) as src, open(image_path, 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                    
+                    replacements[target] = f"{base_name}_images/{image_filename}"
+                
+                return f"![{alt_text}]({replacements[target]})"
+            
+            updated_content = re.sub(r'!\[([^\]]*)\]\(([^)\s]+)\)', replace_image, markdown_content)
+        
+        return updated_content, image_count
+
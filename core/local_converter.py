@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   local_converter.py
+@Time    :   2026/02/19 17:36:05
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+本地快速转换模块
+纯文本、简单HTML/XHTML和表格型XLSX在本地进程池中直接生成Markdown，不经过Docling服务；
+遇到图片、合并单元格等本地无法处理的内容时交回Docling
+"""
+
+import os
+import re
+import threading
+import zipfile
+import posixpath
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from xml.etree import ElementTree
+
+
+class LocalConversionUnsupported(Exception):
+    """文件内容超出本地转换能力，需要交给Docling处理"""
+
+
+# 本地转换器：接收文件路径，返回Markdown内容
+LocalConverter = Callable[[str], str]
+
+
+def _decode_text(data: bytes) -> str:
+    """按BOM或常见编码解码文本"""
+    if data.startswith(b'\xef\xbb\xbf'):
+        return data[3:].decode('utf-8')
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return data.decode('utf-16')
+    for encoding in ('utf-8', 'gb18030'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise LocalConversionUnsupported("无法识别文本编码")
+
+
+def convert_text(file_path: str) -> str:
+    """纯文本：统一换行符后原样输出"""
+    with open(file_path, 'rb') as f:
+        text = _decode_text(f.read())
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return '\n'.join(line.rstrip() for line in text.split('\n')).strip() + '\n'
+
+
+class _HtmlToMarkdown(HTMLParser):
+    """把结构简单的HTML转换为Markdown（标题、段落、列表、引用、代码块、链接、简单表格）"""
+
+    # 含有这些元素的页面交给Docling（需要图片提取或版面理解）
+    UNSUPPORTED = {'img', 'svg', 'math', 'canvas', 'iframe', 'object', 'embed', 'video', 'audio', 'picture'}
+    SKIPPED = {'script', 'style', 'head', 'noscript', 'template'}
+    BLOCKS = {'p', 'div', 'section', 'article', 'header', 'footer', 'main', 'nav', 'aside', 'figure',
+              'figcaption', 'dl', 'dt', 'dd', 'address', 'body', 'html'}
+    HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+    INLINE_MARKS = {'strong': '**', 'b': '**', 'em': '*', 'i': '*', 'code': '`'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[str] = []
+        self.inline: List[str] = []
+        self.skip_depth = 0
+        self.pre_depth = 0
+        self.lists: List[List] = []  # [标签, 序号]
+        self.quote_depth = 0
+        self.heading = 0
+        self.links: List[str] = []
+        self.table: Optional[List[List[str]]] = None
+        self.in_cell = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.UNSUPPORTED:
+            raise LocalConversionUnsupported(f"包含 <{tag}> 元素")
+        if tag in self.SKIPPED:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+
+        if tag in ('td', 'th'):
+            attrs = dict(attrs)
+            if attrs.get('rowspan', '1') != '1' or attrs.get('colspan', '1') != '1':
+                raise LocalConversionUnsupported("表格包含合并单元格")
+            self.inline = []
+            self.in_cell = True
+        elif tag == 'tr':
+            if self.table is not None:
+                self.table.append([])
+        elif tag == 'table':
+            if self.table is not None:
+                raise LocalConversionUnsupported("包含嵌套表格")
+            self.flush()
+            self.table = []
+        elif self.in_cell and tag not in self.INLINE_MARKS and tag not in self.BLOCKS \
+                and tag not in ('a', 'br', 'span'):
+            raise LocalConversionUnsupported(f"表格单元格中包含 <{tag}> 元素")
+        elif tag == 'pre':
+            self.flush()
+            self.pre_depth += 1
+        elif tag in self.HEADINGS:
+            self.flush()
+            self.heading = self.HEADINGS[tag]
+        elif tag in ('ul', 'ol'):
+            self.flush()
+            self.lists.append([tag, 0])
+        elif tag == 'li':
+            self.flush()
+            if self.lists:
+                self.lists[-1][1] += 1
+        elif tag == 'blockquote':
+            self.flush()
+            self.quote_depth += 1
+        elif tag == 'hr':
+            self.flush()
+            self.blocks.append('---')
+        elif tag == 'br':
+            self.inline.append('\n')
+        elif tag == 'a':
+            self.links.append(dict(attrs).get('href') or '')
+            self.inline.append('[')
+        elif tag in self.INLINE_MARKS and not self.pre_depth:
+            self.inline.append(self.INLINE_MARKS[tag])
+        elif tag in self.BLOCKS:
+            self.flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+
+        if tag in ('td', 'th'):
+            if self.table:
+                self.table[-1].append(self._collapse(''.join(self.inline)).replace('|', '\\|'))
+            self.inline = []
+            self.in_cell = False
+        elif tag == 'table':
+            self._flush_table()
+        elif tag == 'pre':
+            self.pre_depth = max(0, self.pre_depth - 1)
+            code = ''.join(self.inline).strip('\n')
+            self.inline = []
+            if code:
+                self.blocks.append(f"```\n{code}\n```")
+        elif tag in self.HEADINGS:
+            self.flush()
+            self.heading = 0
+        elif tag in ('ul', 'ol'):
+            self.flush()
+            if self.lists:
+                self.lists.pop()
+        elif tag == 'blockquote':
+            self.flush()
+            self.quote_depth = max(0, self.quote_depth - 1)
+        elif tag == 'a':
+            href = self.links.pop() if self.links else ''
+            self.inline.append(f"]({href})" if href else ']')
+        elif tag in self.INLINE_MARKS and not self.pre_depth:
+            self.inline.append(self.INLINE_MARKS[tag])
+        elif tag in self.BLOCKS or tag == 'li':
+            self.flush()
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.inline.append(data)
+
+    @staticmethod
+    def _collapse(text: str) -> str:
+        """合并空白（保留<br>产生的换行）"""
+        lines = [re.sub(r'\s+', ' ', line).strip() for line in text.split('\n')]
+        return '\n'.join(line for line in lines if line)
+
+    def flush(self):
+        """把当前行内内容输出为一个块"""
+        if self.in_cell:
+            self.inline.append(' ')
+            return
+        if self.pre_depth:
+            return
+        text = self._collapse(''.join(self.inline))
+        self.inline = []
+        # 空的链接/强调标记不输出
+        if not re.sub(r'[\[\]()*`]', '', text).strip():
+            return
+
+        if self.heading:
+            text = '#' * self.heading + ' ' + text.replace('\n', ' ')
+        elif self.lists:
+            tag, number = self.lists[-1]
+            indent = '  ' * (len(self.lists) - 1)
+            marker = f"{max(number, 1)}." if tag == 'ol' else '-'
+            text = indent + marker + ' ' + text.replace('\n', '\n' + indent + '  ')
+        if self.quote_depth:
+            prefix = '> ' * self.quote_depth
+            text = '\n'.join(prefix + line for line in text.split('\n'))
+        self.blocks.append(text)
+
+    def _flush_table(self):
+        """输出Markdown表格（第一行作为表头）"""
+        rows = [row for row in (self.table or []) if row]
+        self.table = None
+        if not rows:
+            return
+        width = max(len(row) for row in rows)
+        rows = [[cell.replace('\n', ' ') for cell in row] + [''] * (width - len(row)) for row in rows]
+        lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + '---|' * width]
+        lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+        self.blocks.append('\n'.join(lines))
+
+    def markdown(self) -> str:
+        self.flush()
+        if self.table is not None:
+            self._flush_table()
+        return '\n\n'.join(self.blocks) + '\n'
+
+
+def convert_html(file_path: str) -> str:
+    """简单HTML：只包含文本结构和简单表格的页面"""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    charset = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', data[:4096], re.IGNORECASE)
+    try:
+        text = data.decode(charset.group(1).decode('ascii')) if charset else _decode_text(data)
+    except (LookupError, UnicodeDecodeError):
+        text = _decode_text(data)
+
+    parser = _HtmlToMarkdown()
+    parser.feed(text)
+    parser.close()
+    markdown = parser.markdown()
+    if not markdown.strip():
+        raise LocalConversionUnsupported("页面没有文本内容")
+    return markdown
+
+
+def convert_xml(file_path: str) -> str:
+    """XML：只处理XHTML页面，其他XML（如JATS、专利文档）需要Docling的专用解析"""
+    with open(file_path, 'rb') as f:
+        head = f.read(4096)
+    if not re.search(rb'<html[\s>]', head, re.IGNORECASE):
+        raise LocalConversionUnsupported("不是XHTML文档")
+    return convert_html(file_path)
+
+
+# XLSX 内置的日期格式编号
+XLSX_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+XLSX_NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+XLSX_EPOCH = datetime(1899, 12, 30)
+
+
+def _xlsx_date_styles(zf: zipfile.ZipFile) -> set:
+    """找出日期格式的单元格样式编号"""
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+    root = ElementTree.fromstring(zf.read('xl/styles.xml'))
+    custom = {}
+    for fmt in root.iterfind('m:numFmts/m:numFmt', XLSX_NS):
+        code = re.sub(r'"[^"]*"|\[[^\]]*\]', '', fmt.get('formatCode', '')).lower()
+        custom[int(fmt.get('numFmtId'))] = bool(re.search(r'[dy]|m{3,}', code))
+    date_styles = set()
+    for index, xf in enumerate(root.iterfind('m:cellXfs/m:xf', XLSX_NS)):
+        num_fmt = int(xf.get('numFmtId', 0))
+        if num_fmt in XLSX_DATE_FORMATS or custom.get(num_fmt):
+            date_styles.add(index)
+    return date_styles
+
+
+def _xlsx_cell_value(cell, shared: List[str], date_styles: set) -> str:
+    """读取单元格的显示文本"""
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iterfind('.//m:t', XLSX_NS))
+    value = cell.findtext('m:v', default='', namespaces=XLSX_NS)
+    if cell_type == 's':
+        return shared[int(value)] if value else ''
+    if cell_type == 'b':
+        return 'TRUE' if value == '1' else 'FALSE'
+    if cell_type == 'n' and value and int(cell.get('s', 0)) in date_styles:
+        moment = XLSX_EPOCH + timedelta(days=float(value))
+        return moment.strftime('%Y-%m-%d' if moment.time() == datetime.min.time() else '%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _xlsx_column(reference: str) -> int:
+    """单元格引用（如 C12）转换为从0开始的列号"""
+    column = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        column = column * 26 + ord(char.upper()) - 64
+    return column - 1
+
+
+def convert_xlsx(file_path: str) -> str:
+    """表格型XLSX：每个工作表输出一个Markdown表格（首行为表头）"""
+    with zipfile.ZipFile(file_path) as zf:
+        names = zf.namelist()
+        if any(name.startswith(('xl/drawings/', 'xl/media/', 'xl/charts/', 'xl/pivotTables/')) for name in names):
+            raise LocalConversionUnsupported("包含图片、图表或数据透视表")
+
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            root = ElementTree.fromstring(zf.read('xl/sharedStrings.xml'))
+            shared = [''.join(t.text or '' for t in si.iterfind('.//m:t', XLSX_NS))
+                      for si in root.iterfind('m:si', XLSX_NS)]
+        date_styles = _xlsx_date_styles(zf)
+
+        rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+        workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+
+        sections = []
+        for sheet in workbook.iterfind('m:sheets/m:sheet', XLSX_NS):
+            if sheet.get('state') in ('hidden', 'veryHidden'):
+                continue
+            target = targets.get(sheet.get(XLSX_REL_NS), '')
+            part = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+            rows = []
+            with zf.open(part) as f:
+                for _, element in ElementTree.iterparse(f):
+                    tag = element.tag.rsplit('}', 1)[-1]
+                    if tag == 'mergeCell':
+                        raise LocalConversionUnsupported("表格包含合并单元格")
+                    if tag != 'row':
+                        continue
+                    row = {}
+                    for index, cell in enumerate(element.iterfind('m:c', XLSX_NS)):
+                        column = _xlsx_column(cell.get('r', '')) if cell.get('r') else index
+                        row[column] = _xlsx_cell_value(cell, shared, date_styles)
+                    if any(value.strip() for value in row.values()):
+                        rows.append(row)
+                    element.clear()
+
+            if not rows:
+                continue
+            first = min(min(row) for row in rows)
+            width = max(max(row) for row in rows) - first + 1
+            table = [
+                [re.sub(r'\s+', ' ', row.get(first + i, '')).strip().replace('|', '\\|') for i in range(width)]
+                for row in rows
+            ]
+            lines = ['| ' + ' | '.join(table[0]) + ' |', '|' + '---|' * width]
+            lines.extend('| ' + ' | '.join(row) + ' |' for row in table[1:])
+            sections.append(f"## {sheet.get('name')}\n\n" + '\n'.join(lines))
+
+    if not sections:
+        raise LocalConversionUnsupported("工作簿没有数据")
+    return '\n\n'.join(sections) + '\n'
+
+
+# 默认注册的本地转换器（按扩展名）
+DEFAULT_CONVERTERS: Dict[str, LocalConverter] = {
+    '.txt': convert_text,
+    '.html': convert_html,
+    '.xml': convert_xml,
+    '.xlsx': convert_xlsx,
+}
+
+
+class LocalConverterRegistry:
+    """本地转换器注册表 - 按扩展名选择本地转换器，在进程池中执行"""
+
+    def __init__(self, enabled: bool = True, max_workers: int = None, timeout: float = 30.0):
+        """
+        初始化本地转换器注册表
+
+        Args:
+            enabled: 是否启用本地快速转换
+            max_workers: 进程池大小（默认为CPU核数，最多4个）
+            timeout: 单个文件本地转换的超时时间（秒），超时后交给Docling
+        """
+        self.enabled = enabled
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.converters: Dict[str, LocalConverter] = dict(DEFAULT_CONVERTERS)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+
+    def register(self, suffix: str, converter: LocalConverter):
+        """
+        注册本地转换器（需为模块级函数，以便在子进程中执行）
+
+        Args:
+            suffix: 文件扩展名，例如 '.csv'
+            converter: 转换函数，内容超出处理能力时抛出 LocalConversionUnsupported
+        """
+        self.converters[suffix.lower()] = converter
+
+    def handles(self, file_path: str) -> bool:
+        """
+        是否尝试本地转换
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            是否有对应的本地转换器
+        """
+        return self.enabled and Path(file_path).suffix.lower() in self.converters
+
+    def convert(self, file_path: str) -> str:
+        """
+        在进程池中本地转换文件（阻塞等待结果）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            Markdown内容
+
+        Raises:
+            LocalConversionUnsupported: 需要交给Docling处理
+        """
+        converter = self.converters[Path(file_path).suffix.lower()]
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            executor = self.executor
+        future = executor.submit(converter, str(file_path))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # 进程池无法单独中止一个任务：终止整个进程池，下次转换时重新创建
+            self._terminate(executor)
+            raise LocalConversionUnsupported(f"本地转换超时（{self.timeout:g}秒）")
+        except LocalConversionUnsupported:
+            raise
+        except Exception as e:
+            # 文件损坏等情况同样交给Docling，由服务端给出最终结果
+            raise LocalConversionUnsupported(f"本地转换出错: {e}")
+
+    def _terminate(self, executor: ProcessPoolExecutor):
+        """终止卡住的进程池（其中其他在途的本地转换会失败并交给Docling）"""
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """关闭进程池（下次转换时重新创建）"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -18,11 +18,71 @@ import base64
 import requests
 import os
 import json
+import tempfile
 from pathlib import Path
 import time
 
+from .table_processor import TableProcessor
+
+
+class Base64JsonBody:
+    """
+    流式的JSON请求体：分块读取文件并逐块Base64编码，JSON外层结构在编码内容前后输出，
+    内存中只保留一个数据块，而不是完整的Base64字符串和序列化后的JSON副本
+    """
+    
+    # 3的倍数，保证除最后一块外每块编码后都没有填充
+    BLOCK_SIZE = 3 * 64 * 1024
+    PLACEHOLDER = "@@BASE64_CONTENT@@"
+    
+    def __init__(self, file_path, payload, field_path):
+        """
+        初始化请求体
+        
+        Args:
+            file_path (Path): 要编码的文件路径
+            payload (dict): 请求数据，field_path 指向的字段会被替换为文件的Base64内容
+            field_path (tuple): Base64字段在payload中的路径，例如 ("sources", 0, "base64_string")
+        """
+        self.file_path = Path(file_path)
+        self.file_size = self.file_path.stat().st_size
+        
+        target = payload
+        for key in field_path[:-1]:
+            target = target[key]
+        target[field_path[-1]] = self.PLACEHOLDER
+        prefix, suffix = json.dumps(payload).split(f'"{self.PLACEHOLDER}"')
+        self.prefix = (prefix + '"').encode('utf-8')
+        self.suffix = ('"' + suffix).encode('utf-8')
+    
+    @property
+    def base64_length(self):
+        """Base64编码后的长度"""
+        return (self.file_size + 2) // 3 * 4
+    
+    def __len__(self):
+        # requests 据此设置 Content-Length，而不是使用分块传输
+        return len(self.prefix) + self.base64_length + len(self.suffix)
+    
+    def __iter__(self):
+        # 每次迭代都重新读取文件，请求重试时可以再次发送
+        yield self.prefix
+        remaining = self.file_size
+        with open(self.file_path, "rb") as file:
+            while remaining > 0:
+                block = file.read(min(self.BLOCK_SIZE, remaining))
+                if not block:
+                    raise Exception(f"文件 {self.file_path.name} 在读取过程中被截断")
+                remaining -= len(block)
+                yield base64.b64encode(block)
+        yield self.suffix
+
+
 class MarkdownProcessor:
-    def __init__(self, api_url, input_folder, output_folder):
+    CHUNK_MAX_TOKENS = 500  # 切片服务的单个切片token上限，表格行块需小于该值
+    
+    def __init__(self, api_url, input_folder, output_folder, deduplicator=None, sink=None, profiler=None,
+                 table_tokens=0):
         """
         初始化文档处理器
         
@@ -30,76 +90,115 @@ class MarkdownProcessor:
             api_url (str): 文档处理API的URL
             input_folder (str): 输入文件夹路径
             output_folder (str): 输出文件夹路径
+            deduplicator (ChunkDeduplicator): 切片去重器，跨所有文件识别近似重复切片，None表示不去重
+            sink (DifySink): 知识库推送，保存切片文件后同时推送到Dify知识库，None表示只保存文件
+            profiler (RunProfiler): 运行剖析器，按文件标记采样，None表示不剖析
+            table_tokens (int): 大表格拆分的行块token上限（每块重复表头），0表示不拆分
         """
         self.api_url = api_url
         self.input_folder = Path(input_folder)
         self.output_folder = Path(output_folder)
         self.output_folder.mkdir(parents=True, exist_ok=True)
+        self.deduplicator = deduplicator
+        self.sink = sink
+        self.profiler = profiler
+        self.table_processor = TableProcessor(table_tokens) if table_tokens > 0 else None
 
-    def file_to_base64(self, file_path):
+    def split_tables(self, file_path):
         """
-        将文件转换为Base64字符串
+        将超过token上限的表格按行拆分为多个带表头的小表格，写入临时文件
         
         Args:
             file_path (Path): 文件路径
             
         Returns:
-            str: Base64编码的字符串
+            Path: 要发送的文件路径，没有表格需要拆分时为原文件
         """
+        if self.table_processor is None:
+            return file_path
+        
+        fd, temp_path = tempfile.mkstemp(suffix='.md')
+        os.close(fd)
+        temp_path = Path(temp_path)
         try:
-            with open(file_path, "rb") as file:
-                file_content = file.read()
-                base64_string = base64.b64encode(file_content).decode('utf-8')
-                print(f"文件 {file_path.name} Base64 字符串长度: {len(base64_string)}")
-                return base64_string
-        except FileNotFoundError:
-            print(f"文件 {file_path} 不存在！")
-            raise
-        except Exception as e:
-            print(f"读取文件时发生错误: {e}")
+            blocks = self.table_processor.split_file(file_path, temp_path)
+        except Exception:
+            temp_path.unlink()
             raise
+        
+        if not blocks:
+            temp_path.unlink()
+            return file_path
+        print(f"文件 {file_path.name} 中的大表格已按行拆分，新增 {blocks} 个行块")
+        return temp_path
 
-    def send_chunk_request(self, file_path):
+    def build_request_body(self, file_path, source_path=None):
         """
-        发送文档切片请求
+        构建切片请求的流式请求体（文件内容在发送时才分块读取和编码）
         
         Args:
-            file_path (Path): 要处理的文件路径
+            file_path (Path): 文件路径
+            source_path (Path): 实际读取内容的文件（拆分表格后的临时文件），None表示读取file_path
             
         Returns:
-            dict or None: API响应结果，失败时返回None
+            Base64JsonBody: 可迭代的请求体，长度已预先计算
         """
         try:
-            # 获取文件的 Base64 编码
-            base64_string = self.file_to_base64(file_path)
-            
-            # 获取文件名
-            filename = file_path.name
-            
-            # 构建请求数据
             payload = {
                 "sources": [
                     {
                         "kind": "file",
-                        "base64_string": base64_string,
-                        "filename": filename
+                        "base64_string": "",
+                        "filename": file_path.name
                     }
                 ],
                 "chunking_options": {
                     "chunker": "hybrid",
                     "use_markdown_tables": False,
                     "include_raw_text": True,
-                    "max_tokens": 500,
+                    "max_tokens": self.CHUNK_MAX_TOKENS,
                     "tokenizer": "Qwen/Qwen3-Embedding-0.6B",
                     "merge_peers": False
                 }
             }
+            body = Base64JsonBody(source_path or file_path, payload, ("sources", 0, "base64_string"))
+            print(f"文件 {file_path.name} Base64 字符串长度: {body.base64_length}")
+            return body
+        except FileNotFoundError:
+            print(f"文件 {file_path} 不存在！")
+            raise
+        except Exception as e:
+            print(f"读取文件时发生错误: {e}")
+            raise
+
+    def send_chunk_request(self, file_path):
+        """
+        发送文档切片请求
+        
+        Args:
+            file_path (Path): 要处理的文件路径
+            
+        Returns:
+            dict or None: API响应结果，失败时返回None
+        """
+        source_path = file_path
+        try:
+            # 拆分大表格，再构建流式请求体（发送时才读取文件并编码）
+            source_path = self.split_tables(file_path)
+            body = self.build_request_body(file_path, source_path)
+            
+            # 获取文件名
+            filename = file_path.name
 
             # 发送请求
             headers = {
                 "Content-Type": "application/json"
             }
-            response = requests.post(self.api_url, json=payload, headers=headers)
+            try:
+                response = requests.post(self.api_url, data=body, headers=headers)
+            finally:
+                if source_path != file_path:
+                    source_path.unlink()
             
             if response.status_code == 200:
                 result = response.json()
@@ -156,18 +255,36 @@ class MarkdownProcessor:
         output_filename = f"{file_stem}_processed.txt"
         output_path = self.output_folder / output_filename
 
+        # 清理切片内容（只移除多余空白），只保留非空内容
+        cleaned_texts = [self.clean_chunk_text(chunk.get('text', '')) for chunk in chunks]
+        cleaned_texts = [text for text in cleaned_texts if text.strip()]
+        
+        # 近似重复切片：drop 模式下不写入，flag 模式下只记录在去重报告中
+        duplicates = [None] * len(cleaned_texts)
+        if self.deduplicator is not None:
+            duplicates = self.deduplicator.filter(cleaned_texts, original_filename)
+        drop = self.deduplicator is not None and self.deduplicator.mode == 'drop'
+        
+        written_texts = []
         with open(output_path, 'w', encoding='utf-8') as f:
-            for i, chunk in enumerate(chunks):
-                chunk_text = chunk.get('text', '')
-                
-                # 清理切片内容（只移除多余空白）
-                cleaned_text = self.clean_chunk_text(chunk_text)
-                
-                if cleaned_text.strip():  # 只写入非空内容
-                    f.write(cleaned_text)
-                    f.write("\n\n")  # 用两个换行符分隔不同切片
+            for cleaned_text, duplicate in zip(cleaned_texts, duplicates):
+                if duplicate is not None and drop:
+                    continue
+                f.write(cleaned_text)
+                f.write("\n\n")  # 用两个换行符分隔不同切片
+                written_texts.append(cleaned_text)
+        written = len(written_texts)
         
-        print(f"已保存 {len([c for c in chunks if self.clean_chunk_text(c.get('text', ''))])} 个有效切片到文件: {output_path}")
+        duplicate_count = sum(1 for d in duplicates if d is not None)
+        if duplicate_count:
+            action = "移除" if drop else "标记"
+            print(f"已保存 {written} 个有效切片到文件: {output_path}（{action} {duplicate_count} 个近似重复切片）")
+        else:
+            print(f"已保存 {written} 个有效切片到文件: {output_path}")
+        
+        # 后台推送到知识库，与下一个文件的切片请求并行
+        if self.sink is not None:
+            self.sink.submit(output_filename, written_texts)
 
     def process_all_markdown_files(self):
         """
@@ -183,6 +300,9 @@ class MarkdownProcessor:
         
         for i, md_file in enumerate(md_files):
             print(f"\n处理第 {i+1}/{len(md_files)} 个文件: {md_file.name}")
+            start_time = time.time()
+            if self.profiler is not None:
+                self.profiler.begin(str(md_file))
             
             # 发送切片请求
             result = self.send_chunk_request(md_file)
@@ -198,5 +318,43 @@ class MarkdownProcessor:
             else:
                 print(f"跳过文件 {md_file.name}，因为处理失败")
             
+            if self.profiler is not None:
+                self.profiler.end(str(md_file), time.time() - start_time)
+            
             # 添加短暂延迟，避免请求过于频繁
-            time.sleep(1)
\ No newline at end of file
+            time.sleep(1)
+        
+        if self.deduplicator is not None:
+            dedup = self.deduplicator
+            action = "移除" if dedup.mode == 'drop' else "标记"
+            print(f"\n近似重复切片: 共 {dedup.total_count} 个切片，{action} {dedup.duplicate_count} 个"
+                  f"（相似度阈值 {dedup.threshold}）")
+        
+        if self.sink is not None:
+            self.finish_push()
+
+    def push_existing_files(self):
+        """
+        将输出文件夹中已有的切片文件推送到知识库（不重新切片）
+        """
+        processed_files = sorted(self.output_folder.glob("*_processed.txt"))
+        
+        if not processed_files:
+            print(f"在 {self.output_folder} 中没有找到任何切片文件")
+            return
+        
+        print(f"找到 {len(processed_files)} 个切片文件待推送")
+        for processed_file in processed_files:
+            self.sink.push_file(processed_file)
+        self.finish_push()
+
+    def finish_push(self):
+        """
+        等待知识库推送完成并打印统计
+        """
+        stats, failed = self.sink.close()
+        print(f"\nDify推送: 新建 {stats['created']} 个文档，更新 {stats['updated']} 个，"
+              f"未变化 {stats['unchanged']} 个，失败 {stats['failed']} 个"
+              f"（新增 {stats['segments_added']} 个分段，删除 {stats['segments_deleted']} 个）")
+        for result in failed:
+            print(f"  推送失败 {result['name']}: {result['error']}")
\ No newline at end of file
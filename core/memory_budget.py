@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   memory_budget.py
+@Time    :   2026/02/10 15:36:02
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+内存预算模块
+按在途字节数控制并发：小文件可以大量并发，超大文件串行处理
+"""
+
+import threading
+from pathlib import Path
+
+
+class MemoryBudget:
+    """内存预算 - 根据输入大小和扩展名估算内存占用，并用实际响应大小修正"""
+
+    # 响应大小 / 输入大小的初始估计（base64图片较多的格式更大）
+    DEFAULT_RATIOS = {
+        '.pdf': 10.0,
+        '.docx': 15.0,
+        '.doc': 10.0,
+        '.pptx': 15.0,
+        '.xlsx': 3.0,
+        '.xls': 3.0,
+        '.html': 2.0,
+        '.xml': 2.0,
+        '.txt': 2.0,
+    }
+
+    def __init__(self, budget_bytes: int = 0, overhead: float = 3.0, min_cost: int = 1024 * 1024):
+        """
+        初始化内存预算
+
+        Args:
+            budget_bytes: 允许同时在途的估算内存总量（字节），0表示不限制
+            overhead: 响应大小到峰值内存的放大系数（响应文本、解析后的JSON、解码后的图片等副本）
+            min_cost: 单个文件的最小估算内存（字节）
+        """
+        self.budget_bytes = budget_bytes
+        self.overhead = overhead
+        self.min_cost = min_cost
+        self.ratios = dict(self.DEFAULT_RATIOS)
+        self.in_flight_bytes = 0
+        self.in_flight_count = 0
+        self.peak_bytes = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """清空在途统计和峰值（每次运行开始时调用），已修正的估计比例保留"""
+        with self.lock:
+            self.in_flight_bytes = 0
+            self.in_flight_count = 0
+            self.peak_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用内存预算"""
+        return self.budget_bytes > 0
+
+    def estimate(self, file_path: str, file_size: int) -> int:
+        """
+        估算处理单个文件的峰值内存
+
+        Args:
+            file_path: 文件路径
+            file_size: 文件字节数
+
+        Returns:
+            估算的内存字节数
+        """
+        suffix = Path(file_path).suffix.lower()
+        with self.lock:
+            ratio = self.ratios.get(suffix, 10.0)
+        return max(self.min_cost, int(file_size * ratio * self.overhead))
+
+    def try_acquire(self, cost: int) -> bool:
+        """
+        尝试为一个文件占用预算
+
+        超过整个预算的文件只在没有其他在途文件时放行，从而串行处理。
+
+        Args:
+            cost: 估算的内存字节数
+
+        Returns:
+            是否占用成功
+        """
+        with self.lock:
+            if self.enabled and self.in_flight_count > 0 and self.in_flight_bytes + cost > self.budget_bytes:
+                return False
+
+            self.in_flight_bytes += cost
+            self.in_flight_count += 1
+            self.peak_bytes = max(self.peak_bytes, self.in_flight_bytes)
+            return True
+
+    def release(self, cost: int):
+        """释放一个文件占用的预算"""
+        with self.lock:
+            self.in_flight_bytes -= cost
+            self.in_flight_count -= 1
+
+    def observe(self, file_path: str, file_size: int, response_size: int, alpha: float = 0.2):
+        """
+        用实际响应大小修正该扩展名的估计比例
+
+        Args:
+            file_path: 文件路径
+            file_size: 输入文件字节数
+            response_size: 响应字节数
+            alpha: 指数加权系数
+        """
+        if file_size <= 0 or response_size <= 0:
+            return
+
+        suffix = Path(file_path).suffix.lower()
+        observed = response_size / file_size
+        with self.lock:
+            current = self.ratios.get(suffix, observed)
+            # 向上修正的权重更大，偏向保守
+            weight = min(1.0, alpha * 2.5) if observed > current else alpha
+            self.ratios[suffix] = (1 - weight) * current + weight * observed
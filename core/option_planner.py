@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   option_planner.py
+@Time    :   2026/02/16 09:52:44
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+转换选项规划器模块
+上传前低成本探测文档（PDF文字层覆盖率、数学内容特征），只开启必要的OCR和公式增强
+"""
+
+import re
+import zlib
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .pdf_splitter import PdfSplitter
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pypdf 为可选依赖，缺失时直接扫描PDF内容流
+    PdfReader = None
+
+
+# 默认转换选项（与未启用规划时的请求参数一致）
+DEFAULT_OPTIONS = {
+    'do_ocr': 'true',
+    'do_formula_enrichment': 'true',
+}
+
+# 数学字体（TeX的CMMI/CMSY/CMEX、AMS符号字体、OpenType数学字体等）
+MATH_FONT_PATTERN = re.compile(
+    rb'/BaseFont\s*/(?:[A-Z]{6}\+)?(?:CMMI|CMSY|CMEX|MSAM|MSBM|LMMath|LatinModernMath|STIXMath|STIXTwoMath'
+    rb'|XITSMath|CambriaMath|Cambria-Math|Cambria#20Math|MathJax|Asana|TeXGyre\w*Math)'
+)
+# 文本中的数学特征：LaTeX命令、MathML、以及数学运算符
+LATEX_PATTERN = re.compile(r'\\(?:frac|sum|int|sqrt|prod|lim|begin\{(?:equation|align)|alpha|beta|partial|infty)\b|\$\$')
+MATHML_PATTERN = re.compile(r'<(?:\w+:)?math\b')
+MATH_SYMBOLS = frozenset('∑∫∬∮√∂∇∞≈≠≤≥±∓×÷∏∈∉⊂⊆∪∩∀∃→⇒⇔∝∠⊥')
+# 希腊字母只有紧邻运算符时才算数学特征（普通希腊文不算）
+GREEK_MATH_PATTERN = re.compile(
+    r'[αβγδεθλμσφψω]\s*[=+−/^_∑∫√∂∇∞≈≠≤≥±∓×÷∏∈∉⊂⊆∪∩→⇒⇔∝]'
+    r'|[=+−/^_∑∫√∂∇∞≈≠≤≥±∓×÷∏∈∉⊂⊆∪∩∀∃→⇒⇔∝]\s*[αβγδεθλμσφψω]'
+)
+# Office文档中的公式：OMML公式或公式编辑器/MathType对象
+OFFICE_MATH_PATTERN = re.compile(rb'<m:oMath\b|Equation\.(?:3|DSMT\d*)')
+# 内容流中的文字绘制操作符
+TEXT_OPERATOR_PATTERN = re.compile(rb'BT\b[\s\S]*?(?:Tj|TJ)\b')
+STREAM_PATTERN = re.compile(rb'stream\r?\n')
+
+
+class ConversionPlanner:
+    """转换选项规划器 - 为每个文档选择最小的转换选项集合"""
+
+    # 跳过各选项时每页的预计节省时间（秒），用于报告中的估算
+    OCR_SECONDS_PER_PAGE = 1.0
+    FORMULA_SECONDS_PER_PAGE = 0.5
+
+    # 只有PDF会经过OCR和公式增强的页面流水线
+    PAGE_PIPELINE_EXTENSIONS = {'.pdf'}
+    TEXT_EXTENSIONS = {'.txt', '.html', '.xml'}
+    SPREADSHEET_EXTENSIONS = {'.xlsx', '.xls'}
+
+    def __init__(self, enabled: bool = False, overrides: Dict[str, Dict[str, str]] = None,
+                 text_coverage: float = 0.9, min_page_chars: int = 32, math_threshold: int = 3,
+                 sample_pages: int = 8, probe_bytes: int = 16 * 1024 * 1024):
+        """
+        初始化转换选项规划器
+
+        Args:
+            enabled: 是否根据探测结果关闭不需要的选项
+            overrides: 按扩展名强制指定的选项，例如 {'.pdf': {'do_ocr': 'true'}}，优先于探测结果
+            text_coverage: 有文字层的页面比例达到该值时关闭OCR
+            min_page_chars: 页面至少包含多少个字符才算有文字层
+            math_threshold: 文本中数学特征出现多少次才开启公式增强
+            sample_pages: PDF最多抽样检查的页数
+            probe_bytes: 探测时最多读取的字节数
+        """
+        self.enabled = enabled
+        self.overrides = {ext.lower(): options for ext, options in (overrides or {}).items()}
+        self.text_coverage = text_coverage
+        self.min_page_chars = min_page_chars
+        self.math_threshold = math_threshold
+        self.sample_pages = sample_pages
+        self.probe_bytes = probe_bytes
+        self.pdf_splitter = PdfSplitter()
+
+    @staticmethod
+    def parse_override(spec: str) -> Tuple[str, Dict[str, str]]:
+        """
+        解析命令行中的选项覆盖，格式: .pdf:do_ocr=true,do_formula_enrichment=false
+
+        Args:
+            spec: 覆盖规则字符串
+
+        Returns:
+            (扩展名, 选项字典)
+        """
+        ext, sep, assignments = spec.partition(':')
+        if not sep or not ext or not assignments:
+            raise ValueError(f"无效的选项覆盖: {spec}（格式: .pdf:do_ocr=true）")
+
+        options = {}
+        for assignment in assignments.split(','):
+            key, sep, value = assignment.partition('=')
+            if not sep or not key.strip():
+                raise ValueError(f"无效的选项覆盖: {spec}（格式: .pdf:do_ocr=true）")
+            options[key.strip()] = value.strip().lower()
+
+        ext = ext.strip().lower()
+        return (ext if ext.startswith('.') else f".{ext}"), options
+
+    def plan(self, file_path: str) -> Optional[Dict]:
+        """
+        为单个文件规划转换选项
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            规划结果 {'options': 请求参数, 'summary': 说明, 'saved_seconds': 预计节省时间}，
+            未启用规划且该扩展名没有覆盖规则时返回None（使用默认选项）
+        """
+        suffix = Path(file_path).suffix.lower()
+        override = self.overrides.get(suffix)
+        if not self.enabled and not override:
+            return None
+
+        options = dict(DEFAULT_OPTIONS)
+        notes = []
+        pages = 1
+
+        if self.enabled:
+            try:
+                if suffix == '.pdf':
+                    pages, needs_ocr, has_math, notes = self._probe_pdf(Path(file_path))
+                else:
+                    needs_ocr, has_math = False, self._probe_other(Path(file_path), suffix)
+            except Exception as e:
+                # 探测失败时保守地使用默认选项
+                needs_ocr, has_math = True, True
+                notes = [f"探测失败: {e}"]
+
+            options['do_ocr'] = 'true' if needs_ocr else 'false'
+            options['do_formula_enrichment'] = 'true' if has_math else 'false'
+
+        if override:
+            options.update(override)
+            notes.append('扩展名覆盖')
+
+        saved_seconds = 0.0
+        if suffix in self.PAGE_PIPELINE_EXTENSIONS:
+            if options.get('do_ocr') == 'false':
+                saved_seconds += pages * self.OCR_SECONDS_PER_PAGE
+            if options.get('do_formula_enrichment') == 'false':
+                saved_seconds += pages * self.FORMULA_SECONDS_PER_PAGE
+
+        summary = (f"ocr={'on' if options.get('do_ocr') == 'true' else 'off'} "
+                   f"formula={'on' if options.get('do_formula_enrichment') == 'true' else 'off'}")
+        if notes:
+            summary += f" ({', '.join(notes)})"
+
+        return {'options': options, 'summary': summary, 'saved_seconds': saved_seconds}
+
+    def _probe_pdf(self, file_path: Path) -> Tuple[int, bool, bool, List[str]]:
+        """
+        探测PDF：文字层覆盖率和数学内容
+
+        Returns:
+            (页数, 是否需要OCR, 是否包含数学内容, 说明列表)
+        """
+        with open(file_path, 'rb') as f:
+            raw = f.read(self.probe_bytes)
+        contents = self._decompress_streams(raw)
+        has_math_font = bool(MATH_FONT_PATTERN.search(raw)) or any(MATH_FONT_PATTERN.search(c) for c in contents)
+
+        pages, coverage, text = None, None, ''
+        if PdfReader is not None:
+            pages, coverage, text = self._sample_text_layer(file_path)
+        if coverage is None:
+            # 没有pypdf时按内容流估算：绘制文字的内容流占比
+            text_streams = sum(1 for c in contents if TEXT_OPERATOR_PATTERN.search(c))
+            image_streams = sum(1 for c in contents if b' Do' in c and not TEXT_OPERATOR_PATTERN.search(c))
+            if text_streams + image_streams:
+                coverage = text_streams / (text_streams + image_streams)
+        pages = pages or self.pdf_splitter.count_pages(file_path) or 1
+
+        math_score = self._math_score(text)
+        needs_ocr = coverage is None or coverage < self.text_coverage
+        has_math = has_math_font or math_score >= self.math_threshold
+        notes = [
+            f"文字层 {coverage:.0%}" if coverage is not None else "文字层未知",
+            "数学字体" if has_math_font else f"数学特征 {math_score}",
+        ]
+        return pages, needs_ocr, has_math, notes
+
+    def _sample_text_layer(self, file_path: Path) -> Tuple[Optional[int], Optional[float], str]:
+        """
+        用pypdf抽样提取页面文字
+
+        Returns:
+            (页数, 有文字层的页面比例, 抽样文本)
+        """
+        try:
+            reader = PdfReader(str(file_path))
+            page_count = len(reader.pages)
+        except Exception:
+            return None, None, ''
+        if page_count == 0:
+            return 0, None, ''
+
+        # 在全文范围内均匀抽样，兼顾扫描件夹在正文中间的情况
+        sample_count = min(page_count, self.sample_pages)
+        indexes = sorted({i * page_count // sample_count for i in range(sample_count)})
+
+        covered = 0
+        texts = []
+        for index in indexes:
+            try:
+                page_text = reader.pages[index].extract_text() or ''
+            except Exception:
+                page_text = ''
+            if len(page_text.strip()) >= self.min_page_chars:
+                covered += 1
+            texts.append(page_text)
+
+        return page_count, covered / len(indexes), '\n'.join(texts)
+
+    def _decompress_streams(self, raw: bytes, max_streams: int = 512) -> List[bytes]:
+        """解压PDF中的Flate流（跳过图片流），用于查找文字操作符和字体名"""
+        contents = []
+        for match in STREAM_PATTERN.finditer(raw):
+            header = raw[max(0, match.start() - 512):match.start()]
+            header = header[header.rfind(b'obj') + 3:] if b'obj' in header else header
+            if b'/Image' in header:
+                continue
+
+            body = raw[match.end():match.end() + 4 * 1024 * 1024]
+            if b'/FlateDecode' in header:
+                try:
+                    body = zlib.decompressobj().decompress(body, 4 * 1024 * 1024)
+                except zlib.error:
+                    continue
+            else:
+                end = body.find(b'endstream')
+                body = body[:end] if end >= 0 else body[:4096]
+
+            contents.append(body)
+            if len(contents) >= max_streams:
+                break
+
+        return contents
+
+    def _probe_other(self, file_path: Path, suffix: str) -> bool:
+        """
+        探测非PDF文档是否包含数学内容
+
+        Returns:
+            是否包含数学内容（未知格式保守地返回True）
+        """
+        if suffix in self.SPREADSHEET_EXTENSIONS:
+            return False
+
+        if suffix in ('.docx', '.pptx'):
+            with zipfile.ZipFile(file_path) as archive:
+                prefix = 'word/' if suffix == '.docx' else 'ppt/slides/'
+                for name in archive.namelist():
+                    if name.startswith(prefix) and name.endswith('.xml'):
+                        with archive.open(name) as part:
+                            if OFFICE_MATH_PATTERN.search(part.read(self.probe_bytes)):
+                                return True
+            return False
+
+        with open(file_path, 'rb') as f:
+            raw = f.read(self.probe_bytes)
+
+        if suffix == '.doc':
+            return bool(OFFICE_MATH_PATTERN.search(raw))
+        if suffix in self.TEXT_EXTENSIONS:
+            text = raw.decode('utf-8', errors='ignore')
+            return bool(MATHML_PATTERN.search(text)) or self._math_score(text) >= self.math_threshold
+        return True
+
+    @staticmethod
+    def _math_score(text: str) -> int:
+        """文本中的数学特征数量（LaTeX命令、数学运算符和紧邻运算符的希腊字母）"""
+        if not text:
+            return 0
+        return (len(LATEX_PATTERN.findall(text)) + sum(1 for ch in text if ch in MATH_SYMBOLS)
+                + len(GREEK_MATH_PATTERN.findall(text)))
@@ -18,17 +18,85 @@
 负责文件保存和报告生成
 """
 
+import gzip
 import json
+import shutil
+import hashlib
+import threading
+import tempfile
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterable, List
+from .conversion_result import ConversionResult
+
+# 压缩保存的Docling结构化文档的文件名后缀
+DOCUMENT_SUFFIX = '.docling.json.gz'
 
 
 class OutputManager:
     """输出管理器 - 负责文件保存和报告生成"""
     
-    def __init__(self):
-        pass
+    def __init__(self, shard_depth: int = 0, dir_cache_size: int = 4096):
+        """
+        初始化输出管理器
+        
+        Args:
+            shard_depth: 按文件名哈希前缀分层存放输出的层数（每层256个子目录），0表示不分层
+            dir_cache_size: 记住已创建目录的最大条目数
+        """
+        self.shard_depth = shard_depth
+        self.dir_cache_size = dir_cache_size
+        self.created_dirs = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def document_dir(self, output_dir: Path, base_name: str) -> Path:
+        """
+        文档（Markdown和图片目录）所在的目录
+        
+        分层时按文件名的哈希前缀放入子目录，例如 output/3f/a2/report.md，
+        单个目录中的条目数保持在较小范围内。
+        
+        Args:
+            output_dir: 输出目录
+            base_name: 基础文件名
+            
+        Returns:
+            文档目录
+        """
+        if not self.shard_depth:
+            return output_dir
+        digest = hashlib.sha1(base_name.encode('utf-8')).hexdigest()
+        return output_dir.joinpath(*(digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)))
+    
+    def ensure_dir(self, directory: Path):
+        """创建目录（记住最近创建过的目录，避免重复mkdir）"""
+        key = str(directory)
+        with self.lock:
+            if key in self.created_dirs:
+                self.created_dirs.move_to_end(key)
+                return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            self.created_dirs[key] = True
+            if len(self.created_dirs) > self.dir_cache_size:
+                self.created_dirs.popitem(last=False)
+    
+    def reset(self):
+        """清空已创建目录的记录（每次运行开始时调用，输出目录可能已被删除或轮转）"""
+        with self.lock:
+            self.created_dirs.clear()
+    
+    def _open_output(self, output_path: Path, mode: str, **kwargs):
+        """打开输出文件写入；记录过的目录已被删除时重新创建"""
+        self.ensure_dir(output_path.parent)
+        try:
+            return open(output_path, mode, **kwargs)
+        except FileNotFoundError:
+            with self.lock:
+                self.created_dirs.pop(str(output_path.parent), None)
+            self.ensure_dir(output_path.parent)
+            return open(output_path, mode, **kwargs)
     
     def save_markdown(self, content: str, output_path: Path):
         """
@@ -39,46 +107,208 @@ class OutputManager:
             output_path: 输出文件路径
         """
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
+            with self._open_output(output_path, 'w', encoding='utf-8') as f:
                 f.write(content)
         except Exception as e:
             raise Exception(f"保存Markdown文件失败: {str(e)}")
     
-    def generate_report(self, results: List[Dict], output_dir: Path):
+    @staticmethod
+    def compress_document(parts: List[bytes]) -> bytes:
+        """
+        压缩Docling结构化文档
+        
+        单个请求的结果保存为文档JSON本身；按页码区间拆分转换的文档保存为各区间文档组成的JSON数组。
+        
+        Args:
+            parts: 各请求结果的文档JSON（按页码顺序）
+            
+        Returns:
+            gzip压缩后的数据
+        """
+        data = parts[0] if len(parts) == 1 else b'[' + b','.join(parts) + b']'
+        return gzip.compress(data, compresslevel=6)
+    
+    def save_bytes(self, data: bytes, output_path: Path):
+        """
+        保存二进制文件（如压缩的结构化文档）
+        
+        Args:
+            data: 文件内容
+            output_path: 输出路径
+        """
+        try:
+            with self._open_output(output_path, 'wb') as f:
+                f.write(data)
+        except Exception as e:
+            raise Exception(f"保存文件失败: {str(e)}")
+    
+    def open_report(self, output_dir: Path, report_name: str = "conversion_report.txt") -> 'ConversionReport':
+        """
+        创建流式转换报告：结果逐个写入，不在内存中保留结果列表
+        
+        Args:
+            output_dir: 输出目录
+            report_name: 报告文件名
+            
+        Returns:
+            转换报告
+        """
+        return ConversionReport(Path(output_dir) / report_name)
+    
+    def generate_report(self, results: Iterable[ConversionResult], output_dir: Path,
+                        rejections: Dict[str, int] = None, report_name: str = "conversion_report.txt") -> Path:
         """
         生成转换报告
         
         Args:
-            results: 转换结果列表
+            results: 转换结果
             output_dir: 输出目录
+            rejections: 验证阶段按原因统计的拒绝数量
+            report_name: 报告文件名
+            
+        Returns:
+            报告文件路径
         """
-        report_path = output_dir / "conversion_report.txt"
+        report = self.open_report(output_dir, report_name)
+        for result in results:
+            report.add(result)
+        return report.close(rejections)
+
+
+class ConversionReport:
+    """流式转换报告 - 汇总统计在内存中累加，逐文件明细先写入临时文件"""
+    
+    def __init__(self, report_path: Path):
+        """
+        初始化转换报告
         
-        successful = [r for r in results if r['status'] == 'success']
-        failed = [r for r in results if r['status'] == 'failed']
+        Args:
+            report_path: 报告文件路径
+        """
+        self.report_path = report_path
+        self.total = 0
+        self.success_count = 0
+        self.failed_count = 0
+        self.transfer_bytes = 0
+        self.cpu_time = 0.0
+        self.planned_count = 0
+        self.plan_saved_seconds = 0.0
+        self.local_count = 0
+        self.hedged_count = 0
+        self.hedge_wins = 0
+        # 运行级信息（并发、时长、内存峰值）和容量预测对比，由调用方在关闭前填写
+        self.run_lines: List[str] = []
+        self.plan_lines: List[str] = []
+        self.successful = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.failed = tempfile.TemporaryFile('w+', encoding='utf-8')
+    
+    def add(self, result: ConversionResult):
+        """
+        记录单个文件的结果
         
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("批量文档转换报告\n")
-            f.write("=" * 50 + "\n")
-            f.write(f"总文件数: {len(results)}\n")
-            f.write(f"成功转换: {len(successful)}\n")
-            f.write(f"转换失败: {len(failed)}\n")
-            f.write(f"转换时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            if successful:
-                f.write("成功转换的文件:\n")
-                f.write("-" * 30 + "\n")
-                for result in successful:
-                    f.write(f"✓ {result['input_file']} -> {result['output_file']}\n")
-                    f.write(f"  处理时间: {result.get('duration', 0):.2f}秒\n")
-                    f.write(f"  图片数量: {result.get('image_count', 0)}\n\n")
-                    f.write(f"  公式数量: {result.get('formula_count', 0)}\n\n")
+        Args:
+            result: 转换结果
+        """
+        self.total += 1
+        self.transfer_bytes += result.transfer_bytes
+        self.cpu_time += result.cpu_time
+        if result.conversion_plan:
+            self.planned_count += 1
+            self.plan_saved_seconds += result.plan_saved_seconds
+        
+        if result.converter == 'local':
+            self.local_count += 1
+        self.hedged_count += result.hedged_requests
+        self.hedge_wins += result.hedge_wins
+        
+        if result.status == 'success':
+            self.success_count += 1
+            f = self.successful
+            f.write(f"✓ {result.input_file} -> {result.output_file}\n")
+            f.write(f"  处理时间: {result.duration:.2f}秒\n")
+            f.write(f"  图片数量: {result.image_count}\n\n")
+            f.write(f"  公式数量: {result.formula_count}\n\n")
+            f.write(f"  传输字节: {result.transfer_bytes}\n")
+            f.write(f"  文件大小: {result.input_size}\n")
+            f.write(f"  输出大小: {result.output_size}\n")
+            f.write(f"  响应大小: {result.response_size}\n")
+            f.write(f"  CPU时间: {result.cpu_time:.3f}秒\n\n")
+            f.write(f"  转换路径: {result.converter}\n\n")
+            if result.hedged_requests:
+                f.write(f"  对冲请求: {result.hedged_requests}（先完成 {result.hedge_wins}）\n\n")
+            if result.page_ranges:
+                f.write(f"  拆分区间: {result.page_ranges}\n\n")
+            if result.conversion_plan:
+                f.write(f"  转换选项: {result.conversion_plan}\n")
+                f.write(f"  预计节省: {result.plan_saved_seconds:.1f}秒\n\n")
+        elif result.status == 'failed':
+            self.failed_count += 1
+            self.failed.write(f"✗ {result.input_file}\n")
+            self.failed.write(f"  转换路径: {result.converter}\n")
+            self.failed.write(f"  错误: {result.error}\n\n")
+    
+    def close(self, rejections: Dict[str, int] = None) -> Path:
+        """
+        写出报告文件
+        
+        Args:
+            rejections: 验证阶段按原因统计的拒绝数量
             
-            if failed:
-                f.write("转换失败的文件:\n")
-                f.write("-" * 30 + "\n")
-                for result in failed:
-                    f.write(f"✗ {result['input_file']}\n")
-                    f.write(f"  错误: {result['error']}\n\n")
+        Returns:
+            报告文件路径
+        """
+        try:
+            with open(self.report_path, 'w', encoding='utf-8') as f:
+                f.write("批量文档转换报告\n")
+                f.write("=" * 50 + "\n")
+                f.write(f"总文件数: {self.total}\n")
+                f.write(f"成功转换: {self.success_count}\n")
+                f.write(f"转换失败: {self.failed_count}\n")
+                f.write(f"转换时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"传输总量: {self.transfer_bytes / 1024 / 1024:.2f} MB\n")
+                f.write(f"客户端CPU时间: {self.cpu_time:.2f}秒\n")
+                for line in self.run_lines:
+                    f.write(f"{line}\n")
+                if self.hedged_count:
+                    f.write(f"请求对冲: 触发 {self.hedged_count} 次，对冲请求先完成 {self.hedge_wins} 次\n")
+                if self.local_count:
+                    f.write(f"本地快速转换: {self.local_count} 个文件（未经过Docling服务）\n")
+                if self.planned_count:
+                    f.write(f"选项规划: {self.planned_count} 个文件，"
+                            f"预计节省服务端时间 {self.plan_saved_seconds:.1f}秒\n")
+                f.write("\n")
+                
+                if rejections:
+                    f.write("验证拒绝统计:\n")
+                    f.write("-" * 30 + "\n")
+                    for reason, count in rejections.items():
+                        f.write(f"  {reason}: {count}\n")
+                    f.write("\n")
+                
+                if self.plan_lines:
+                    f.write("容量预测对比:\n")
+                    f.write("-" * 30 + "\n")
+                    for line in self.plan_lines:
+                        f.write(f"  {line}\n")
+                    f.write("\n")
+                
+                if self.success_count:
+                    f.write("成功转换的文件:\n")
+                    f.write("-" * 30 + "\n")
+                    self.successful.seek(0)
+                    shutil.copyfileobj(self.successful, f)
+                
+                if self.failed_count:
+                    f.write("转换失败的文件:\n")
+                    f.write("-" * 30 + "\n")
+                    self.failed.seek(0)
+                    shutil.copyfileobj(self.failed, f)
+        finally:
+            self.discard()
         
-        print(f"\n转换报告已保存: {report_path}")
\ No newline at end of file
+        return self.report_path
+    
+    def discard(self):
+        """丢弃尚未写出的明细"""
+        self.successful.close()
+        self.failed.close()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   pdf_splitter.py
+@Time    :   2026/02/04 14:12:37
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+PDF拆分器模块
+负责统计PDF页数并将大文件拆分为页码区间，以便并行转换
+"""
+
+import re
+import mmap
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pypdf 为可选依赖，缺失时使用正则统计页数
+    PdfReader = None
+
+
+class PdfSplitter:
+    """PDF拆分器 - 按页码区间拆分大PDF"""
+
+    # 匹配页面树节点中的页数
+    COUNT_PATTERN = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b', re.DOTALL)
+    # 压缩对象流（PDF 1.5+ 常把页面树节点放在其中）
+    OBJSTM_PATTERN = re.compile(rb'/Type\s*/ObjStm\b')
+    READ_BLOCK = 1024 * 1024
+    # 单个对象流最多读取/解压的字节数
+    MAX_STREAM_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, pages_per_range: int = 0):
+        """
+        初始化PDF拆分器
+
+        Args:
+            pages_per_range: 每个区间的页数，页数超过该值的PDF会被拆分，0表示不拆分
+        """
+        self.pages_per_range = pages_per_range
+
+    def count_pages(self, file_path: Path) -> Optional[int]:
+        """
+        统计PDF页数
+
+        优先使用 pypdf；未安装时扫描未压缩的页面树 /Count 字段，找不到时再解压对象流查找。
+
+        Args:
+            file_path: PDF文件路径
+
+        Returns:
+            页数，无法确定时返回None
+        """
+        if PdfReader is not None:
+            try:
+                return len(PdfReader(str(file_path)).pages)
+            except Exception:
+                return None
+
+        max_count = 0
+        tail = b''
+        with open(file_path, 'rb') as f:
+            while True:
+                block = f.read(self.READ_BLOCK)
+                if not block:
+                    break
+                data = tail + block
+                for match in self.COUNT_PATTERN.finditer(data):
+                    max_count = max(max_count, int(match.group(1) or match.group(2)))
+                # 保留块尾部，避免字段被块边界截断
+                tail = data[-256:]
+
+        return max_count or self._count_in_object_streams(file_path)
+
+    def _count_in_object_streams(self, file_path: Path) -> Optional[int]:
+        """解压对象流（FlateDecode）查找页面树 /Count 字段"""
+        max_count = 0
+        try:
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for match in self.OBJSTM_PATTERN.finditer(data):
+                    start = data.find(b'stream', match.end())
+                    if start < 0:
+                        break
+                    start += len(b'stream')
+                    # stream 关键字后是 CRLF 或 LF
+                    if data[start:start + 2] == b'\r\n':
+                        start += 2
+                    elif data[start:start + 1] in (b'\n', b'\r'):
+                        start += 1
+                    try:
+                        content = zlib.decompressobj().decompress(data[start:start + self.MAX_STREAM_BYTES],
+                                                                  self.MAX_STREAM_BYTES)
+                    except zlib.error:
+                        continue
+                    for count in self.COUNT_PATTERN.finditer(content):
+                        max_count = max(max_count, int(count.group(1) or count.group(2)))
+        except (OSError, ValueError):
+            return None
+
+        return max_count or None
+
+    def plan_ranges(self, file_path: Path) -> List[Tuple[int, int]]:
+        """
+        计算需要拆分的页码区间（从1开始，闭区间）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            页码区间列表，不需要拆分时返回空列表
+        """
+        if self.pages_per_range <= 0 or Path(file_path).suffix.lower() != '.pdf':
+            return []
+
+        page_count = self.count_pages(file_path)
+        if not page_count or page_count <= self.pages_per_range:
+            return []
+
+        return [
+            (start, min(start + self.pages_per_range - 1, page_count))
+            for start in range(1, page_count + 1, self.pages_per_range)
+        ]
+
+    def stitch(self, parts: List[str]) -> str:
+        """
+        按顺序拼接各区间的Markdown内容
+
+        图片在拼接后统一提取，因此编号在整个文档内保持连续。
+
+        Args:
+            parts: 按页码顺序排列的Markdown内容列表
+
+        Returns:
+            拼接后的Markdown内容
+        """
+        return '\n\n'.join(part.strip('\n') for part in parts if part)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   progress_monitor.py
+@Time    :   2026/02/27 11:05:38
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+运行进度监控模块
+统计吞吐（文件/秒、MB/秒）、在途和排队数量、预计剩余时间；按文件大小分类记录耗时，
+发现耗时远超同类文件p95的请求；定期回调状态并原子地写入状态文件
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from .conversion_result import ConversionResult
+
+
+# 状态回调 (事件名, 文件路径, 附加信息)：progress（定期状态）、stalled（请求耗时异常）
+StatusListener = Callable[[str, str, Dict], None]
+
+
+class ProgressMonitor:
+    """进度监控器 - 每个文件只做O(1)的计数，统计和卡住检测在定时线程中进行"""
+
+    # 大小分类按4倍划分
+    SIZE_CLASS_BASE = 4
+
+    def __init__(self, stall_factor: float = 3.0, stall_min_seconds: float = 30.0,
+                 min_samples: int = 20, window: float = 60.0):
+        """
+        初始化进度监控器
+
+        Args:
+            stall_factor: 在途时间超过同大小分类耗时p95的多少倍时视为卡住，0表示不检测
+            stall_min_seconds: 在途时间至少达到该秒数才可能被视为卡住
+            min_samples: 大小分类的耗时样本达到该数量后才使用该分类的p95（否则使用全部文件的p95）
+            window: 计算吞吐的滑动窗口（秒）
+        """
+        self.stall_factor = stall_factor
+        self.stall_min_seconds = stall_min_seconds
+        self.min_samples = min_samples
+        self.window = window
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.listener = None
+        self.status_path = None
+        self.reset()
+
+    def reset(self, total: Optional[int] = None):
+        """
+        开始新的一次运行
+
+        Args:
+            total: 输入文件总数，未知时为None
+        """
+        self.total = total
+        self.started_at = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.completed_bytes = 0
+        # 文件路径 -> [文件大小, 开始处理时间或None（排队中）]
+        self.active: Dict[str, List] = {}
+        # 最近完成的 (时间, 字节数)
+        self.recent = deque()
+        # 大小分类 -> 最近的耗时；None 为全部文件
+        self.durations = defaultdict(lambda: deque(maxlen=256))
+        self.stalled = set()
+
+    @classmethod
+    def _size_class(cls, file_size: int) -> int:
+        """大小分类"""
+        return int(math.log(max(file_size, 1), cls.SIZE_CLASS_BASE))
+
+    def queue(self, file_path: str, file_size: int):
+        """文件已提交，等待处理"""
+        with self.lock:
+            self.active[file_path] = [file_size, None]
+
+    def start(self, file_path: str):
+        """
+        文件开始处理（已经开始的文件不重新计时）
+
+        只记录经 queue 提交、之后会由 finish 移除的文件；直接调用单文件处理的文件
+        （例如监听守护进程）不在此登记，否则在途表只增不减。
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.active.get(file_path)
+            if entry is not None and entry[1] is None:
+                entry[1] = now
+
+    def reject(self):
+        """文件未通过验证"""
+        with self.lock:
+            self.rejected += 1
+
+    def finish(self, result: ConversionResult):
+        """
+        文件处理完成
+
+        Args:
+            result: 转换结果
+        """
+        now = time.time()
+        with self.lock:
+            file_size, _ = self.active.pop(result.input_file, (result.input_size, None))
+            self.stalled.discard(result.input_file)
+            self.completed += 1
+            if not result.ok:
+                self.failed += 1
+                return
+            self.completed_bytes += file_size
+            self.recent.append((now, file_size))
+            self.durations[self._size_class(file_size)].append(result.duration)
+            self.durations[None].append(result.duration)
+
+    def _p95(self, size_class: Optional[int]) -> Optional[float]:
+        """大小分类的耗时p95，样本不足时为None"""
+        samples = self.durations.get(size_class)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def check_stalls(self) -> List[Dict]:
+        """
+        找出新出现的卡住请求（每个文件只报告一次）
+
+        Returns:
+            [{'file': 文件路径, 'elapsed': 在途秒数, 'p95': 同类文件耗时p95}]
+        """
+        if not self.stall_factor:
+            return []
+
+        now = time.time()
+        stalls = []
+        with self.lock:
+            p95_cache = {}
+            for file_path, (file_size, started) in self.active.items():
+                if started is None or file_path in self.stalled:
+                    continue
+                elapsed = now - started
+                if elapsed < self.stall_min_seconds:
+                    continue
+                size_class = self._size_class(file_size)
+                if size_class not in p95_cache:
+                    p95_cache[size_class] = self._p95(size_class) or self._p95(None)
+                p95 = p95_cache[size_class]
+                if p95 is not None and elapsed > self.stall_factor * p95:
+                    self.stalled.add(file_path)
+                    stalls.append({'file': file_path, 'elapsed': round(elapsed, 1), 'p95': round(p95, 1)})
+        return stalls
+
+    def snapshot(self, running: bool = True) -> Dict:
+        """
+        当前进度
+
+        Args:
+            running: 运行是否仍在进行（最后一次汇报为False）
+
+        Returns:
+            状态字典（完成数、吞吐、在途和排队数量、预计剩余时间、卡住的请求等）
+        """
+        now = time.time()
+        with self.lock:
+            while self.recent and now - self.recent[0][0] > self.window:
+                self.recent.popleft()
+            span = min(self.window, max(now - self.started_at, 1.0))
+            files_per_second = len(self.recent) / span
+            bytes_per_second = sum(size for _, size in self.recent) / span
+            in_flight = sum(1 for _, started in self.active.values() if started is not None)
+
+            eta = None
+            if self.total is not None and files_per_second > 0:
+                remaining = max(0, self.total - self.rejected - self.completed)
+                eta = round(remaining / files_per_second, 1)
+
+            return {
+                'pid': os.getpid(),
+                'running': running,
+                'elapsed_seconds': round(now - self.started_at, 1),
+                'total': self.total,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'completed_mb': round(self.completed_bytes / 1024 / 1024, 2),
+                'files_per_second': round(files_per_second, 3),
+                'mb_per_second': round(bytes_per_second / 1024 / 1024, 3),
+                'in_flight': in_flight,
+                'queue_depth': len(self.active) - in_flight,
+                'eta_seconds': eta,
+                'stalled': sorted(self.stalled),
+                'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+    def write_status(self, status_file: Path, status: Dict):
+        """原子地写入状态文件"""
+        tmp_path = status_file.with_name(status_file.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, status_file)
+
+    def start_reporting(self, interval: float, listener: StatusListener = None, status_file: str = None):
+        """
+        启动定时线程：每隔 interval 秒检查卡住的请求、回调状态并写入状态文件
+
+        Args:
+            interval: 间隔（秒）
+            listener: 状态回调
+            status_file: 状态文件路径
+        """
+        status_path = Path(status_file) if status_file else None
+        self.stop_event.clear()
+
+        def loop():
+            while not self.stop_event.wait(interval):
+                self._report(listener, status_path)
+
+        self.listener = listener
+        self.status_path = status_path
+        self.thread = threading.Thread(target=loop, name='progress-monitor', daemon=True)
+        self.thread.start()
+
+    def _report(self, listener: Optional[StatusListener], status_path: Optional[Path], running: bool = True):
+        """检查一次卡住的请求，回调并写出当前状态"""
+        for stall in self.check_stalls() if running else []:
+            if listener is not None:
+                listener('stalled', stall['file'], {'elapsed': stall['elapsed'], 'p95': stall['p95']})
+        status = self.snapshot(running)
+        if listener is not None:
+            listener('progress', '', status)
+        if status_path is not None:
+            try:
+                self.write_status(status_path, status)
+            except OSError:
+                pass
+
+    def stop_reporting(self):
+        """停止定时线程，并汇报最终状态（running 为False）"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self._report(self.listener, self.status_path, running=False)
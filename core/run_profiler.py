@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   run_profiler.py
+@Time    :   2026/02/20 10:41:27
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+运行剖析模块
+采样所有工作线程的调用栈，按文件和流水线阶段汇总CPU/等待时间，可选记录内存峰值；
+结果输出为 pstats 文件和火焰图工具可用的折叠栈格式
+"""
+
+import os
+import re
+import sys
+import time
+import heapq
+import marshal
+import threading
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+# 栈中最内层的项目模块决定采样所属的流水线阶段
+STAGE_MODULES = {
+    'formula_processor': 'formulas',
+    'image_processor': 'images',
+    'table_processor': 'tables',
+    'docling_client': 'docling',
+    'option_planner': 'plan',
+    'local_converter': 'local',
+    'pdf_splitter': 'split',
+    'output_manager': 'save',
+    'sqlite_store': 'store',
+    'file_validator': 'validate',
+    'file_scanner': 'scan',
+    'batch_converter': 'pipeline',
+    'markdown_processor': 'chunk',
+    'chunk_deduplicator': 'dedup',
+    'dify_sink': 'dify',
+}
+
+# 空闲线程（线程池等待任务、队列等待）的栈顶函数，不计入采样
+IDLE_LEAVES = {'wait', 'get', '_worker', '_wait_for_tstate_lock', 'select', 'poll', 'sleep'}
+
+# 函数标识 (文件名, 首行号, 函数名)，与 pstats 一致
+FuncKey = Tuple[str, int, str]
+
+
+class RunProfiler:
+    """运行剖析器 - 定时采样线程调用栈，按文件/阶段汇总并写出剖析结果"""
+
+    def __init__(self, mode: str = 'run', output_dir: str = 'profile', top: int = 10,
+                 interval: float = 0.01, memory: bool = False):
+        """
+        初始化运行剖析器
+
+        Args:
+            mode: 'run' 剖析整个运行；'slowest' 只保留耗时最长的 top 个文件的剖析结果
+            output_dir: 剖析结果输出目录
+            top: slowest 模式下保留的文件数
+            interval: 采样间隔（秒）
+            memory: 是否用 tracemalloc 记录内存峰值（会明显降低运行速度）
+        """
+        if mode not in ('run', 'slowest'):
+            raise Exception(f"不支持的剖析模式: {mode} (支持: run, slowest)")
+
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self.top = top
+        self.interval = interval
+        self.memory = memory
+
+        # 线程ID -> 正在处理的文件
+        self.active: Dict[int, str] = {}
+        # 调用栈 -> 采样时间（秒）：每个采样按距上一次采样实际经过的时间计，
+        # 采样线程因GIL争用未能按时唤醒时不会少计时间
+        self.file_samples: Dict[str, Counter] = {}
+        self.run_samples = Counter()
+        self.sample_count = 0
+        # 最慢的文件：[(耗时, 文件, 采样, 内存峰值)] 小顶堆
+        self.slowest: List[Tuple[float, str, Counter, int]] = []
+
+        self.memory_baseline: Dict[str, int] = {}
+        self.memory_peaks: Dict[str, int] = {}
+        self.peak_traced = 0
+        self.peak_snapshot = None
+
+        self.labels = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """开始采样"""
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.thread = threading.Thread(target=self._sample_loop, name='run-profiler', daemon=True)
+        self.thread.start()
+
+    def begin(self, tag: str):
+        """
+        当前线程开始处理一个文件
+
+        Args:
+            tag: 文件标识（通常为文件路径）
+        """
+        with self.lock:
+            self.active[threading.get_ident()] = tag
+            self.file_samples[tag] = Counter()
+            if self.memory:
+                self.memory_baseline[tag] = tracemalloc.get_traced_memory()[0]
+                self.memory_peaks[tag] = 0
+
+    def end(self, tag: str, duration: float):
+        """
+        当前线程完成一个文件
+
+        Args:
+            tag: 文件标识
+            duration: 文件处理耗时（秒）
+        """
+        with self.lock:
+            self.active.pop(threading.get_ident(), None)
+            samples = self.file_samples.pop(tag, Counter())
+            self.memory_baseline.pop(tag, None)
+            memory_peak = self.memory_peaks.pop(tag, 0)
+            if self.mode != 'slowest':
+                return
+            entry = (duration, tag, samples, memory_peak)
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def _sample_loop(self):
+        """采样线程：定时读取各线程的调用栈"""
+        own_ident = threading.get_ident()
+        last = time.perf_counter()
+        while not self.stop_event.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            take_snapshot = False
+            with self.lock:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    tag = self.active.get(ident)
+                    if tag is None and (self.mode == 'slowest' or frame.f_code.co_name in IDLE_LEAVES):
+                        continue
+                    stack = self._stack(frame)
+                    if tag is not None:
+                        self.file_samples[tag][stack] += weight
+                    if self.mode == 'run':
+                        self.run_samples[stack] += weight
+                    self.sample_count += 1
+                if self.memory:
+                    take_snapshot = self._sample_memory()
+            del frames
+            # 快照很慢，在锁外进行，不阻塞工作线程的 begin/end
+            if take_snapshot:
+                self.peak_snapshot = tracemalloc.take_snapshot()
+
+    def _sample_memory(self) -> bool:
+        """
+        记录各在途文件的内存增量峰值
+
+        Returns:
+            全局峰值是否明显上升（需要保存快照）
+        """
+        current, _ = tracemalloc.get_traced_memory()
+        for tag, baseline in self.memory_baseline.items():
+            self.memory_peaks[tag] = max(self.memory_peaks[tag], current - baseline)
+        if current > self.peak_traced * 1.1 + 1024 * 1024:
+            self.peak_traced = current
+            return True
+        return False
+
+    def _stack(self, frame) -> Tuple[FuncKey, ...]:
+        """调用栈（从外到内）"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _label(self, func: FuncKey) -> str:
+        """折叠栈中的函数名：模块名:函数名"""
+        label = self.labels.get(func)
+        if label is None:
+            module = os.path.splitext(os.path.basename(func[0]))[0]
+            label = re.sub(r'[;\s]', '_', f"{module}:{func[2]}")
+            self.labels[func] = label
+        return label
+
+    @staticmethod
+    def _stage(stack: Tuple[FuncKey, ...]) -> str:
+        """最内层项目模块对应的流水线阶段"""
+        for filename, _, _ in reversed(stack):
+            stage = STAGE_MODULES.get(os.path.splitext(os.path.basename(filename))[0])
+            if stage is not None:
+                return stage
+        return 'other'
+
+    def stop(self) -> List[Path]:
+        """
+        停止采样并写出剖析结果
+
+        Returns:
+            写出的文件路径列表
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        written = []
+        summary = [f"剖析模式: {self.mode}，采样间隔 {self.interval * 1000:.0f}ms，共 {self.sample_count} 个采样", ""]
+
+        if self.mode == 'run':
+            written += self._write_profile('run', self.run_samples)
+            summary += self._stage_lines(self.run_samples)
+        else:
+            for rank, (duration, tag, samples, memory_peak) in enumerate(sorted(self.slowest, reverse=True), 1):
+                name = f"slowest_{rank:02d}_{re.sub(r'[^0-9A-Za-z_.-]+', '_', Path(tag).stem)[:60]}"
+                written += self._write_profile(name, samples)
+                summary.append(f"{rank:2d}. {tag}  耗时 {duration:.2f}秒" +
+                               (f"  内存增量峰值 {memory_peak / 1024 / 1024:.1f} MB" if self.memory else ''))
+                summary += ['    ' + line for line in self._stage_lines(samples)]
+
+        if self.memory:
+            summary.append("")
+            summary.append(f"tracemalloc 峰值: {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MB")
+            if self.peak_snapshot is not None:
+                memory_path = self.output_dir / 'memory_peak.txt'
+                with open(memory_path, 'w', encoding='utf-8') as f:
+                    f.write(f"内存峰值附近的分配位置（已追踪 {self.peak_traced / 1024 / 1024:.1f} MB）\n\n")
+                    for stat in self.peak_snapshot.statistics('lineno')[:50]:
+                        f.write(f"{stat}\n")
+                written.append(memory_path)
+            tracemalloc.stop()
+
+        summary_path = self.output_dir / 'summary.txt'
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(summary) + '\n')
+        written.append(summary_path)
+        return written
+
+    def _stage_lines(self, samples: Counter) -> List[str]:
+        """按阶段汇总的采样时间"""
+        stages = Counter()
+        for stack, seconds in samples.items():
+            stages[self._stage(stack)] += seconds
+        total = sum(stages.values()) or 1
+        return [f"{stage:<10} {seconds:8.2f}秒  {seconds / total:6.1%}"
+                for stage, seconds in stages.most_common()]
+
+    def _write_profile(self, name: str, samples: Counter) -> List[Path]:
+        """
+        写出一组采样：pstats 文件（可用 pstats/snakeviz 查看）和折叠栈（可用 flamegraph.pl/speedscope 查看）
+
+        Returns:
+            写出的文件路径
+        """
+        collapsed_path = self.output_dir / f"{name}.collapsed"
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            # 折叠栈的权重为整数，以微秒为单位
+            for stack, seconds in samples.most_common():
+                labels = [f"stage:{self._stage(stack)}"] + [self._label(func) for func in stack]
+                f.write(f"{';'.join(labels)} {max(1, round(seconds * 1e6))}\n")
+
+        # pstats 格式：{函数: (原始调用数, 调用数, 自身时间, 累计时间, {调用者: (同上)})}
+        # 采样数据没有调用次数，以折算的采样数（时间 / 采样间隔）代替
+        self_seconds = Counter()
+        total_seconds = Counter()
+        caller_seconds: Dict[FuncKey, Counter] = {}
+        for stack, seconds in samples.items():
+            self_seconds[stack[-1]] += seconds
+            for func in set(stack):
+                total_seconds[func] += seconds
+            for caller, callee in set(zip(stack, stack[1:])):
+                caller_seconds.setdefault(callee, Counter())[caller] += seconds
+
+        def calls(seconds: float) -> int:
+            return max(1, round(seconds / self.interval))
+
+        stats = {}
+        for func, total in total_seconds.items():
+            callers = {
+                caller: (calls(t), calls(t), 0.0, t)
+                for caller, t in caller_seconds.get(func, {}).items()
+            }
+            stats[func] = (calls(total), calls(total), self_seconds[func], total, callers)
+
+        stats_path = self.output_dir / f"{name}.prof"
+        with open(stats_path, 'wb') as f:
+            marshal.dump(stats, f)
+        return [stats_path, collapsed_path]
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   sqlite_store.py
+@Time    :   2026/02/09 11:18:26
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+SQLite输出库模块
+将Markdown、图片和转换结果写入单个SQLite数据库，避免海量小文件
+"""
+
+import json
+import queue
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    source_path   TEXT PRIMARY KEY,
+    source_hash   TEXT,
+    output_path   TEXT,
+    markdown      TEXT,
+    status        TEXT,
+    error         TEXT,
+    result_json   TEXT,
+    updated_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(source_hash);
+CREATE TABLE IF NOT EXISTS images (
+    source_path   TEXT,
+    image_path    TEXT,
+    data          BLOB,
+    PRIMARY KEY (source_path, image_path)
+);
+"""
+
+
+class SqliteOutputStore:
+    """SQLite输出库 - 单写线程批量提交事务"""
+
+    def __init__(self, db_path: str, batch_size: int = 200, flush_interval: float = 2.0):
+        """
+        初始化SQLite输出库
+
+        Args:
+            db_path: 数据库文件路径
+            batch_size: 每个事务最多包含的文档数
+            flush_interval: 队列空闲时最长多久提交一次（秒）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(maxsize=batch_size * 4)
+        self.error = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.reader: Optional[sqlite3.Connection] = None  # 查询用的只读连接（按需创建）
+        self.reader_lock = threading.Lock()
+        self.writer = threading.Thread(target=self._write_loop, name='sqlite-output-writer', daemon=True)
+        self.writer.start()
+
+    @staticmethod
+    def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+        """计算源文件的SHA-256（分块读取）"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def save_document(self, result: Dict, markdown: Optional[str] = None, output_path: str = '',
+                      images: List[Tuple[str, bytes]] = None, source_hash: str = ''):
+        """
+        将单个文档的转换结果放入写队列
+
+        Args:
+            result: 处理结果字典
+            markdown: Markdown内容（失败时为None）
+            output_path: Markdown在导出目录中的相对路径
+            images: [(图片相对路径, 图片数据)]
+            source_hash: 源文件哈希
+        """
+        if self.error is not None:
+            raise Exception(f"写入输出库失败: {self.error}")
+
+        with self.lock:
+            if self.closed:
+                raise Exception(f"输出库已关闭，无法写入: {self.db_path}")
+            self.queue.put((result, markdown, output_path, images or [], source_hash))
+
+    def stored_hash(self, source_path: str) -> Optional[str]:
+        """
+        查询源文件最近一次成功转换时的哈希（仍在写队列中的文档查不到）
+
+        Args:
+            source_path: 源文件路径
+
+        Returns:
+            源文件哈希，没有成功记录时返回None
+        """
+        with self.reader_lock:
+            if self.reader is None:
+                self.reader = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            try:
+                row = self.reader.execute(
+                    "SELECT source_hash FROM documents WHERE source_path = ? AND status = 'success'",
+                    (source_path,)
+                ).fetchone()
+            except sqlite3.Error:
+                # 写线程尚未建表
+                return None
+        return row[0] if row else None
+
+    def close(self):
+        """提交剩余数据并关闭写线程（由创建输出库的调用方在最后一次使用后调用，重复调用无影响）"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        self.writer.join()
+        with self.reader_lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+        if self.error is not None:
+            raise Exception(f"写入输出库失败: {self.error}")
+
+    def _write_loop(self):
+        """写线程：攒批后在单个事务中写入"""
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+
+            closing = False
+            while not closing:
+                batch = []
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                else:
+                    closing = True
+
+                if batch:
+                    with conn:
+                        for entry in batch:
+                            self._write_document(conn, *entry)
+        except Exception as e:
+            self.error = e
+            # 持续排空队列直到 close()，避免生产者阻塞
+            while self.queue.get() is not None:
+                pass
+        finally:
+            conn.close()
+
+    def _write_document(self, conn: sqlite3.Connection, result: Dict, markdown: Optional[str],
+                        output_path: str, images: List[Tuple[str, bytes]], source_hash: str):
+        """写入单个文档（在调用方的事务中执行）"""
+        source_path = result['input_file']
+        conn.execute(
+            'INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                source_path,
+                source_hash,
+                output_path,
+                markdown,
+                result.get('status', ''),
+                result.get('error', ''),
+                json.dumps(result, ensure_ascii=False),
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            )
+        )
+        conn.execute('DELETE FROM images WHERE source_path = ?', (source_path,))
+        conn.executemany(
+            'INSERT INTO images VALUES (?, ?, ?)',
+            [(source_path, image_path, data) for image_path, data in images]
+        )
+
+    @staticmethod
+    def export(db_path: str, output_dir: str) -> int:
+        """
+        将输出库还原为普通目录结构（{name}.md + {name}_images/，以及保存的 {name}.docling.json.gz）
+
+        Args:
+            db_path: 数据库文件路径
+            output_dir: 导出目录
+
+        Returns:
+            导出的文档数
+        """
+        output_root = Path(output_dir)
+        conn = sqlite3.connect(str(db_path))
+        exported = 0
+
+        try:
+            documents = conn.execute(
+                "SELECT source_path, output_path, markdown FROM documents "
+                "WHERE status = 'success' AND markdown IS NOT NULL"
+            )
+            for source_path, output_path, markdown in documents:
+                md_path = output_root / output_path
+                md_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(md_path, 'w', encoding='utf-8') as f:
+                    f.write(markdown)
+
+                images = conn.execute(
+                    'SELECT image_path, data FROM images WHERE source_path = ?', (source_path,)
+                )
+                for image_path, data in images:
+                    image_file = output_root / image_path
+                    image_file.parent.mkdir(parents=True, exist_ok=True)
+                    with open(image_file, 'wb') as f:
+                        f.write(data)
+
+                exported += 1
+        finally:
+            conn.close()
+
+        return exported
@@ -15,14 +15,45 @@
 
 """
 表格处理器模块
-负责优化表格格式
+负责优化表格格式，并将超大表格按行拆分为多个带表头的小表格
 """
 
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+# 表头与表体之间的分隔行，例如 |---|:---:|
+SEPARATOR_PATTERN = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数：ASCII字符约4个一个token，中日韩等非ASCII字符约一个一个token
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    char_count = len(text)
+    # UTF-8 下常见的非ASCII字符（中日韩）占3字节，多出的2字节对应一个非ASCII字符
+    non_ascii = (len(text.encode('utf-8')) - char_count) // 2
+    return (char_count - non_ascii) // 4 + non_ascii + 1
+
+
 class TableProcessor:
     """表格处理器 - 负责优化表格格式"""
     
-    def __init__(self):
-        pass
+    def __init__(self, block_tokens: int = 0):
+        """
+        初始化表格处理器
+        
+        Args:
+            block_tokens: 拆分大表格时每个行块的token上限（含重复的表头），0表示不拆分
+        """
+        self.block_tokens = block_tokens
+        self.split_count = 0
     
     def process_tables(self, markdown_content: str) -> str:
         """
@@ -59,3 +90,82 @@ class TableProcessor:
         
         return '\n'.join(processed_lines)
 
+
+    def split_large_tables(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        单遍流式拆分大表格：表格按行累积，行块的token数将超过上限时输出当前行块，
+        空一行后重复表头和分隔行继续下一个行块。只缓存一个行块，耗时与行数成正比。
+        
+        没有超过上限的表格和非表格内容原样输出；新增的行块数累加到 split_count。
+        
+        Args:
+            lines: 文本行（可以带换行符）
+            
+        Yields:
+            处理后的文本行（保留原换行符）
+        """
+        header: List[str] = []
+        block: List[str] = []
+        block_tokens = 0
+        header_tokens = 0
+        previous = None
+        newline = '\n'
+        
+        for line in lines:
+            text = line.rstrip('\r\n')
+            if line != text:
+                newline = line[len(text):]
+            is_table_line = text.lstrip().startswith('|')
+            
+            if header and is_table_line:
+                # 表体行：超出上限时先输出当前行块
+                tokens = estimate_tokens(text)
+                if len(block) > len(header) and block_tokens + tokens > self.block_tokens:
+                    yield from block
+                    yield newline
+                    self.split_count += 1
+                    block = list(header)
+                    block_tokens = header_tokens
+                block.append(line)
+                block_tokens += tokens
+                continue
+            
+            if header:
+                # 表格结束
+                yield from block
+                header, block = [], []
+            
+            if previous is not None:
+                if self.block_tokens > 0 and '|' in text and SEPARATOR_PATTERN.match(text):
+                    # 表头 + 分隔行：开始缓存表格
+                    header = [previous, line]
+                    block = list(header)
+                    header_tokens = block_tokens = estimate_tokens(previous) + estimate_tokens(text)
+                    previous = None
+                    continue
+                yield previous
+            previous = line if is_table_line else None
+            if previous is None:
+                yield line
+        
+        if header:
+            yield from block
+        elif previous is not None:
+            yield previous
+    
+    def split_file(self, input_path: Path, output_path: Path) -> int:
+        """
+        拆分文件中的大表格并写入新文件
+        
+        Args:
+            input_path: 输入Markdown文件
+            output_path: 输出文件
+            
+        Returns:
+            新增的行块数（0表示没有表格需要拆分）
+        """
+        self.split_count = 0
+        with open(input_path, 'r', encoding='utf-8', errors='replace', newline='') as src, \
+                open(output_path, 'w', encoding='utf-8', newline='') as dst:
+            dst.writelines(self.split_large_tables(src))
+        return self.split_count
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   task_poller.py
+@Time    :   2026/02/06 16:25:10
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+任务轮询器模块
+用单个后台线程轮询Docling异步任务状态
+"""
+
+import heapq
+import itertools
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+import requests
+
+
+class TaskPoller:
+    """任务轮询器 - 单线程轮询所有异步任务，任务就绪后交给回调获取结果"""
+
+    PENDING_STATUS = {'pending', 'started'}
+
+    def __init__(self, session: requests.Session, status_url: str, on_ready: Callable[[str, Future], None],
+                 interval: float = 1.0, max_interval: float = 30.0, max_errors: int = 10):
+        """
+        初始化任务轮询器
+
+        Args:
+            session: 复用的HTTP会话
+            status_url: 任务状态URL模板，包含 {task_id} 占位符
+            on_ready: 任务成功后的回调 (task_id, future)，负责获取结果并设置future
+            interval: 初始轮询间隔（秒）
+            max_interval: 轮询间隔上限（秒），未完成的任务轮询间隔按1.5倍递增
+            max_errors: 同一任务连续轮询出错多少次后判定失败
+        """
+        self.session = session
+        self.status_url = status_url
+        self.on_ready = on_ready
+        self.interval = interval
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+
+        self.schedule = []  # 堆: (下次轮询时间, 序号, task_id)
+        self.tasks: Dict[str, dict] = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def track(self, task_id: str, future: Future):
+        """
+        开始跟踪一个异步任务
+
+        Args:
+            task_id: Docling返回的任务ID
+            future: 任务完成时设置结果的future
+        """
+        with self.condition:
+            self.tasks[task_id] = {'future': future, 'delay': self.interval, 'errors': 0}
+            heapq.heappush(self.schedule, (time.monotonic() + self.interval, next(self.counter), task_id))
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='docling-task-poller', daemon=True)
+                self.thread.start()
+
+            self.condition.notify()
+
+    @property
+    def pending_count(self) -> int:
+        """正在等待的任务数"""
+        with self.condition:
+            return len(self.tasks)
+
+    def _run(self):
+        """轮询循环：按到期时间依次检查任务状态"""
+        while True:
+            with self.condition:
+                while not self.schedule:
+                    # 没有任务时空闲等待，长时间无任务则退出线程
+                    if not self.condition.wait(timeout=60):
+                        if not self.schedule:
+                            self.thread = None
+                            return
+
+                due_at, _, task_id = self.schedule[0]
+                remaining = due_at - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(timeout=remaining)
+                    continue
+
+                heapq.heappop(self.schedule)
+                task = self.tasks.get(task_id)
+
+            if task is not None:
+                self._poll(task_id, task)
+
+    def _poll(self, task_id: str, task: dict):
+        """检查单个任务的状态"""
+        future = task['future']
+
+        try:
+            response = self.session.get(self.status_url.format(task_id=task_id), timeout=(10, 30))
+            response.raise_for_status()
+            status = response.json().get('task_status', '')
+            task['errors'] = 0
+        except (requests.exceptions.RequestException, ValueError) as e:
+            task['errors'] += 1
+            if task['errors'] >= self.max_errors:
+                self._finish(task_id)
+                future.set_exception(Exception(f"查询任务状态失败 ({task_id}): {str(e)}"))
+                return
+            status = 'pending'
+
+        if status == 'success':
+            self._finish(task_id)
+            self.on_ready(task_id, future)
+        elif status in self.PENDING_STATUS:
+            task['delay'] = min(task['delay'] * 1.5, self.max_interval)
+            with self.condition:
+                heapq.heappush(self.schedule, (time.monotonic() + task['delay'], next(self.counter), task_id))
+        else:
+            self._finish(task_id)
+            future.set_exception(Exception(f"Docling任务失败 ({task_id}): 状态 {status or '未知'}"))
+
+    def _finish(self, task_id: str):
+        """停止跟踪任务"""
+        with self.condition:
+            self.tasks.pop(task_id, None)
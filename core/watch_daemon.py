@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   watch_daemon.py
+@Time    :   2026/02/13 17:40:09
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+监听守护进程模块
+常驻运行，复用已建立的连接和处理器，新增或修改的文件在几秒内完成转换
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from .batch_converter import BatchConverter, EventCallback
+from .conversion_result import ConversionResult
+from .file_scanner import FileScanner
+from .folder_watcher import FolderWatcher
+from .sqlite_store import SqliteOutputStore
+
+
+class WatchDaemon:
+    """监听守护进程 - 监听输入目录并持续转换"""
+
+    def __init__(self, converter: BatchConverter, directories: List[str], output_dir: str = None,
+                 scanner: FileScanner = None, settle_time: float = 2.0, poll_interval: float = 5.0,
+                 status_file: str = None, status_port: int = 0,
+                 on_result: Callable[[ConversionResult], None] = None, on_event: EventCallback = None):
+        """
+        初始化监听守护进程
+
+        Args:
+            converter: 批量转换器（其Docling会话和各处理器在整个运行期间复用）
+            directories: 要监听的目录列表
+            output_dir: 输出目录（默认输出到源文件所在目录）；监听多个目录时按目录名分子目录
+            scanner: 文件扫描器（扩展名和include/exclude规则）
+            settle_time: 文件大小和修改时间保持不变多久后才开始转换（秒），避免处理写入中的文件
+            poll_interval: 无法使用inotify时的轮询间隔（秒）
+            status_file: 定期写入运行状态的JSON文件
+            status_port: 本地状态接口端口（只监听127.0.0.1），0表示不启用
+            on_result: 每完成一个文件调用
+            on_event: 事件回调 (事件名, 文件路径, 附加信息)，同时接收转换器的各阶段事件；
+                守护进程自身的事件: watching、watcher（监听方式变化）、status_server、rejected
+        """
+        self.converter = converter
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.output_dir = output_dir
+        self.scanner = scanner or FileScanner()
+        self.settle_time = settle_time
+        self.status_file = Path(status_file) if status_file else None
+        self.status_port = status_port
+        self.on_result = on_result
+        self.on_event = on_event
+        self.converter.on_event = on_event
+        self.watcher = FolderWatcher(
+            self.directories, self.scanner, poll_interval,
+            listener=lambda message: self._emit('watcher', message=message)
+        )
+
+        # 待稳定的文件 -> (最近一次变化时间, 签名)
+        self.candidates: Dict[str, Tuple[float, tuple]] = {}
+        # 已转换文件的签名，避免重复转换未变化的文件
+        self.converted: Dict[str, tuple] = {}
+        self.in_flight: Dict = {}  # future -> (文件路径, 签名)
+
+        self.started_at = time.time()
+        self.completed_times = deque()
+        self.success_count = 0
+        self.failed_count = 0
+        self.last_file = ''
+        self.lock = threading.Lock()
+
+    def _emit(self, event: str, file_path: str = '', **info):
+        """触发事件回调"""
+        if self.on_event is not None:
+            self.on_event(event, file_path, info)
+
+    def _output_root(self, root: str) -> Path:
+        """监听根目录对应的输出根目录"""
+        if not self.output_dir:
+            return Path(root)
+        if len(self.directories) == 1:
+            return Path(self.output_dir)
+        return Path(self.output_dir) / Path(root).name
+
+    def _output_file(self, file_path: str) -> Tuple[Path, Path]:
+        """文件对应的 (输出目录, Markdown输出路径)"""
+        root = self.watcher.root_of(file_path)
+        output_dir = FileScanner.mirrored_output_dir(file_path, root, self._output_root(root))
+        base_name = Path(file_path).stem
+        return output_dir, self.converter.output_manager.document_dir(output_dir, base_name) / f"{base_name}.md"
+
+    def _needs_conversion(self, file_path: str, signature: tuple) -> bool:
+        """文件是否需要（重新）转换"""
+        if self.converted.get(file_path) == signature:
+            return False
+
+        if self.converter.output_store is None:
+            # 重启后依据输出文件判断：输出比源文件新则视为已转换
+            _, output_file = self._output_file(file_path)
+            try:
+                if output_file.stat().st_mtime_ns >= signature[0]:
+                    self.converted[file_path] = signature
+                    return False
+            except OSError:
+                pass
+        else:
+            # 输出库模式：源文件哈希与最近一次成功转换时相同则视为已转换
+            stored_hash = self.converter.output_store.stored_hash(file_path)
+            if stored_hash:
+                try:
+                    unchanged = SqliteOutputStore.hash_file(file_path) == stored_hash
+                except OSError:
+                    unchanged = False
+                if unchanged:
+                    self.converted[file_path] = signature
+                    return False
+
+        return True
+
+    def run(self):
+        """运行守护进程，直到被中断"""
+        self._emit('watching', mode=self.watcher.mode, directories=self.directories)
+        if self.status_port:
+            self._start_status_server()
+
+        now = time.monotonic()
+        for file_path in self.watcher.initial_files():
+            self.candidates[file_path] = (now - self.settle_time, None)
+
+        last_status = 0.0
+        executor = ThreadPoolExecutor(max_workers=self.converter.max_workers)
+        try:
+            while True:
+                for file_path in self.watcher.wait_for_changes(timeout=min(self.settle_time, 1.0)):
+                    self.candidates[file_path] = (time.monotonic(), None)
+
+                self._dispatch_stable(executor)
+                self._collect(wait(list(self.in_flight), timeout=0, return_when=FIRST_COMPLETED)[0])
+
+                if time.monotonic() - last_status >= 5:
+                    self._write_status()
+                    last_status = time.monotonic()
+        finally:
+            executor.shutdown(wait=True)
+            self._collect(list(self.in_flight))
+            self._write_status()
+            self.watcher.close()
+
+    def _dispatch_stable(self, executor: ThreadPoolExecutor):
+        """提交已稳定（写入完成）的文件"""
+        now = time.monotonic()
+        busy = {path for path, _ in self.in_flight.values()}
+
+        for file_path, (changed_at, signature) in list(self.candidates.items()):
+            if now - changed_at < self.settle_time or file_path in busy:
+                continue
+
+            current = FolderWatcher.signature(file_path)
+            if current == (0, 0) and not os.path.exists(file_path):
+                del self.candidates[file_path]
+                continue
+            if current != signature:
+                # 第一次检查或文件仍在变化，再等待一个稳定周期
+                self.candidates[file_path] = (now, current)
+                continue
+
+            del self.candidates[file_path]
+            if not self._needs_conversion(file_path, current):
+                continue
+
+            is_valid, error_msg = self.converter.validator.validate_file(file_path)
+            if not is_valid:
+                self._emit('rejected', file_path, error=error_msg)
+                self.converted[file_path] = current
+                continue
+
+            output_dir, _ = self._output_file(file_path)
+            # 输出根目录随调用传递（监听多个目录时各文件不同，不能改写转换器的共享状态）
+            output_root = self._output_root(self.watcher.root_of(file_path))
+            future = executor.submit(self.converter.process_single_file, file_path, output_dir,
+                                     output_root=output_root)
+            self.in_flight[future] = (file_path, current)
+
+    def _collect(self, done):
+        """处理已完成的转换"""
+        for future in done:
+            file_path, signature = self.in_flight.pop(future)
+            result = future.result()
+            self.converted[file_path] = signature
+
+            with self.lock:
+                self.completed_times.append(time.time())
+                self.last_file = file_path
+                if result.ok:
+                    self.success_count += 1
+                else:
+                    self.failed_count += 1
+
+            if self.on_result is not None:
+                self.on_result(result)
+
+    def get_status(self) -> Dict:
+        """
+        获取运行状态
+
+        Returns:
+            状态字典（队列深度、在途数、吞吐等）
+        """
+        now = time.time()
+        with self.lock:
+            # 只保留最近5分钟的完成记录用于计算吞吐
+            while self.completed_times and now - self.completed_times[0] > 300:
+                self.completed_times.popleft()
+            recent = len(self.completed_times)
+            status = {
+                'pid': os.getpid(),
+                'watch_mode': self.watcher.mode,
+                'directories': self.directories,
+                'uptime_seconds': round(now - self.started_at, 1),
+                'queue_depth': len(self.candidates),
+                'in_flight': len(self.in_flight),
+                'converted': self.success_count,
+                'failed': self.failed_count,
+                'throughput_per_minute': round(recent / min(5.0, max((now - self.started_at) / 60, 1 / 60)), 2),
+                'last_file': self.last_file,
+                'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+        return status
+
+    def _write_status(self):
+        """原子地写入状态文件"""
+        if self.status_file is None:
+            return
+        tmp_path = self.status_file.with_name(self.status_file.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_status(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.status_file)
+
+    def _start_status_server(self):
+        """启动本地状态接口：GET /status 返回JSON"""
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/status'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(daemon.get_status(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', self.status_port), StatusHandler)
+        threading.Thread(target=server.serve_forever, name='status-server', daemon=True).start()
+        self._emit('status_server', url=f"http://127.0.0.1:{self.status_port}/status")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   work_lease.py
+@Time    :   2026/02/12 10:47:55
+@Author  :   Ethan
+@Email   :   ethanrise.ai@gmail.com
+@Version :   1.0
+@Desc    :   
+@Note    :   None
+'''
+
+# ---------------------- Third-party Library Imports ----------------------
+
+
+"""
+工作租约模块
+多台机器通过共享目录中的租约文件协调，分摊同一个输入目录的转换工作
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+
+class WorkLeaseManager:
+    """工作租约管理器 - 基于 O_EXCL 原子创建的租约文件，心跳续约，过期可抢占"""
+
+    def __init__(self, work_dir: str, source_root: Optional[str] = None, lease_ttl: float = 120.0,
+                 node_id: str = None):
+        """
+        初始化工作租约管理器
+
+        Args:
+            work_dir: 所有节点共享的工作目录
+            source_root: 输入根目录，文件按相对路径标识，各节点挂载路径不同也能对应
+            lease_ttl: 租约有效期（秒），超过该时间未续约的租约视为节点已崩溃
+            node_id: 节点标识（默认: 主机名-进程号）
+        """
+        self.work_dir = Path(work_dir)
+        self.source_root = os.path.abspath(source_root) if source_root else None
+        self.lease_ttl = lease_ttl
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+
+        self.leases_dir = self.work_dir / 'leases'
+        self.done_dir = self.work_dir / 'done'
+        self.journal_dir = self.work_dir / 'journal'
+        for directory in (self.leases_dir, self.done_dir, self.journal_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.held: Dict[str, Path] = {}  # 文件路径 -> 租约文件
+        self.stolen_count = 0
+        self.lock = threading.Lock()
+        self.journal = open(self.journal_dir / f"{self.node_id}.jsonl", 'a', encoding='utf-8')
+
+        self.stop_event = threading.Event()
+        self.heartbeat = threading.Thread(target=self._heartbeat_loop, name='lease-heartbeat', daemon=True)
+        self.heartbeat.start()
+
+    def _relative(self, file_path: str) -> str:
+        """文件相对于输入根目录的路径（不在根目录下时为绝对路径）"""
+        path = os.path.abspath(file_path)
+        if self.source_root:
+            try:
+                path = os.path.relpath(path, self.source_root)
+            except ValueError:
+                pass
+        return path.replace(os.sep, '/')
+
+    def _key(self, file_path: str) -> str:
+        """文件的租约标识（相对路径的哈希）"""
+        return hashlib.sha1(self._relative(file_path).encode('utf-8')).hexdigest()
+
+    def _done_path(self, key: str) -> Path:
+        """完成标记路径（按哈希前缀分目录，避免单目录条目过多）"""
+        return self.done_dir / key[:2] / key
+
+    def claim(self, file_path: str) -> bool:
+        """
+        尝试领取一个文件
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            是否领取成功（已完成或被其他节点持有时返回False）
+        """
+        key = self._key(file_path)
+        if self._done_path(key).exists():
+            return False
+
+        lease_path = self.leases_dir / f"{key}.lease"
+        content = json.dumps({
+            'node': self.node_id,
+            'file': file_path,
+            'relative': self._relative(file_path),
+            'claimed_at': time.time()
+        })
+
+        for _ in range(2):
+            try:
+                fd = os.open(str(lease_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._steal_if_expired(lease_path):
+                    return False
+                continue
+
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+
+            # 创建租约期间其他节点可能刚好完成了该文件
+            if self._done_path(key).exists():
+                self._remove(lease_path)
+                return False
+
+            with self.lock:
+                self.held[file_path] = lease_path
+            return True
+
+        return False
+
+    def _steal_if_expired(self, lease_path: Path) -> bool:
+        """
+        租约过期时通过原子重命名将其移走
+
+        检查过期和重命名之间，其他节点可能已经抢占并写入了新租约；因此重命名为唯一的文件名后
+        再确认移走的仍是检查时的那个过期租约（inode和修改时间相同），否则放回原处并放弃。
+        """
+        try:
+            stat = lease_path.stat()
+        except OSError:
+            return False
+        if time.time() - stat.st_mtime <= self.lease_ttl:
+            return False
+
+        stale_path = Path(f"{lease_path}.stale.{self.node_id}.{uuid.uuid4().hex}")
+        try:
+            os.rename(str(lease_path), str(stale_path))
+            moved = stale_path.stat()
+        except OSError:
+            return False
+
+        if (moved.st_ino, moved.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+            # 移走的是其他节点刚写入的新租约：用硬链接放回（不覆盖此后又出现的租约）
+            try:
+                os.link(str(stale_path), str(lease_path))
+            except FileExistsError:
+                pass
+            except OSError:
+                try:
+                    os.rename(str(stale_path), str(lease_path))
+                except OSError:
+                    pass
+            self._remove(stale_path)
+            return False
+
+        self._remove(stale_path)
+        with self.lock:
+            self.stolen_count += 1
+        return True
+
+    def complete(self, result: Dict):
+        """
+        记录文件的处理结果：写入共享日志，成功时创建完成标记，并释放租约
+
+        失败的文件不创建完成标记（服务熔断、超时等可能是暂时的），之后的运行中任何节点都会重新领取。
+
+        Args:
+            result: 处理结果字典
+        """
+        file_path = result['input_file']
+        key = self._key(file_path)
+        entry = dict(result, node=self.node_id, finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+        with self.lock:
+            self.journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.journal.flush()
+            lease_path = self.held.pop(file_path, None)
+
+        if result.get('status') == 'success':
+            done_path = self._done_path(key)
+            done_path.parent.mkdir(exist_ok=True)
+            with open(done_path, 'w', encoding='utf-8') as f:
+                f.write(result['status'])
+
+        if lease_path is not None:
+            self._remove(lease_path)
+
+    def iter_expired(self) -> Iterator[str]:
+        """
+        产出租约已过期（持有节点可能已崩溃）的文件路径，供扫描结束后接管
+
+        Yields:
+            文件路径
+        """
+        for lease_path in self.leases_dir.glob('*.lease'):
+            try:
+                if time.time() - lease_path.stat().st_mtime <= self.lease_ttl:
+                    continue
+                with open(lease_path, 'r', encoding='utf-8') as f:
+                    lease = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            # 优先按相对路径在本节点的输入根目录下定位文件
+            relative = lease.get('relative', '')
+            if self.source_root and relative and not os.path.isabs(relative):
+                file_path = os.path.join(self.source_root, relative)
+            else:
+                file_path = lease.get('file', '')
+
+            if file_path and os.path.exists(file_path):
+                yield file_path
+
+    def close(self):
+        """停止心跳，释放尚未完成的租约并关闭日志"""
+        self.stop_event.set()
+        self.heartbeat.join()
+        with self.lock:
+            for lease_path in self.held.values():
+                self._remove(lease_path)
+            self.held.clear()
+            self.journal.close()
+
+    def _heartbeat_loop(self):
+        """定期续约（更新租约文件的修改时间）"""
+        while not self.stop_event.wait(self.lease_ttl / 3):
+            with self.lock:
+                lease_paths = list(self.held.values())
+            for lease_path in lease_paths:
+                try:
+                    os.utime(str(lease_path))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _remove(path: Path):
+        """删除文件，忽略不存在的情况"""
+        try:
+            os.remove(str(path))
+        except OSError:
+            pass